@@ -15,4 +15,12 @@ export DATABASE_URL=postgres://$POSTGRES_ENV_POSTGRES_USER:$POSTGRES_ENV_POSTGRE
 
 export CELERY_BROKER_URL=$REDIS_URL
 
+# Every process writes its metric samples to the directory of its container, so that /updates/metrics/
+# reports the totals of all of them. The PIDs in the file names are only unique within a container; the
+# samples of other containers are reported by /updates/metrics/?group=<METRICS_GROUP>, see updates/metrics.py
+export prometheus_multiproc_dir=/prometheus/${METRICS_GROUP:-$(hostname)}
+# Samples of an earlier run of the container would be added to the totals
+rm -rf "$prometheus_multiproc_dir"
+mkdir -p "$prometheus_multiproc_dir"
+
 exec "$@"
\ No newline at end of file
@@ -1,3 +1,5 @@
 #!/bin/sh
 python /app/manage.py collectstatic --noinput
-/usr/local/bin/gunicorn config.wsgi -w 4 -b 0.0.0.0:5000 --chdir=/app
\ No newline at end of file
+# Threaded workers, so that open live feed streams do not tie up a whole worker each; at most
+# LIVE_FEED_MAX_STREAMS of each worker's threads serve streams, see updates/live.py
+/usr/local/bin/gunicorn config.wsgi -c /app/config/gunicorn.py -w 4 -k gthread --threads 16 -b 0.0.0.0:5000 --chdir=/app
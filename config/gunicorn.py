@@ -0,0 +1,7 @@
+# Gunicorn settings, see compose/django/gunicorn.sh
+
+
+def child_exit(server, worker):
+    from updates.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/dev/ref/settings/
 from __future__ import absolute_import, unicode_literals
 
 import environ
+from celery.schedules import crontab
+from kombu import Queue
 
 ROOT_DIR = environ.Path(__file__) - 3  # (/a/b/myfile.py - 3 = /)
 APPS_DIR = ROOT_DIR.path('digestus')
@@ -61,6 +63,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'updates.profiling.ProfilingMiddleware',
 )
 
 # MIGRATIONS CONFIGURATION
@@ -104,6 +107,17 @@ DATABASES = {
 }
 DATABASES['default']['ATOMIC_REQUESTS'] = True
 
+# Read replicas, used for the reads inside `updates.replicas.use_replica()`.
+# Tests read them through the default test database.
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES['replica{}'.format(index)] = dict(env.db_url_config(url), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append('replica{}'.format(index))
+DATABASE_ROUTERS = ['updates.replicas.ReplicaRouter']
+# Replicas further behind than this many seconds are skipped
+DATABASE_REPLICA_MAX_LAG = env.float('DATABASE_REPLICA_MAX_LAG', default=10.0)
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = env.float('DATABASE_REPLICA_LAG_CHECK_INTERVAL', default=5.0)
+
 
 # GENERAL CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -227,6 +241,58 @@ INSTALLED_APPS += ('digestus.taskapp.celery.CeleryConfig',)
 # if you are not using the django database broker (e.g. rabbitmq, redis, memcached), you can remove the next line.
 INSTALLED_APPS += ('kombu.transport.django',)
 BROKER_URL = env("CELERY_BROKER_URL", default='django://')
+
+# Separate queues, so that a flood of reminders does not hold up digests and
+# replies; the worker services in docker-compose.yml set each queue's concurrency
+CELERY_DEFAULT_QUEUE = 'celery'
+CELERY_QUEUES = (
+    Queue('celery'),
+    Queue('digest'),
+    Queue('reminder'),
+    Queue('inbound'),
+    Queue('auto_reply'),
+)
+# With the Redis broker of production.py, priority 0 is consumed first and tasks without
+# one get 0; the database broker used elsewhere by default ignores priorities
+CELERY_ROUTES = {
+    'updates.tasks.schedule_digest': {'queue': 'digest', 'priority': 0},
+    'updates.tasks.schedule_combined_digests': {'queue': 'digest', 'priority': 0},
+    'updates.tasks.schedule_period_digests': {'queue': 'digest', 'priority': 0},
+    'updates.tasks.send_digest': {'queue': 'digest', 'priority': 3},
+    'updates.tasks.send_combined_digest': {'queue': 'digest', 'priority': 5},
+    'updates.tasks.send_period_digest': {'queue': 'digest', 'priority': 7},
+    'updates.tasks.schedule_reminders': {'queue': 'reminder', 'priority': 0},
+    'updates.tasks.send_reminders': {'queue': 'reminder', 'priority': 3},
+    'updates.tasks.remind_team_member': {'queue': 'reminder', 'priority': 6},
+    'updates.tasks.wrong_email_format_reply': {'queue': 'auto_reply', 'priority': 0},
+}
+BROKER_TRANSPORT_OPTIONS = {'priority_steps': list(range(10))}
+# Workers reserve one task at a time, so that priorities apply to everything still queued
+CELERYD_PREFETCH_MULTIPLIER = 1
+# Workers keep their database connections between tasks instead of reconnecting for
+# each one; Celery still closes them after this many tasks. See updates/worker_db.py
+CELERY_DB_REUSE_MAX = env.int('CELERY_DB_REUSE_MAX', default=1000)
+WORKER_CONN_MAX_AGE = env.int('WORKER_CONN_MAX_AGE', default=600)
+# Seconds a worker connection may be idle before it is checked with a query
+WORKER_DB_HEALTH_CHECK_INTERVAL = env.int('WORKER_DB_HEALTH_CHECK_INTERVAL', default=30)
+CELERYBEAT_SCHEDULE = {
+    # These schedule the digests due on the current day in Manila, so they run just after
+    # midnight there (16:05 UTC). Users with a combined digest are left out of their teams'
+    # digests, so they get nothing without it
+    'schedule-combined-digests': {
+        'task': 'updates.tasks.schedule_combined_digests',
+        'schedule': crontab(hour=16, minute=5),
+    },
+    'schedule-period-digests': {
+        'task': 'updates.tasks.schedule_period_digests',
+        'schedule': crontab(hour=16, minute=5),
+    },
+    # Partitions of the coming months for the partitioned tables, see updates/partitions.py
+    'create-partitions': {
+        'task': 'updates.tasks.create_partitions',
+        'schedule': crontab(hour=1, minute=0),
+    },
+}
 ########## END CELERY
 
 
@@ -236,3 +302,43 @@ ADMIN_URL = r'^admin/'
 # Your common stuff: Below this line define 3rd party library settings
 INBOUND_DOMAIN = env('INBOUND_DOMAIN')
 MANDRILL_API_KEY = env('MANDRILL_API_KEY')
+
+# Most queries an invocation of a task may run, see updates/instrumentation.py,
+# or (fixed, per unit of work) for tasks that count their units of work.
+# Tasks over budget are logged, or fail when TASK_QUERY_BUDGETS_STRICT is set.
+TASK_QUERY_BUDGETS = {
+    'updates.tasks.schedule_reminders': 10,
+    'updates.tasks.remind_team_member': 10,
+    # Per member reminded, including the reminder when it is sent eagerly
+    'updates.tasks.send_reminders': (10, 15),
+    'updates.tasks.schedule_digest': 10,
+    'updates.tasks.send_digest': 100,
+    'updates.tasks.schedule_combined_digests': 10,
+    'updates.tasks.send_combined_digest': 200,
+    'updates.tasks.schedule_period_digests': 10,
+    'updates.tasks.send_period_digest': 50,
+}
+TASK_QUERY_BUDGETS_STRICT = env.bool('TASK_QUERY_BUDGETS_STRICT', default=False)
+
+# Live feed streams each web process serves at once, see updates/live.py. Keep it below
+# the threads per worker in compose/django/gunicorn.sh, so that other requests still get one
+LIVE_FEED_MAX_STREAMS = env.int('LIVE_FEED_MAX_STREAMS', default=12)
+
+# Bearer token Prometheus has to send to read /updates/metrics/; when empty, the
+# metrics are only served with DEBUG
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Profiling of a sample of tasks and requests, see updates/profiling.py
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+# Requests with this in their X-Digestus-Profile header are always profiled; disabled when empty
+PROFILING_TOKEN = env('PROFILING_TOKEN', default='')
+# 'sample' for folded stacks, 'cprofile' for pstats
+PROFILING_MODE = env('PROFILING_MODE', default='sample')
+PROFILING_DIR = env('PROFILING_DIR', default='/tmp/digestus-profiles')
+PROFILING_INTERVAL = env.float('PROFILING_INTERVAL', default=0.005)
+PROFILING_MAX_SECONDS = env.float('PROFILING_MAX_SECONDS', default=120.0)
+PROFILING_MAX_BYTES = env.int('PROFILING_MAX_BYTES', default=100 * 1024 * 1024)
+
+# Seconds between checks of the shared version of the reference data cached in
+# each process, see updates/reference.py
+REFERENCE_DATA_CHECK_INTERVAL = env.int('REFERENCE_DATA_CHECK_INTERVAL', default=10)
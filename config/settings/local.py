@@ -64,3 +64,11 @@ CELERY_ALWAYS_EAGER = True
 ########## END CELERY
 
 # Your local stuff: Below this line define 3rd party library settings
+
+# Tasks that run more queries than their budget fail, in development and tests
+TASK_QUERY_BUDGETS_STRICT = env.bool('TASK_QUERY_BUDGETS_STRICT', default=True)
+
+# Replica routing can be tried locally by pointing DATABASE_REPLICA_URLS at a
+# second Postgres, e.g. a streaming replica of the development database:
+#   DATABASE_REPLICA_URLS=postgres://localhost:5433/digestus ./manage.py runserver
+# Without replicas every read uses the default database.
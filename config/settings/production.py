@@ -72,6 +72,33 @@ TEMPLATES[0]['OPTIONS']['loaders'] = [
 # Raises ImproperlyConfigured exception if DATABASE_URL not in os.environ
 DATABASES['default'] = env.db("DATABASE_URL")
 
+# CACHING
+# ------------------------------------------------------------------------------
+# Shared by the web and Celery worker processes, so that cache invalidation
+# done by one process is seen by all of them
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': '{0}/{1}'.format(env('REDIS_URL', default='redis://redis:6379'), 0),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'IGNORE_EXCEPTIONS': True,  # mimics memcache behavior.
+        }
+    }
+}
+
+# CELERY
+# ------------------------------------------------------------------------------
+# Redis, since the database broker of common.py ignores the priorities of CELERY_ROUTES.
+# docker-compose points it at the linked redis service, see compose/django/entrypoint.sh
+BROKER_URL = env('CELERY_BROKER_URL', default=env('REDIS_URL', default='redis://redis:6379/0'))
+
+# METRICS
+# ------------------------------------------------------------------------------
+# nginx exposes /updates/metrics/, so Prometheus has to send this token.
+# Raises ImproperlyConfigured exception if METRICS_TOKEN not in os.environ
+METRICS_TOKEN = env('METRICS_TOKEN')
+
 # Custom Admin URL, use {% url 'admin:index' %}
 ADMIN_URL = env('DJANGO_ADMIN_URL')
 
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20160411_0706'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='combined_digest',
+            field=models.BooleanField(default=False, help_text='Receive the digests of all your teams in a single email instead of one per team.', verbose_name='Combined digest'),
+        ),
+    ]
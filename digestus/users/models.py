@@ -15,6 +15,11 @@ class User(AbstractUser):
     # First Name and Last Name do not cover name patterns
     # around the globe.
     name = models.CharField(_("Name of User"), blank=True, max_length=255)
+    combined_digest = models.BooleanField(
+        _("Combined digest"),
+        default=False,
+        help_text=_("Receive the digests of all your teams in a single email instead of one per team."),
+    )
 
     def __str__(self):
         return self.username
@@ -28,4 +33,4 @@ class User(AbstractUser):
         """
         from updates.models import Team
 
-        return Team.objects.filter(memberships__user_id=self.pk)
+        return Team.objects.filter(memberships__user_id=self.pk).distinct()
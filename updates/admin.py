@@ -6,3 +6,4 @@ from . import models
 admin.site.register(models.Team)
 admin.site.register(models.Membership)
 admin.site.register(models.Update)
+admin.site.register(models.APIToken)
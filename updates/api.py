@@ -0,0 +1,478 @@
+"""
+JSON API for teams, memberships and updates.
+
+List endpoints accept `?fields=a,b` to only return some of the fields of each
+object; `id` is always included.
+
+Updates are paginated with a keyset cursor on (`for_date`, `id`) instead of
+OFFSET, so every page costs the same index range scan no matter how far back
+the client pages. Each list is fetched with a single `values()` query that
+joins member and role columns, so the number of queries per page is fixed.
+
+Clients other than browsers authenticate with an `Authorization: Bearer <key>`
+header, the key of an `APIToken` (`manage.py create_api_token`). Such requests
+carry no cookies, so they skip the CSRF check; requests authenticated by the
+session cookie are still checked.
+"""
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.middleware.csrf import CsrfViewMiddleware
+from django.db.models import Q
+from django.forms.models import model_to_dict
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+
+from .conditional import team_condition
+from .forms import MembershipForm, TeamSettingsForm, UpdateForm
+from .models import APIToken, Membership, Team, TeamDailyStats, Update
+from .replicas import replica_reads
+from .rollups import get_default_range, get_member_participation
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DEFAULT_PARTICIPATION_DAYS = 90
+MAX_PARTICIPATION_DAYS = 366
+
+# API field name -> `values()` lookup
+TEAM_FIELDS = OrderedDict([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('email', 'email'),
+    ('is_active', 'is_active'),
+    ('digest_days_sent', 'digest_days_sent'),
+    ('send_digest_at', 'send_digest_at'),
+    ('send_reminders_at', 'send_reminders_at'),
+    ('rollup_digest_period', 'rollup_digest_period'),
+    ('rollup_digest_weekday', 'rollup_digest_weekday'),
+    ('created_by', 'created_by_id'),
+])
+
+MEMBERSHIP_FIELDS = OrderedDict([
+    ('id', 'id'),
+    ('team', 'team_id'),
+    ('user', 'user_id'),
+    ('email', 'user__email'),
+    ('name', 'user__name'),
+    ('role', 'role__name'),
+    ('is_active', 'is_active'),
+])
+
+UPDATE_FIELDS = OrderedDict([
+    ('id', 'id'),
+    ('for_date', 'for_date'),
+    ('membership', 'membership_id'),
+    ('member', 'membership__user__email'),
+    ('member_name', 'membership__user__name'),
+    ('role', 'membership__role__name'),
+    ('done', 'done'),
+    ('will_do', 'will_do'),
+    ('blocker', 'blocker'),
+])
+
+SEARCH_FIELDS = OrderedDict(list(UPDATE_FIELDS.items()) + [('rank', 'rank')])
+
+TEAM_DAILY_STATS_FIELDS = OrderedDict([
+    ('date', 'date'),
+    ('expected', 'expected_count'),
+    ('responded', 'responded_count'),
+    ('answered', 'answered_count'),
+    ('blocked', 'blocked_count'),
+    ('done_count', 'done_count'),
+    ('will_do_count', 'will_do_count'),
+    ('blocker_count', 'blocker_count'),
+])
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error_response(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def get_selected_fields(request, available):
+    """
+    Returns the field names requested with `?fields=`, or all of `available`.
+
+    Raises `BadRequest` for unknown field names.
+    """
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+
+    names = ['id'] + [name.strip() for name in requested.split(',') if name.strip()]
+    names = list(OrderedDict.fromkeys(names))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest('Unknown fields: {}'.format(', '.join(unknown)))
+    return names
+
+
+def serialize(queryset, fields, available, limit=None):
+    """
+    Returns the rows of `queryset` as dictionaries keyed by API field names.
+    """
+    rows = queryset.values(*[available[name] for name in fields])
+    if limit is not None:
+        rows = rows[:limit]
+
+    return [
+        OrderedDict((name, row[available[name]]) for name in fields)
+        for row in rows
+    ]
+
+
+def encode_cursor(for_date, pk):
+    raw = '{}:{}'.format(for_date.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (`for_date`, `id`) pair encoded in `cursor`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+        for_date, pk = raw.split(':')
+        return datetime.datetime.strptime(for_date, '%Y-%m-%d').date(), int(pk)
+    except ValueError:
+        raise BadRequest('Invalid cursor.')
+
+
+def get_page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('Invalid limit.')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def get_form_data(instance, form_class, payload):
+    """
+    Merges `payload` over the current values of `instance`, so PATCH requests
+    only need to send the fields that change.
+    """
+    data = model_to_dict(instance, fields=form_class._meta.fields) if instance.pk else {}
+    data.update(payload)
+    for name, value in data.items():
+        # Array fields are submitted to their form fields as comma separated values
+        if isinstance(value, (list, tuple)):
+            data[name] = ','.join(str(item) for item in value)
+    return data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class JSONView(LoginRequiredMixin, View):
+    """
+    Base view of the JSON API.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if authorization.startswith('Bearer '):
+            user = APIToken.objects.get_user(authorization[len('Bearer '):])
+            if user is None:
+                return error_response('Invalid token.', status=401)
+            request.user = user
+        else:
+            # Only token requests are exempt; the session cookie is sent by browsers on any site's behalf
+            forbidden = CsrfViewMiddleware().process_view(request, None, (), {})
+            if forbidden is not None:
+                return forbidden
+
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except BadRequest as e:
+            return error_response(str(e), status=400)
+        except Http404:
+            return error_response('Not found.', status=404)
+
+    def handle_no_permission(self):
+        return error_response('Authentication credentials were not provided.', status=401)
+
+    def get_payload(self):
+        try:
+            payload = json.loads(self.request.body.decode('utf-8'))
+        except ValueError:
+            raise BadRequest('Request body is not valid JSON.')
+
+        if not isinstance(payload, dict):
+            raise BadRequest('Request body must be a JSON object.')
+        return payload
+
+    def get_team(self, team_id):
+        """
+        Returns the `Team` with `team_id` if the requesting user is an active member.
+        """
+        return get_object_or_404(Team.objects.for_member(self.request.user), pk=team_id)
+
+    def save_form(self, form_class, instance, fields, available, queryset):
+        """
+        Validates the request payload with `form_class` and saves `instance`.
+
+        Responds with the saved object serialized from `queryset`.
+        """
+        form = form_class(get_form_data(instance, form_class, self.get_payload()), instance=instance)
+
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        status = 200 if instance.pk else 201
+        obj = form.save()
+        return JsonResponse(serialize(queryset.filter(pk=obj.pk), fields, available)[0], status=status)
+
+
+class TeamListAPIView(JSONView):
+    def get(self, request):
+        fields = get_selected_fields(request, TEAM_FIELDS)
+        teams = Team.objects.for_member(request.user).order_by('name')
+
+        return JsonResponse({'results': serialize(teams, fields, TEAM_FIELDS)})
+
+
+@method_decorator(team_condition, name='get')
+class TeamDetailAPIView(JSONView):
+    def get(self, request, team_id):
+        fields = get_selected_fields(request, TEAM_FIELDS)
+        team = self.get_team(team_id)
+
+        return JsonResponse(serialize(Team.objects.filter(pk=team.pk), fields, TEAM_FIELDS)[0])
+
+    def patch(self, request, team_id):
+        team = self.get_team(team_id)
+
+        if team.created_by_id != request.user.pk:
+            return error_response('Only the team creator can change team settings.', status=403)
+
+        return self.save_form(TeamSettingsForm, team, list(TEAM_FIELDS), TEAM_FIELDS, Team.objects.all())
+
+
+@method_decorator(team_condition, name='get')
+class MembershipListAPIView(JSONView):
+    def get(self, request, team_id):
+        fields = get_selected_fields(request, MEMBERSHIP_FIELDS)
+        team = self.get_team(team_id)
+
+        memberships = team.memberships.order_by('id')
+        return JsonResponse({'results': serialize(memberships, fields, MEMBERSHIP_FIELDS)})
+
+    def post(self, request, team_id):
+        team = self.get_team(team_id)
+
+        if team.created_by_id != request.user.pk:
+            return error_response('Only the team creator can add members.', status=403)
+
+        return self.save_form(MembershipForm, Membership(team=team), list(MEMBERSHIP_FIELDS),
+                              MEMBERSHIP_FIELDS, Membership.objects.all())
+
+
+class MembershipDetailAPIView(JSONView):
+    def get_membership(self, membership_id):
+        return get_object_or_404(
+            Membership.objects.select_related('team').filter(
+                team__memberships__user=self.request.user,
+                team__memberships__is_active=True,
+            ),
+            pk=membership_id,
+        )
+
+    def get(self, request, membership_id):
+        fields = get_selected_fields(request, MEMBERSHIP_FIELDS)
+        membership = self.get_membership(membership_id)
+
+        return JsonResponse(
+            serialize(Membership.objects.filter(pk=membership.pk), fields, MEMBERSHIP_FIELDS)[0]
+        )
+
+    def patch(self, request, membership_id):
+        membership = self.get_membership(membership_id)
+
+        if membership.team.created_by_id != request.user.pk:
+            return error_response('Only the team creator can change memberships.', status=403)
+
+        return self.save_form(MembershipForm, membership, list(MEMBERSHIP_FIELDS),
+                              MEMBERSHIP_FIELDS, Membership.objects.all())
+
+
+@method_decorator(team_condition, name='get')
+class UpdateListAPIView(JSONView):
+    """
+    Updates of a team, newest first.
+
+    Query parameters:
+        `fields`: comma separated field names
+        `limit`: page size, at most `MAX_PAGE_SIZE`
+        `cursor`: the `next` cursor of the previous page
+        `membership`: only return updates of this membership
+        `since`, `until`: inclusive `for_date` bounds, YYYY-MM-DD
+    """
+
+    def get_queryset(self, team):
+        updates = Update.objects.filter(membership__team=team)
+
+        if self.request.GET.get('membership'):
+            try:
+                updates = updates.filter(membership_id=int(self.request.GET['membership']))
+            except ValueError:
+                raise BadRequest('Invalid membership.')
+
+        for param, lookup in (('since', 'for_date__gte'), ('until', 'for_date__lte')):
+            if self.request.GET.get(param):
+                try:
+                    value = parse_date(self.request.GET[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise BadRequest('Invalid {}.'.format(param))
+                updates = updates.filter(**{lookup: value})
+
+        return updates.order_by('-for_date', '-id')
+
+    def get(self, request, team_id):
+        fields = get_selected_fields(request, UPDATE_FIELDS)
+        limit = get_page_size(request)
+        team = self.get_team(team_id)
+
+        updates = self.get_queryset(team)
+        if request.GET.get('cursor'):
+            for_date, pk = decode_cursor(request.GET['cursor'])
+            updates = updates.filter(Q(for_date__lt=for_date) | Q(for_date=for_date, id__lt=pk))
+
+        # The cursor columns are always fetched; one extra row tells whether there is a next page
+        lookups = list(OrderedDict.fromkeys(['for_date'] + fields))
+        rows = serialize(updates, lookups, UPDATE_FIELDS, limit=limit + 1)
+
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            params = request.GET.copy()
+            params['cursor'] = encode_cursor(rows[-1]['for_date'], rows[-1]['id'])
+            next_url = '{}?{}'.format(request.path, params.urlencode())
+
+        if 'for_date' not in fields:
+            for row in rows:
+                del row['for_date']
+
+        return JsonResponse({'results': rows, 'next': next_url})
+
+    def post(self, request, team_id):
+        """
+        Creates an update for the requesting user's membership in the team.
+        """
+        team = self.get_team(team_id)
+
+        try:
+            membership = team.memberships.get(user=request.user, is_active=True)
+        except Membership.DoesNotExist:
+            return error_response('Only active members can post updates.', status=403)
+
+        return self.save_form(UpdateForm, Update(membership=membership), list(UPDATE_FIELDS),
+                              UPDATE_FIELDS, Update.objects.all())
+
+
+@method_decorator(replica_reads, name='dispatch')
+@method_decorator(team_condition, name='get')
+class UpdateSearchAPIView(UpdateListAPIView):
+    """
+    Full-text search over the updates of a team, best match first.
+
+    Query parameters:
+        `q`: search terms; every word has to match
+        `section`: comma separated sections to search in: done, will_do, blocker
+        `fields`, `limit`, `membership`, `since`, `until`: as in `UpdateListAPIView`
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    def get(self, request, team_id):
+        fields = get_selected_fields(request, SEARCH_FIELDS)
+        limit = get_page_size(request)
+        team = self.get_team(team_id)
+
+        text = request.GET.get('q', '').strip()
+        if not text:
+            raise BadRequest('Missing search terms.')
+
+        sections = [section.strip() for section in request.GET.get('section', '').split(',') if section.strip()]
+        unknown = [section for section in sections if section not in Update.SEARCH_WEIGHTS]
+        if unknown:
+            raise BadRequest('Unknown sections: {}'.format(', '.join(unknown)))
+
+        updates = self.get_queryset(team).search(text, sections)
+        return JsonResponse({'results': serialize(updates, fields, SEARCH_FIELDS, limit=limit)})
+
+
+class UpdateDetailAPIView(JSONView):
+    def get_update(self, update_id):
+        return get_object_or_404(
+            Update.objects.select_related('membership').filter(
+                membership__team__memberships__user=self.request.user,
+                membership__team__memberships__is_active=True,
+            ),
+            pk=update_id,
+        )
+
+    def get(self, request, update_id):
+        fields = get_selected_fields(request, UPDATE_FIELDS)
+        update = self.get_update(update_id)
+
+        return JsonResponse(serialize(Update.objects.filter(pk=update.pk), fields, UPDATE_FIELDS)[0])
+
+    def patch(self, request, update_id):
+        update = self.get_update(update_id)
+
+        if update.membership.user_id != request.user.pk:
+            return error_response('Only the author can change an update.', status=403)
+
+        return self.save_form(UpdateForm, update, list(UPDATE_FIELDS), UPDATE_FIELDS, Update.objects.all())
+
+
+@method_decorator(replica_reads, name='dispatch')
+@method_decorator(team_condition, name='get')
+class TeamParticipationAPIView(JSONView):
+    """
+    Participation of a team per day and per member, read from the daily rollups.
+
+    Query parameters:
+        `days`: number of days, at most `MAX_PARTICIPATION_DAYS`
+        `until`: last day, YYYY-MM-DD; defaults to today
+    """
+
+    def get(self, request, team_id):
+        team = self.get_team(team_id)
+
+        try:
+            days = int(request.GET.get('days', DEFAULT_PARTICIPATION_DAYS))
+        except ValueError:
+            raise BadRequest('Invalid days.')
+        days = max(1, min(days, MAX_PARTICIPATION_DAYS))
+
+        until = None
+        if request.GET.get('until'):
+            try:
+                until = parse_date(request.GET['until'])
+            except ValueError:
+                until = None
+            if until is None:
+                raise BadRequest('Invalid until.')
+
+        since, until = get_default_range(days, until)
+        daily_stats = (
+            TeamDailyStats.objects.filter(team=team, date__gte=since, date__lte=until).order_by('date')
+        )
+        return JsonResponse({
+            'since': since,
+            'until': until,
+            'days': serialize(daily_stats, list(TEAM_DAILY_STATS_FIELDS), TEAM_DAILY_STATS_FIELDS),
+            'members': get_member_participation(team, since, until),
+        })
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UpdatesConfig(AppConfig):
     name = 'updates'
+
+    def ready(self):
+        from . import signals  # noqa
@@ -0,0 +1,15 @@
+"""
+Benchmarks run with `python manage.py benchmark <name>`.
+
+Benchmarks create their own synthetic data in the configured database, so run
+them against a scratch database, never production.
+"""
+
+# Benchmark name -> module with a `run(options, stdout)` function returning a dict of results
+BENCHMARKS = {
+    'connections': 'updates.benchmarks.connections',
+    'digest': 'updates.benchmarks.digests',
+    'import': 'updates.benchmarks.imports',
+    'queue_capacity': 'updates.benchmarks.queue_capacity',
+    'search': 'updates.benchmarks.search',
+}
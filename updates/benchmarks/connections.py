@@ -0,0 +1,71 @@
+"""
+`remind_team_member` throughput with and without persistent worker connections.
+
+Sends a reminder to each member of the generated teams twice, as a worker
+would run them one after the other: first closing the database connections
+after every task, which is what Celery does without `CELERY_DB_REUSE_MAX`,
+then with the connection handling of `worker_db`. Emails go to the locmem
+backend, so the difference is mostly connection setup.
+"""
+import time
+
+from django.core import mail
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from . import data
+from .. import tasks, worker_db
+from ..models import Membership
+
+
+def close_connections():
+    for connection in connections.all():
+        connection.close()
+
+
+def send_reminders(membership_ids, before, after):
+    opened = []
+
+    def count(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    connection_created.connect(count)
+    try:
+        started = time.perf_counter()
+        for membership_id in membership_ids:
+            before()
+            tasks.remind_team_member(membership_id)
+            after()
+        seconds = time.perf_counter() - started
+    finally:
+        connection_created.disconnect(count)
+
+    return {
+        'tasks': len(membership_ids),
+        'seconds': round(seconds, 2),
+        'tasks_per_second': round(len(membership_ids) / seconds, 1),
+        'connections_opened': len(opened),
+    }
+
+
+def run(options, stdout):
+    teams = data.create_organisation(options['teams'], options['members'])
+    membership_ids = list(
+        Membership.objects.filter(team__in=teams, is_active=True).order_by('id').values_list('id', flat=True)
+    )
+
+    layouts = [
+        ('close_per_task', lambda: None, close_connections),
+        ('persistent', worker_db.before_task, lambda: None),
+    ]
+    results = {}
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+        for label, before, after in layouts:
+            close_connections()
+            mail.outbox = []
+            results[label] = send_reminders(membership_ids, before, after)
+            stdout.write('{:<15} {tasks} reminders in {seconds:.2f}s, {tasks_per_second:.1f}/s, '
+                         '{connections_opened} connections opened'.format(label, **results[label]))
+    close_connections()
+    return results
@@ -0,0 +1,197 @@
+"""
+Synthetic organisations for benchmarks.
+
+Everything is created with `bulk_create` or a single `INSERT ... SELECT`, so
+generating months of updates for thousands of teams takes seconds to minutes
+instead of the hours per-object factories would need. All generated objects
+are named with `PREFIX` so they can be told apart and deleted afterwards.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from digestus.users.models import User
+
+from ..live import skip_update_notifications
+from ..models import (
+    BlockerSignature,
+    Membership,
+    MembershipDailyStats,
+    Role,
+    SilentRecipient,
+    Team,
+    TeamDailyStats,
+    TodoItem,
+    Update,
+)
+
+PREFIX = 'bench'
+
+ROLE_NAMES = ('Project Manager', 'Developer', 'Designer', 'Tester')
+
+# Words are picked with a skewed distribution, so the first words are common
+# and the last ones rare, like in real updates.
+WORDS = (
+    'fixed', 'bug', 'review', 'deploy', 'meeting', 'tests', 'release', 'client', 'api', 'design',
+    'refactor', 'database', 'migration', 'login', 'dashboard', 'report', 'email', 'digest', 'reminder',
+    'staging', 'production', 'ticket', 'feature', 'docs', 'support', 'invoice', 'mobile', 'android',
+    'ios', 'layout', 'styles', 'search', 'export', 'import', 'server', 'outage', 'latency', 'cache',
+    'queue', 'worker', 'celery', 'postgres', 'index', 'backup', 'restore', 'monitoring', 'alerts',
+    'onboarding', 'interview', 'budget', 'roadmap', 'estimate', 'prototype', 'wireframe', 'sprint',
+    'retrospective', 'standup', 'vacation', 'internet', 'power', 'laptop', 'vpn', 'credentials',
+    'certificate', 'dns', 'firewall', 'kubernetes', 'terraform', 'webhook', 'mandrill', 'mailgun',
+    'subaccount', 'timezone', 'localization', 'translation', 'accessibility', 'penetration', 'audit',
+    'compliance', 'gdpr', 'invoicing', 'payroll', 'xylophone', 'quokka', 'zeppelin',
+)
+
+TEXT_SQL = """(
+    SELECT string_agg((%(words)s::text[])[1 + floor(power(random(), 3) * %(word_count)s)::int], ' ')
+    FROM generate_series(1, 3 + floor(random() * 6)::int + 0 * m.id + 0 * d.i)
+)"""
+
+INSERT_UPDATES_SQL = """
+    INSERT INTO {update} (membership_id, for_date, done, will_do, blocker, created, modified)
+    SELECT m.id,
+           %(end_date)s::date - d.i,
+           {text},
+           {text},
+           CASE WHEN random() < %(blocker_ratio)s THEN {text} ELSE '' END,
+           now(),
+           now()
+    FROM {membership} m
+    CROSS JOIN generate_series(0, %(days)s - 1) AS d(i)
+    WHERE m.team_id = ANY(%(team_ids)s) AND m.is_active
+"""
+
+
+def create_organisation(teams, members_per_team, prefix=PREFIX):
+    """
+    Creates `teams` teams with `members_per_team` active members each, every
+    member being a different user.
+
+    Returns the created teams.
+    """
+    roles = [Role.objects.get_or_create(name=name)[0] for name in ROLE_NAMES]
+    creator = User.objects.create(username='{}-creator'.format(prefix),
+                                  email='{}-creator@example.com'.format(prefix))
+
+    Team.objects.bulk_create([
+        Team(name='{}-{}'.format(prefix, number),
+             email='{}-{}@{}'.format(prefix, number, settings.INBOUND_DOMAIN),
+             subaccount_id='{}-{}'.format(prefix, number),
+             created_by=creator,
+             digest_days_sent=[0, 1, 2, 3, 4],
+             send_digest_at=datetime.time(9, 0),
+             send_reminders_at=datetime.time(18, 0))
+        for number in range(teams)
+    ], batch_size=1000)
+    User.objects.bulk_create([
+        User(username='{}-{}'.format(prefix, number),
+             email='{}-{}@example.com'.format(prefix, number),
+             first_name='Member',
+             last_name=str(number),
+             password='!')
+        for number in range(teams * members_per_team)
+    ], batch_size=1000)
+
+    # Django 1.9 does not set primary keys on bulk created objects
+    created_teams = list(get_teams(prefix).order_by('id'))
+    users = list(
+        User.objects.filter(username__startswith='{}-'.format(prefix))
+                    .exclude(pk=creator.pk)
+                    .order_by('id')
+                    .values_list('id', flat=True)
+    )
+    Membership.objects.bulk_create([
+        Membership(team=team,
+                   user_id=users[team_number * members_per_team + member_number],
+                   role=roles[member_number % len(roles)])
+        for team_number, team in enumerate(created_teams)
+        for member_number in range(members_per_team)
+    ], batch_size=1000)
+
+    return created_teams
+
+
+def insert_updates(team_ids, days, end_date, blocker_ratio=0.2, batch_size=100):
+    """
+    Inserts one update per active member of each team for each of the `days`
+    days up to and including `end_date`, with random text.
+
+    Teams are inserted `batch_size` at a time. Returns the number of rows inserted.
+    """
+    sql = INSERT_UPDATES_SQL.format(
+        update=Update._meta.db_table,
+        membership=Membership._meta.db_table,
+        text=TEXT_SQL,
+    )
+    inserted = 0
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(team_ids), batch_size):
+            with transaction.atomic():
+                skip_update_notifications(cursor)
+                cursor.execute(sql, {
+                    'end_date': end_date,
+                    'days': days,
+                    'blocker_ratio': blocker_ratio,
+                    'team_ids': list(team_ids[start:start + batch_size]),
+                    'words': list(WORDS),
+                    'word_count': len(WORDS),
+                })
+            inserted += cursor.rowcount
+        cursor.execute('ANALYZE {}'.format(Update._meta.db_table))
+
+    return inserted
+
+
+def add_silent_recipients(teams, per_team, prefix=PREFIX):
+    """
+    Adds `per_team` silent recipients to each team, every one a different user.
+    """
+    User.objects.bulk_create([
+        User(username='{}-silent-{}'.format(prefix, number),
+             email='{}-silent-{}@example.com'.format(prefix, number),
+             password='!')
+        for number in range(len(teams) * per_team)
+    ], batch_size=1000)
+    users = User.objects.filter(username__startswith='{}-silent-'.format(prefix)).order_by('id')
+    SilentRecipient.objects.bulk_create([SilentRecipient(user_id=user_id)
+                                         for user_id in users.values_list('id', flat=True)], batch_size=1000)
+
+    recipient_ids = list(
+        SilentRecipient.objects.filter(user__in=users).order_by('id').values_list('id', flat=True)
+    )
+    Through = Team.silent_recipients.through
+    Through.objects.bulk_create([
+        Through(team_id=team.pk, silentrecipient_id=recipient_ids[team_number * per_team + number])
+        for team_number, team in enumerate(teams)
+        for number in range(per_team)
+    ], batch_size=1000)
+
+
+def get_teams(prefix=PREFIX):
+    return Team.objects.filter(name__startswith='{}-'.format(prefix))
+
+
+def delete_organisation(prefix=PREFIX):
+    """
+    Deletes everything created by `create_organisation` and `insert_updates`.
+
+    Rows are deleted with plain SQL; collecting millions of updates for the
+    ORM's cascading delete would take far longer than generating them.
+    """
+    team_ids = list(get_teams(prefix).values_list('id', flat=True))
+    membership_ids = Membership.objects.filter(team_id__in=team_ids).values('id')
+
+    # Rows derived from updates when digests are sent
+    for model in (BlockerSignature, TodoItem, MembershipDailyStats, TeamDailyStats):
+        model.objects.filter(team_id__in=team_ids)._raw_delete(connection.alias)
+    Update.objects.filter(membership_id__in=membership_ids)._raw_delete(connection.alias)
+    Membership.objects.filter(team_id__in=team_ids)._raw_delete(connection.alias)
+    Team.silent_recipients.through.objects.filter(team_id__in=team_ids)._raw_delete(connection.alias)
+    Team.objects.filter(pk__in=team_ids)._raw_delete(connection.alias)
+    users = User.objects.filter(username__startswith='{}-'.format(prefix))
+    SilentRecipient.objects.filter(user__in=users)._raw_delete(connection.alias)
+    users._raw_delete(connection.alias)
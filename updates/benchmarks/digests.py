@@ -0,0 +1,80 @@
+"""
+Digest pipeline.
+
+Loads `teams * members * days` updates plus two silent recipients per team,
+then times the pieces of the daily digest: `Team.get_updates` and
+`Team.get_recipients` of one team, the `schedule_digest` and
+`schedule_reminders` schedulers over every team, and `send_digest` of a
+sample of teams with the locmem email backend.
+
+The schedulers' `apply_async` calls are recorded instead of sent, so their
+timings cover selecting the teams and computing the ETAs, not publishing to
+the broker.
+"""
+import time
+from unittest import mock
+
+from django.core import mail
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from . import data
+from .measure import format_measurement, measure
+from .. import tasks
+
+SILENT_RECIPIENTS_PER_TEAM = 2
+
+# Teams sent a digest in each `send_digest` measurement
+SEND_DIGEST_TEAMS = 20
+
+
+def run(options, stdout):
+    end_date = timezone.now().date()
+
+    started = time.perf_counter()
+    teams = data.create_organisation(options['teams'], options['members'])
+    data.add_silent_recipients(teams, SILENT_RECIPIENTS_PER_TEAM)
+    # Every day is a digest day, so the schedulers have work whenever the benchmark runs
+    data.get_teams().update(digest_days_sent=list(range(7)))
+    inserted = data.insert_updates([team.pk for team in teams], options['days'], end_date)
+    load_seconds = time.perf_counter() - started
+    stdout.write('Loaded {} updates in {:.1f}s'.format(inserted, load_seconds))
+
+    team = teams[len(teams) // 2]
+    for_date = timezone.now()
+    sample = teams[:SEND_DIGEST_TEAMS]
+    scheduled = {}
+
+    def schedule(task, scheduler):
+        with mock.patch.object(task, 'apply_async') as apply_async:
+            scheduler()
+        scheduled[scheduler.__name__] = apply_async.call_count
+
+    def send_digests():
+        for sample_team in sample:
+            tasks.send_digest(sample_team.pk, for_date)
+
+    measurements = [
+        ('Team.get_updates', lambda: team.get_updates(for_date)),
+        ('Team.get_recipients', lambda: team.get_recipients()),
+        ('schedule_digest', lambda: schedule(tasks.send_digest, tasks.schedule_digest)),
+        ('schedule_reminders', lambda: schedule(tasks.send_reminders, tasks.schedule_reminders)),
+        ('send_digest x{}'.format(len(sample)), send_digests),
+    ]
+
+    results = []
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+        mail.outbox = []
+        for label, function in measurements:
+            measurement = measure(function, options['repeat'])
+            measurement['name'] = label
+            results.append(measurement)
+            stdout.write(format_measurement(label, measurement))
+
+    return {
+        'updates': inserted,
+        'load_seconds': round(load_seconds, 2),
+        'scheduled': scheduled,
+        'emails_sent': len(mail.outbox),
+        'measurements': results,
+    }
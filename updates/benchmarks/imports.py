@@ -0,0 +1,53 @@
+"""
+Bulk import throughput.
+
+Imports `members * days` updates into one team of `members` members and
+compares the rows per second with the 100k rows/s target.
+"""
+import datetime
+import random
+import time
+
+from django.utils import timezone
+
+from . import data
+from ..imports import import_updates
+
+TARGET_ROWS_PER_SECOND = 100000
+
+
+def generate_records(emails, days, end_date):
+    words = data.WORDS
+    line_number = 1
+    for day in range(days):
+        for_date = (end_date - datetime.timedelta(days=day)).isoformat()
+        for email in emails:
+            line_number += 1
+            yield line_number, {
+                'member_email': email,
+                'for_date': for_date,
+                'done': ' '.join(random.sample(words, 5)),
+                'will_do': ' '.join(random.sample(words, 5)),
+                'blocker': ' '.join(random.sample(words, 3)) if random.random() < 0.2 else '',
+            }
+
+
+def run(options, stdout):
+    team = data.create_organisation(1, options['members'])[0]
+    emails = list(team.memberships.values_list('user__email', flat=True))
+    records = list(generate_records(emails, options['days'], timezone.now().date()))
+
+    started = time.perf_counter()
+    result = import_updates(team, records)
+    elapsed = time.perf_counter() - started
+
+    rows_per_second = len(result.rows) / elapsed
+    stdout.write('Imported {} rows in {:.2f}s ({:.0f} rows/s)'.format(len(result.rows), elapsed, rows_per_second))
+
+    return {
+        'rows': len(result.rows),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows_per_second),
+        'target_rows_per_second': TARGET_ROWS_PER_SECOND,
+        'passed': rows_per_second >= TARGET_ROWS_PER_SECOND,
+    }
@@ -0,0 +1,40 @@
+"""
+Timing, query count and memory measurements shared by the benchmarks.
+"""
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(function, repeat):
+    """
+    Calls `function` `repeat` times and returns a dictionary with the median
+    and maximum wall time in milliseconds, the queries of the last call and
+    the peak memory allocated by Python during any call, in KiB.
+    """
+    timings, peaks = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                function()
+                timings.append((time.perf_counter() - started) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': len(queries),
+        'peak_kib': round(max(peaks) / 1024, 1),
+    }
+
+
+def format_measurement(label, measurement):
+    return '{:<30} median {:>9.2f} ms  max {:>9.2f} ms  {:>6} queries  peak {:>9.1f} KiB'.format(
+        label, measurement['median_ms'], measurement['max_ms'], measurement['queries'], measurement['peak_kib'])
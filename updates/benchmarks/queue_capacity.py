@@ -0,0 +1,121 @@
+"""
+Capacity model of the task queues: how long digests wait behind a reminder
+flood with the queues and worker counts of the deployment.
+
+This is a model, not a measurement of the broker or of the workers. It times
+`send_digest` of a sample of teams and `remind_team_member` of their members
+with the locmem email backend. Then it replays those durations through
+simulated FIFO queues: every active member's reminder is queued, then the
+sample's digests right behind them. Each task goes to the queue
+`CELERY_ROUTES` gives it, consumed by the processes `WORKERS` gives that
+queue. A single queue over all processes is modelled alongside for
+reference. Broker round trips and priorities within a queue are left out.
+"""
+import heapq
+import itertools
+import statistics
+import time
+
+from django.conf import settings
+from django.core import mail
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from . import data
+from .. import tasks
+from ..models import Membership
+
+# Worker processes per queue. Keep in step with the -Q and -c options of the worker
+# services in docker-compose.yml; a service consuming several queues counts once
+WORKERS = {
+    'digest': 4,
+    'reminder': 2,
+    'inbound': 2,
+}
+
+# Teams sent a digest; the reminders of every team make up the flood
+SEND_DIGEST_TEAMS = 20
+
+# Reminders timed; the durations of the rest of the flood are drawn from these
+TIMED_REMINDERS = 200
+
+
+def time_calls(function, arguments):
+    durations = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def simulate(jobs, workers):
+    """
+    Runs `jobs`, a list of (name, duration) all queued at once in order, on a
+    FIFO queue consumed by `workers` processes. Returns a dictionary of
+    job name -> list of the seconds each of its jobs waited and ran.
+    """
+    free_at = [0.0] * workers
+    latencies = {}
+    for name, duration in jobs:
+        finished = heapq.heappop(free_at) + duration
+        heapq.heappush(free_at, finished)
+        latencies.setdefault(name, []).append(finished)
+    return latencies
+
+
+def get_queue(task):
+    """
+    Returns the queue `CELERY_ROUTES` sends `task` to.
+    """
+    return settings.CELERY_ROUTES.get(task.name, {}).get('queue', settings.CELERY_DEFAULT_QUEUE)
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        'median_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def run(options, stdout):
+    teams = data.create_organisation(options['teams'], options['members'])
+    data.insert_updates([team.pk for team in teams], 1, timezone.now().date())
+    sample = teams[:SEND_DIGEST_TEAMS]
+    membership_ids = list(
+        Membership.objects.filter(team__in=teams, is_active=True).order_by('id').values_list('id', flat=True)
+    )
+
+    for_date = timezone.now()
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+        mail.outbox = []
+        digest_durations = time_calls(lambda team: tasks.send_digest(team.pk, for_date), sample)
+        reminder_durations = time_calls(tasks.remind_team_member, membership_ids[:TIMED_REMINDERS])
+
+    reminders = list(zip(itertools.repeat('reminder', len(membership_ids)), itertools.cycle(reminder_durations)))
+    digests = [('digest', duration) for duration in digest_durations]
+
+    shared = simulate(reminders + digests, sum(WORKERS.values()))['digest']
+    digest_queue, reminder_queue = get_queue(tasks.send_digest), get_queue(tasks.remind_team_member)
+    # Digests only wait behind the flood when they are routed to the same queue
+    if digest_queue == reminder_queue:
+        routed = simulate(reminders + digests, WORKERS.get(digest_queue, 1))['digest']
+    else:
+        routed = simulate(digests, WORKERS.get(digest_queue, 1))['digest']
+
+    results = {
+        'reminders': len(reminders),
+        'digests': len(digests),
+        'reminder_median_ms': round(statistics.median(reminder_durations) * 1000, 2),
+        'digest_median_ms': round(statistics.median(digest_durations) * 1000, 2),
+        'digest_queue': digest_queue,
+        'shared_queue': summarize(shared),
+        'configured_routes': summarize(routed),
+    }
+    stdout.write('{} reminders queued ahead of {} digests'.format(results['reminders'], results['digests']))
+    for layout in ('shared_queue', 'configured_routes'):
+        stdout.write('{:<17} digest latency median {median_ms:>10.2f} ms  p95 {p95_ms:>10.2f} ms  '
+                     'max {max_ms:>10.2f} ms'.format(layout, **results[layout]))
+    return results
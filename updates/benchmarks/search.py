@@ -0,0 +1,79 @@
+"""
+Full-text search over updates.
+
+Loads `teams * members * days` updates (1000 teams of 10 members over 1000
+days gives 10M) and times team-scoped and global searches against the 100 ms
+target.
+"""
+import datetime
+import statistics
+import time
+
+from django.utils import timezone
+
+from . import data
+from ..models import Update
+
+TARGET_MS = 100
+
+QUERIES = (
+    ('common word in a team', {'text': data.WORDS[0]}),
+    ('two words in a team', {'text': '{} {}'.format(data.WORDS[1], data.WORDS[10])}),
+    ('blockers of a team', {'text': data.WORDS[57], 'sections': ['blocker']}),
+    ('team, last 30 days', {'text': data.WORDS[3], 'days': 30}),
+    ('member of a team', {'text': data.WORDS[5], 'member': True}),
+    ('rare word in all teams', {'text': data.WORDS[-1], 'all_teams': True}),
+)
+
+
+def time_query(queryset, repeat):
+    """
+    Returns the median and maximum time in milliseconds of fetching the first
+    page of `queryset`.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.values_list('id', 'rank')[:50])
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def run(options, stdout):
+    end_date = timezone.now().date()
+
+    started = time.perf_counter()
+    teams = data.create_organisation(options['teams'], options['members'])
+    inserted = data.insert_updates([team.pk for team in teams], options['days'], end_date)
+    load_seconds = time.perf_counter() - started
+    stdout.write('Loaded {} updates in {:.1f}s'.format(inserted, load_seconds))
+
+    team = teams[len(teams) // 2]
+    membership = team.memberships.first()
+    results = []
+
+    for label, params in QUERIES:
+        updates = Update.objects.all()
+        if not params.get('all_teams'):
+            updates = updates.filter(membership__team=team)
+        if params.get('member'):
+            updates = updates.filter(membership=membership)
+        if params.get('days'):
+            updates = updates.between(end_date - datetime.timedelta(days=params['days']), end_date)
+
+        median_ms, max_ms = time_query(updates.search(params['text'], params.get('sections')),
+                                       options['repeat'])
+        results.append({
+            'query': label,
+            'median_ms': round(median_ms, 2),
+            'max_ms': round(max_ms, 2),
+            'passed': median_ms <= TARGET_MS,
+        })
+        stdout.write('{:<30} median {:>8.2f} ms  max {:>8.2f} ms'.format(label, median_ms, max_ms))
+
+    return {
+        'updates': inserted,
+        'load_seconds': round(load_seconds, 2),
+        'target_ms': TARGET_MS,
+        'queries': results,
+    }
@@ -0,0 +1,185 @@
+"""
+Recurring blocker detection.
+
+Each blocker item is reduced to its character shingles and a MinHash
+signature, whose bands are stored as locality-sensitive hashes. Blockers of
+the same team that share a band hash are candidates; candidates whose
+estimated Jaccard similarity reaches `SIMILARITY_THRESHOLD` are the same
+blocker reported again. The band hashes are looked up through a GIN index,
+so finding candidates does not scan the team's history.
+"""
+import datetime
+import random
+import re
+import zlib
+
+from django.db import transaction
+
+from .models import BlockerSignature, Update
+
+SHINGLE_SIZE = 4
+
+# 16 bands of 4 rows: pairs with a similarity of 0.5 are candidates about
+# 64% of the time, pairs of 0.8 nearly always
+NUM_PERMUTATIONS = 64
+ROWS_PER_BAND = 4
+
+SIMILARITY_THRESHOLD = 0.5
+
+# Similar blockers further apart than this start a new chain
+LOOKBACK_DAYS = 30
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Fixed seed; stored signatures are only comparable while these stay the same
+_random = random.Random(20160509)
+PERMUTATIONS = [
+    (_random.randint(1, MERSENNE_PRIME - 1), _random.randint(0, MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+# Placeholders members write when there is nothing blocking them
+IGNORED_BLOCKERS = {'', 'none', 'n a', 'na', 'nothing', 'no', 'no blocker', 'no blockers', 'nope'}
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'[^\W_]+', text.lower()))
+
+
+def get_shingles(text, size=SHINGLE_SIZE):
+    normalized = normalize(text)
+    if normalized in IGNORED_BLOCKERS:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def get_minhash(shingles):
+    hashes = [zlib.crc32(shingle.encode('utf-8')) & MERSENNE_PRIME for shingle in shingles]
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+
+def get_bands(minhash):
+    """
+    Returns a 64-bit hash per band of `minhash`, prefixed with the band number
+    so that equal rows in different bands do not collide.
+    """
+    bands = []
+    for band in range(len(minhash) // ROWS_PER_BAND):
+        rows = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        bands.append((band << 32) | zlib.crc32(','.join(str(row) for row in rows).encode('ascii')))
+    return bands
+
+
+def get_similarity(minhash, other):
+    """
+    Estimated Jaccard similarity of the shingles behind two signatures.
+    """
+    return sum(1 for a, b in zip(minhash, other) if a == b) / len(minhash)
+
+
+def find_previous(team_id, for_date, minhash, bands):
+    """
+    Returns the most similar blocker of the team reported in the
+    `LOOKBACK_DAYS` days before `for_date`, or None.
+    """
+    candidates = BlockerSignature.objects.filter(
+        team_id=team_id,
+        for_date__gte=for_date - datetime.timedelta(days=LOOKBACK_DAYS),
+        for_date__lt=for_date,
+        bands__overlap=bands,
+    ).only('id', 'for_date', 'minhash', 'first_reported_on')
+
+    best, best_key = None, None
+    for candidate in candidates:
+        similarity = get_similarity(minhash, candidate.minhash)
+        # Most similar first, then the most recent
+        key = (similarity, candidate.for_date, candidate.id)
+        if similarity >= SIMILARITY_THRESHOLD and (best_key is None or key > best_key):
+            best, best_key = candidate, key
+    return best
+
+
+def index_update_blockers(update):
+    """
+    Replaces the blocker signatures of `update` and links each blocker to a
+    similar one reported on an earlier day.
+    """
+    team_id = update.membership.team_id
+    signatures = []
+
+    for position, text in enumerate(update.blocker_as_list()):
+        shingles = get_shingles(text)
+        if not shingles:
+            continue
+
+        minhash = get_minhash(shingles)
+        bands = get_bands(minhash)
+        previous = find_previous(team_id, update.for_date, minhash, bands)
+        signatures.append(BlockerSignature(
+            update=update,
+            team_id=team_id,
+            for_date=update.for_date,
+            position=position,
+            text=text.strip(),
+            minhash=minhash,
+            bands=bands,
+            previous=previous,
+            first_reported_on=previous.first_reported_on if previous else update.for_date,
+        ))
+
+    with transaction.atomic():
+        BlockerSignature.objects.filter(update=update).delete()
+        BlockerSignature.objects.bulk_create(signatures)
+    return signatures
+
+
+def get_blocker_history(updates):
+    """
+    Returns a dictionary of update ID -> list of the update's blockers, each a
+    dictionary with the blocker `text`, and `since` and `days` when a similar
+    blocker was reported on earlier days.
+    """
+    updates = [update for update in updates if update and update.blocker.strip()]
+    signatures = {
+        (signature.update_id, signature.position): signature
+        for signature in BlockerSignature.objects.filter(update__in=[update.pk for update in updates])
+                                                 .only('update', 'position', 'for_date', 'first_reported_on')
+    }
+
+    history = {}
+    for update in updates:
+        blockers = []
+        for position, text in enumerate(update.blocker_as_list()):
+            signature = signatures.get((update.pk, position))
+            recurring = signature is not None and signature.first_reported_on < signature.for_date
+            blockers.append({
+                'text': text,
+                'since': signature.first_reported_on if recurring else None,
+                'days': signature.days_reported if recurring else None,
+            })
+        history[update.pk] = blockers
+    return history
+
+
+def index_blockers(team_ids=None, since=None):
+    """
+    Indexes the blockers of existing updates oldest first, so that each one
+    can be linked to the earlier ones. Returns the number of updates indexed.
+    """
+    updates = (
+        Update.objects.exclude(blocker='')
+                      .select_related('membership')
+                      .order_by('for_date', 'id')
+    )
+    if team_ids:
+        updates = updates.filter(membership__team_id__in=team_ids)
+    if since:
+        updates = updates.filter(for_date__gte=since)
+
+    count = 0
+    for update in updates.iterator():
+        index_update_blockers(update)
+        count += 1
+    return count
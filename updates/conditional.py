@@ -0,0 +1,53 @@
+"""
+Conditional GET support for team-scoped views.
+
+`Team.modified` is bumped whenever the team, its memberships or its updates
+change, so it is a version stamp of everything shown for the team. Checking
+it is a single indexed lookup, and unchanged polls get a 304 without running
+the view.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from .models import Team
+
+
+def get_team_version(request, team_id):
+    """
+    Returns `Team.modified` if the requesting user is a member of the team,
+    otherwise None.
+
+    The value is memoized on the request, since both the ETag and the
+    Last-Modified functions need it.
+    """
+    versions = request.__dict__.setdefault('_team_versions', {})
+
+    if team_id not in versions:
+        versions[team_id] = None
+        if request.user.is_authenticated():
+            versions[team_id] = (
+                Team.objects.for_member(request.user)
+                            .filter(pk=team_id)
+                            .values_list('modified', flat=True)
+                            .first()
+            )
+
+    return versions[team_id]
+
+
+def team_etag(request, team_id, **kwargs):
+    modified = get_team_version(request, team_id)
+    if modified is None:
+        return None
+
+    # Pages show the requesting user, and field selection and cursors change the response
+    version = '{}:{}:{}:{}'.format(team_id, modified.isoformat(), request.user.pk, request.get_full_path())
+    return hashlib.md5(version.encode('utf-8')).hexdigest()
+
+
+def team_last_modified(request, team_id, **kwargs):
+    return get_team_version(request, team_id)
+
+
+team_condition = condition(etag_func=team_etag, last_modified_func=team_last_modified)
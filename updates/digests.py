@@ -0,0 +1,188 @@
+"""
+Digest assembly shared by the digest emails and the team history page.
+"""
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+
+import pytz
+
+from digestus.users.models import User
+
+from .blockers import get_blocker_history
+from .helpers import to_date
+from .models import Membership, SilentRecipient, Team
+from .reconciliation import get_todo_history
+from .reference import get_domain_name
+from .replicas import DEFAULT_DB, get_read_db
+
+DIGEST_TIMEZONE = pytz.timezone('Asia/Manila')
+
+# Rendered digest fragments are kept for a week; edits invalidate them sooner
+DIGEST_FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+# Fragments rendered from a replica may predate the latest invalidation, so they are kept briefly
+DIGEST_FRAGMENT_REPLICA_TIMEOUT = 60
+
+
+def to_digest_date(for_date):
+    """
+    Returns the date of `for_date` in the timezone of the digests. Digests
+    are sent with UTC datetimes, whose date may be the previous day.
+    """
+    if isinstance(for_date, datetime.datetime):
+        return for_date.astimezone(DIGEST_TIMEZONE).date()
+    return for_date
+
+
+def format_digest_date(for_date):
+    """
+    Formats `for_date` the way digests show it, e.g. `Mon, Jan 05 2015`.
+    """
+    if isinstance(for_date, datetime.datetime):
+        for_date = for_date.astimezone(DIGEST_TIMEZONE)
+    return for_date.strftime('%a, %b %d %Y')
+
+
+def get_digest_context(team, for_date):
+    """
+    Returns the template context of the digest of `team` for `for_date`.
+
+    Each item of `members_and_updates` also has the `blockers` of the update
+    with how long similar blockers have been reported, see
+    `blockers.get_blocker_history`, and its `todos` with how many days each
+    has been planned, see `reconciliation.get_todo_history`.
+
+    Arguments:
+        `team`: `Team` object
+        `for_date`: `datetime.date`, or a `datetime.datetime` in UTC
+    """
+    members_and_updates = team.get_updates(for_date)
+    updates = [item['update'] for item in members_and_updates if item['update']]
+    blockers = get_blocker_history(updates)
+    todos = get_todo_history(updates)
+    for item in members_and_updates:
+        update = item['update']
+        item['blockers'], item['todos'] = [], []
+        if update:
+            item['blockers'] = blockers.get(update.pk, [])
+            # Days that were not reconciled yet show the items without streaks
+            item['todos'] = todos.get(update.pk) or [
+                {'text': text, 'streak': 1, 'first_planned_on': update.for_date}
+                for text in update.will_do_as_list()
+            ]
+
+    return {
+        'members_and_updates': members_and_updates,
+        'team': team,
+        'date': format_digest_date(for_date),
+        'domain': get_domain_name(),
+    }
+
+
+# Every recipient of a team's digest, see `Team.get_recipients`
+COMBINED_DIGEST_GROUPS_SQL = """
+    SELECT r.user_id, array_agg(r.team_id ORDER BY r.team_id), max(t.send_digest_at)
+    FROM (
+        SELECT user_id, team_id FROM {membership} WHERE is_active
+        UNION
+        SELECT s.user_id, ts.{through_team} FROM {through} ts
+        INNER JOIN {silent_recipient} s ON s.id = ts.{through_recipient}
+        UNION
+        SELECT created_by_id, id FROM {team}
+    ) r
+    INNER JOIN {user} u ON u.id = r.user_id
+    INNER JOIN {team} t ON t.id = r.team_id
+    WHERE u.combined_digest AND t.is_active AND %s = ANY(t.digest_days_sent)
+      AND EXISTS (SELECT 1 FROM {membership} m WHERE m.team_id = t.id AND m.is_active)
+    GROUP BY r.user_id
+    ORDER BY r.user_id
+"""
+
+
+def get_combined_digest_groups(weekday):
+    """
+    Returns a list of (user ID, team IDs, latest `send_digest_at`) of the
+    users who receive a combined digest, for the active teams that send
+    digests on `weekday`, in a single query.
+    """
+    through = Team.silent_recipients.through
+    context = {
+        'membership': Membership._meta.db_table,
+        'through': through._meta.db_table,
+        'through_team': through._meta.get_field('team').column,
+        'through_recipient': through._meta.get_field('silentrecipient').column,
+        'silent_recipient': SilentRecipient._meta.db_table,
+        'team': Team._meta.db_table,
+        'user': User._meta.db_table,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(COMBINED_DIGEST_GROUPS_SQL.format(**context), [weekday])
+        return [(user_id, list(team_ids), send_at) for user_id, team_ids, send_at in cursor.fetchall()]
+
+
+def get_combined_digest_context(user, teams, for_date):
+    """
+    Returns the template context of the digest of several teams for `for_date`,
+    with a `get_digest_context` of each team in `digests`.
+    """
+    return {
+        'user': user,
+        'digests': [get_digest_context(team, for_date) for team in teams],
+        'date': format_digest_date(for_date),
+        'domain': get_domain_name(),
+    }
+
+
+def digest_version_key(team_id):
+    return 'updates:digest-version:{}'.format(team_id)
+
+
+def get_digest_version(team_id):
+    key = digest_version_key(team_id)
+    version = cache.get(key)
+
+    if version is None:
+        # Start from the clock so fragments cached under an evicted version are never reused
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key)
+    return version
+
+
+def digest_fragment_key(team_id, for_date):
+    version = get_digest_version(team_id)
+    return 'updates:digest-fragment:{}:{}:{}'.format(team_id, version, to_date(for_date).isoformat())
+
+
+def get_digest_fragment(team, for_date):
+    """
+    Returns the rendered digest of `team` for `for_date` as an HTML fragment.
+
+    Fragments are cached until the updates of that day change.
+    """
+    key = digest_fragment_key(team.pk, for_date)
+    fragment = cache.get(key)
+
+    if fragment is None:
+        fragment = render_to_string('updates/includes/digest.html', get_digest_context(team, for_date))
+        timeout = DIGEST_FRAGMENT_TIMEOUT if get_read_db() == DEFAULT_DB else DIGEST_FRAGMENT_REPLICA_TIMEOUT
+        cache.set(key, fragment, timeout)
+
+    return fragment
+
+
+def invalidate_digest_fragment(team_id, for_date):
+    cache.delete(digest_fragment_key(team_id, for_date))
+
+
+def invalidate_team_digest_fragments(team_id):
+    """
+    Invalidates every cached digest fragment of the team, e.g. when a member
+    joins, leaves or changes role.
+    """
+    try:
+        cache.incr(digest_version_key(team_id))
+    except ValueError:
+        get_digest_version(team_id)
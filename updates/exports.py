@@ -0,0 +1,115 @@
+"""
+Streaming CSV and JSON Lines exports of team updates.
+
+Rows are read through a server-side cursor and written out in small batches,
+so memory use stays flat no matter how long the team's history is.
+"""
+import csv
+import json
+import uuid
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+from .models import Update
+
+# Export column name -> `values_list()` lookup
+EXPORT_COLUMNS = OrderedDict([
+    ('id', 'id'),
+    ('for_date', 'for_date'),
+    ('member_email', 'membership__user__email'),
+    ('member_name', 'membership__user__name'),
+    ('role', 'membership__role__name'),
+    ('done', 'done'),
+    ('will_do', 'will_do'),
+    ('blocker', 'blocker'),
+    ('created', 'created'),
+    ('modified', 'modified'),
+])
+
+CHUNK_SIZE = 2000
+
+# Number of formatted rows joined into each chunk handed to the response
+LINES_PER_WRITE = 500
+
+
+def iter_server_side(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields the rows of a `values_list()` queryset as tuples, fetching
+    `chunk_size` rows at a time through a named (server-side) cursor.
+
+    `QuerySet.iterator()` in Django 1.9 still loads the whole result into the
+    client, so the cursor is opened directly on the psycopg2 connection.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+
+    # Named cursors only live inside a transaction
+    with transaction.atomic(using=queryset.db):
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(name='export_{}'.format(uuid.uuid4().hex))
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+
+def get_export_queryset(team, since=None, until=None):
+    updates = Update.objects.filter(membership__team=team)
+    if since:
+        updates = updates.filter(for_date__gte=since)
+    if until:
+        updates = updates.filter(for_date__lte=until)
+
+    return updates.order_by('for_date', 'id').values_list(*EXPORT_COLUMNS.values())
+
+
+class Echo(object):
+    """
+    File-like object that returns what is written, for `csv.writer`.
+    """
+    def write(self, value):
+        return value
+
+
+def batched(lines, size=LINES_PER_WRITE):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(queryset):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(list(EXPORT_COLUMNS))
+        for row in iter_server_side(queryset):
+            yield writer.writerow(row)
+
+    return batched(lines())
+
+
+def stream_jsonl(queryset):
+    names = list(EXPORT_COLUMNS)
+
+    def lines():
+        for row in iter_server_side(queryset):
+            yield json.dumps(OrderedDict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+    return batched(lines())
+
+
+# Format -> (streaming function, content type)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson'),
+}
@@ -0,0 +1,33 @@
+from django import forms
+
+from .models import Membership, Team, Update
+
+
+class TeamSettingsForm(forms.ModelForm):
+    class Meta:
+        model = Team
+        fields = ('description', 'digest_days_sent', 'send_digest_at', 'send_reminders_at',
+                  'rollup_digest_period', 'rollup_digest_weekday', 'is_active')
+
+
+class MembershipForm(forms.ModelForm):
+    """
+    Adds a user to, or changes a user's role in, the team of `instance`.
+    """
+    class Meta:
+        model = Membership
+        fields = ('user', 'role', 'is_active')
+
+    def clean_user(self):
+        user = self.cleaned_data['user']
+        existing = Membership.objects.filter(team_id=self.instance.team_id, user=user)
+
+        if existing.exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError('User is already a member of this team.')
+        return user
+
+
+class UpdateForm(forms.ModelForm):
+    class Meta:
+        model = Update
+        fields = ('for_date', 'done', 'will_do', 'blocker')
@@ -1,12 +1,56 @@
-from django.contrib.sites.models import Site
+import argparse
+import datetime
 
+from django.db import transaction
+from django.utils.dateparse import parse_date
 
-def get_domain_name():
+
+def to_date(value):
+    """
+    Returns the calendar date of `value`.
+
+    `value` can be a `datetime.date` or a `datetime.datetime`. Datetimes are
+    not converted to another timezone, so a UTC datetime gives its UTC date.
     """
-    Gets the domain name of the Site
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def date_argument(value):
+    """
+    Parses a YYYY-MM-DD command line argument.
+
+    For the `type` of `argparse` arguments, since `parse_date` returns None
+    instead of failing on text that is not a date.
     """
     try:
-        return Site.objects.get(pk=1).domain
-    except Site.DoesNotExist:
-        error_msg = 'Site is not configured.'
-        logger.error(error_msg)
+        date = parse_date(value)
+    except ValueError:
+        # Well formed, but not a day of the calendar, e.g. 2015-02-30
+        date = None
+    if date is None:
+        raise argparse.ArgumentTypeError('{!r} is not a date, expected YYYY-MM-DD.'.format(value))
+    return date
+
+
+def gather_on_commit(hook_class, *args):
+    """
+    Passes `args` to `add` of the `hook_class` instance of the current
+    transaction, which is called once the transaction commits.
+
+    The instance is made and registered with `transaction.on_commit` the first
+    time in a transaction, so the changes of the whole transaction are applied
+    together. Outside of a transaction, it is called right away.
+    """
+    connection = transaction.get_connection()
+    hooks = connection.__dict__.setdefault('gathered_commit_hooks', {})
+    hook = hooks.get(hook_class)
+    # Dropped by Django when its transaction or savepoint is rolled back
+    registered = hook is not None and any(func is hook for sids, func in connection.run_on_commit)
+    if not registered:
+        hook = hooks[hook_class] = hook_class()
+
+    hook.add(*args)
+    if not registered:
+        transaction.on_commit(hook)
@@ -0,0 +1,277 @@
+"""
+Bulk import of historical updates, e.g. from another standup tool.
+
+Records use the same columns as the exports: `member_email` and `for_date`
+are required; `done`, `will_do`, `blocker` and `role` are optional. Members
+are resolved in bulk, missing memberships are created, and the rows are loaded
+with Postgres `COPY` into a temporary staging table and merged into
+`updates_update` with two set-based statements.
+"""
+import csv
+import io
+import json
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date
+
+from digestus.users.models import User
+
+from .digests import invalidate_team_digest_fragments
+from .live import skip_update_notifications
+from .models import Membership, Role, Update, touch_on_commit
+from .rollups import refresh_rollups
+from .summaries import invalidate_team_summaries
+
+TEXT_FIELDS = ('done', 'will_do', 'blocker')
+
+# Rows sent to the server per COPY
+COPY_BATCH_SIZE = 50000
+
+STAGING_TABLE = 'import_updates_staging'
+
+MERGE_SQL = (
+    """
+    UPDATE {update} u
+    SET done = s.done, will_do = s.will_do, blocker = s.blocker, modified = now()
+    FROM {staging} s
+    WHERE u.membership_id = s.membership_id AND u.for_date = s.for_date
+    """,
+    """
+    INSERT INTO {update} (membership_id, for_date, done, will_do, blocker, created, modified)
+    SELECT s.membership_id, s.for_date, s.done, s.will_do, s.blocker, now(), now()
+    FROM {staging} s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {update} u
+        WHERE u.membership_id = s.membership_id AND u.for_date = s.for_date
+    )
+    """,
+)
+
+
+class ImportResult(object):
+    def __init__(self):
+        self.rows = OrderedDict()
+        # (line number, message)
+        self.errors = []
+        self.warnings = []
+        self.created_memberships = 0
+        self.updated = 0
+        self.inserted = 0
+
+    def add_error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+    def add_warning(self, line_number, message):
+        self.warnings.append((line_number, message))
+
+
+def read_csv(import_file):
+    """
+    Yields (line number, record) pairs of a CSV file with a header row.
+    """
+    reader = csv.DictReader(import_file)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_jsonl(import_file):
+    """
+    Yields (line number, record) pairs of a JSON Lines file. Records that are
+    not valid JSON objects are yielded as None.
+    """
+    for line_number, line in enumerate(import_file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def validate(records):
+    """
+    Validates the (line number, record) pairs of a reader.
+
+    Returns an `ImportResult` with the valid rows keyed by (member email, date)
+    and an error for each invalid line. When a member has several rows for the
+    same date the last one is kept.
+    """
+    result = ImportResult()
+
+    for line_number, record in records:
+        if record is None:
+            result.add_error(line_number, 'Not a valid JSON object.')
+            continue
+
+        email = (record.get('member_email') or '').strip().lower()
+        if '@' not in email:
+            result.add_error(line_number, 'Missing or invalid member_email.')
+            continue
+
+        try:
+            for_date = parse_date(record.get('for_date') or '')
+        except ValueError:
+            for_date = None
+        if for_date is None:
+            result.add_error(line_number, 'Missing or invalid for_date, expected YYYY-MM-DD.')
+            continue
+
+        texts = [record.get(field) or '' for field in TEXT_FIELDS]
+        if not all(isinstance(text, str) for text in texts):
+            result.add_error(line_number, 'done, will_do and blocker must be text.')
+            continue
+
+        key = (email, for_date)
+        if key in result.rows:
+            result.add_warning(result.rows[key]['line'],
+                             'Replaced by line {} for the same member and date.'.format(line_number))
+        result.rows[key] = {
+            'line': line_number,
+            'email': email,
+            'for_date': for_date,
+            'texts': texts,
+            'role': (record.get('role') or '').strip(),
+        }
+
+    return result
+
+
+def resolve_memberships(team, result):
+    """
+    Returns a dictionary of lower-cased member email -> membership ID for
+    every email in `result`, creating missing memberships of existing users.
+
+    Rows of unknown users are removed from `result` and reported as errors.
+    """
+    emails = {email for email, _ in result.rows}
+    users = dict(
+        User.objects.annotate(lower_email=Lower('email'))
+                    .filter(lower_email__in=emails)
+                    .values_list('lower_email', 'id')
+    )
+
+    for key, row in list(result.rows.items()):
+        if row['email'] not in users:
+            result.add_error(row['line'], 'No user with email {}.'.format(row['email']))
+            del result.rows[key]
+
+    memberships = dict(
+        Membership.objects.filter(team=team, user_id__in=users.values()).values_list('user_id', 'id')
+    )
+    missing = {}
+    for row in result.rows.values():
+        user_id = users[row['email']]
+        if user_id not in memberships:
+            missing.setdefault(user_id, row['role'])
+
+    if missing:
+        roles = get_roles({role for role in missing.values() if role})
+        Membership.objects.bulk_create([
+            Membership(team=team, user_id=user_id, role_id=roles.get(role))
+            for user_id, role in missing.items()
+        ])
+        result.created_memberships = len(missing)
+        memberships = dict(
+            Membership.objects.filter(team=team, user_id__in=users.values()).values_list('user_id', 'id')
+        )
+
+    return {email: memberships[user_id] for email, user_id in users.items() if user_id in memberships}
+
+
+def get_roles(names):
+    """
+    Returns a dictionary of role name -> role ID, creating missing roles.
+    """
+    roles = dict(Role.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = set(names) - set(roles)
+    if missing:
+        Role.objects.bulk_create([Role(name=name) for name in missing])
+        roles = dict(Role.objects.filter(name__in=names).values_list('name', 'id'))
+    return roles
+
+
+def copy_rows(cursor, rows):
+    """
+    Loads (membership ID, date, done, will_do, blocker) tuples into the
+    staging table with `COPY`, `COPY_BATCH_SIZE` rows at a time.
+    """
+    batch = io.StringIO()
+    writer = csv.writer(batch)
+    count = 0
+
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % COPY_BATCH_SIZE == 0:
+            _copy_batch(cursor, batch)
+            batch = io.StringIO()
+            writer = csv.writer(batch)
+
+    if count % COPY_BATCH_SIZE:
+        _copy_batch(cursor, batch)
+
+
+def _copy_batch(cursor, batch):
+    batch.seek(0)
+    cursor.copy_expert(
+        # Empty texts are written unquoted, which COPY would otherwise read as NULL
+        'COPY {} (membership_id, for_date, done, will_do, blocker) FROM STDIN '
+        'WITH (FORMAT csv, FORCE_NOT_NULL (done, will_do, blocker))'.format(STAGING_TABLE),
+        batch,
+    )
+
+
+def import_updates(team, records, dry_run=False):
+    """
+    Validates the (line number, record) pairs of a reader and merges the valid
+    rows into the updates of `team`: existing updates of a member for the same
+    date are replaced, the others are inserted.
+
+    Returns an `ImportResult`. Nothing is written when `dry_run` is True.
+    """
+    result = validate(records)
+
+    with transaction.atomic():
+        memberships = resolve_memberships(team, result)
+
+        if dry_run or not result.rows:
+            transaction.set_rollback(True)
+            return result
+
+        with connection.cursor() as cursor:
+            # Imported history is not shown in live feeds; a notification per row would make this quadratic
+            skip_update_notifications(cursor)
+            cursor.execute(
+                'CREATE TEMPORARY TABLE {} (membership_id integer, for_date date, '
+                'done text, will_do text, blocker text) ON COMMIT DROP'.format(STAGING_TABLE)
+            )
+            copy_rows(cursor.cursor, (
+                [memberships[row['email']], row['for_date'].isoformat()] + row['texts']
+                for row in result.rows.values()
+            ))
+
+            update_sql, insert_sql = [
+                sql.format(update=Update._meta.db_table, staging=STAGING_TABLE) for sql in MERGE_SQL
+            ]
+            cursor.execute(update_sql)
+            result.updated = cursor.rowcount
+            cursor.execute(insert_sql)
+            result.inserted = cursor.rowcount
+
+        # Bulk statements do not send the signals that keep these up to date
+        touch_on_commit([team.pk])
+        dates = [row['for_date'] for row in result.rows.values()]
+        refresh_rollups([team.pk], min(dates), max(dates))
+
+    invalidate_team_digest_fragments(team.pk)
+    invalidate_team_summaries(team.pk)
+    return result
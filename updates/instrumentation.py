@@ -0,0 +1,290 @@
+"""
+Per-invocation instrumentation of Celery tasks.
+
+Tasks created with `base=InstrumentedTask` record for every call:
+    `wall_ms`: time spent in the task
+    `db_ms`, `queries`: time spent in and number of SQL queries
+    `rendered_bytes`: size of the templates rendered, see `add_rendered`
+    `email_ms`: time spent sending email, see `timed`
+
+Each measurement is logged and counted into daily histograms in the cache,
+which `python manage.py task_stats` prints. `TASK_QUERY_BUDGETS` maps task
+names to the most queries an invocation may run; invocations over budget are
+logged, or raise `QueryBudgetExceeded` when `TASK_QUERY_BUDGETS_STRICT` is set,
+e.g. in tests. Tasks whose queries grow with their work, like one reminder per
+member, have a (fixed, per unit) budget and count their units of work with
+`count_units`.
+
+Tasks are instrumented in `__call__` rather than through the `task_prerun`
+and `task_postrun` signals, because direct calls do not send those signals
+and Celery logs and swallows exceptions raised by signal receivers.
+"""
+import contextlib
+import datetime
+import inspect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from celery import Task
+
+from . import metrics, profiling
+
+logger = logging.getLogger('put')
+
+METRICS = ('wall_ms', 'db_ms', 'queries', 'rendered_bytes', 'email_ms')
+
+# Upper bounds of the histogram buckets of each metric; larger values go into an overflow bucket
+BUCKETS = {
+    'wall_ms': (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000),
+    'db_ms': (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+    'queries': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    'rendered_bytes': (1024, 4096, 16384, 65536, 262144, 1048576),
+    'email_ms': (10, 50, 100, 250, 500, 1000, 2500, 5000),
+}
+
+HISTOGRAM_TIMEOUT = 60 * 60 * 24 * 8
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Invocation(object):
+    def __init__(self, name):
+        self.name = name
+        self.values = dict.fromkeys(METRICS, 0)
+        self.units = 0
+        self.query_log_starts = {}
+        self.saved_debug_cursors = {}
+
+
+def current():
+    """
+    Returns the `Invocation` of the innermost running instrumented task, or None.
+    """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def add_rendered(*bodies):
+    """
+    Counts the UTF-8 size of rendered templates towards the running task.
+    """
+    invocation = current()
+    if invocation is not None:
+        invocation.values['rendered_bytes'] += sum(len(body.encode('utf-8')) for body in bodies)
+
+
+def count_units(count=1):
+    """
+    Counts units of work, e.g. members reminded, towards the query budget of the running task.
+    """
+    invocation = current()
+    if invocation is not None:
+        invocation.units += count
+
+
+@contextlib.contextmanager
+def timed(metric):
+    """
+    Adds the time spent in the block to `metric` of the running task.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation = current()
+        if invocation is not None:
+            invocation.values[metric] += (time.perf_counter() - started) * 1000
+
+
+def render_template(template_name, context):
+    """
+    `render_to_string` that counts the time spent and the size of the result.
+    """
+    started = time.perf_counter()
+    body = render_to_string(template_name, context)
+    metrics.RENDER_SECONDS.labels(template_name).observe(time.perf_counter() - started)
+    add_rendered(body)
+    return body
+
+
+@contextlib.contextmanager
+def sending(kind):
+    """
+    Times sending an email of `kind`, e.g. 'digest' or 'reminder'.
+    """
+    with timed('email_ms'), metrics.EMAIL_SEND_SECONDS.labels(kind).time():
+        yield
+
+
+def start(name):
+    """
+    Starts measuring an invocation of the task `name`. Queries are captured
+    through the debug cursor of each connection, as `assertNumQueries` does.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    invocation = Invocation(name)
+    for connection in connections.all():
+        if not stack and not connection.queries_logged:
+            # The log keeps only the latest 9000 queries; start empty so that counts stay
+            # exact, unless something else, like `assertNumQueries`, is reading it
+            connection.queries_log.clear()
+            invocation.saved_debug_cursors[connection.alias] = connection.force_debug_cursor
+            connection.force_debug_cursor = True
+        invocation.query_log_starts[connection.alias] = len(connection.queries_log)
+    invocation.started = time.perf_counter()
+    stack.append(invocation)
+    return invocation
+
+
+def finish(invocation):
+    invocation.values['wall_ms'] += (time.perf_counter() - invocation.started) * 1000
+    _local.stack.pop()
+
+    for connection in connections.all():
+        queries = list(connection.queries_log)[invocation.query_log_starts.get(connection.alias, 0):]
+        invocation.values['queries'] += len(queries)
+        invocation.values['db_ms'] += sum(float(query['time']) for query in queries) * 1000
+        if connection.alias in invocation.saved_debug_cursors:
+            connection.force_debug_cursor = invocation.saved_debug_cursors[connection.alias]
+
+
+def get_bucket(metric, value):
+    for bound in BUCKETS[metric]:
+        if value <= bound:
+            return str(bound)
+    return 'inf'
+
+
+def histogram_key(day, name, metric, bucket):
+    return 'instrumentation:{}:{}:{}:{}'.format(day.isoformat(), name, metric, bucket)
+
+
+def task_names_key(day):
+    return 'instrumentation:{}:tasks'.format(day.isoformat())
+
+
+def record(invocation):
+    """
+    Counts `invocation` into today's histograms.
+    """
+    day = datetime.date.today()
+    names = cache.get(task_names_key(day)) or set()
+    if invocation.name not in names:
+        # Racing workers may drop a name for the rest of the day; its histograms are still kept
+        cache.set(task_names_key(day), names | {invocation.name}, HISTOGRAM_TIMEOUT)
+
+    for metric in METRICS:
+        key = histogram_key(day, invocation.name, metric, get_bucket(metric, invocation.values[metric]))
+        cache.add(key, 0, HISTOGRAM_TIMEOUT)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(key, 1, HISTOGRAM_TIMEOUT)
+
+
+def get_histograms(day):
+    """
+    Returns a dictionary of task name -> metric -> list of (bucket, count) of `day`.
+    """
+    histograms = {}
+    for name in sorted(cache.get(task_names_key(day)) or ()):
+        histograms[name] = {}
+        for metric in METRICS:
+            buckets = [str(bound) for bound in BUCKETS[metric]] + ['inf']
+            counts = cache.get_many([histogram_key(day, name, metric, bucket) for bucket in buckets])
+            histograms[name][metric] = [
+                (bucket, counts.get(histogram_key(day, name, metric, bucket), 0)) for bucket in buckets
+            ]
+    return histograms
+
+
+def get_budget(invocation):
+    """
+    Returns the most queries `invocation` may run, or None when its task has no budget.
+    """
+    budget = getattr(settings, 'TASK_QUERY_BUDGETS', {}).get(invocation.name)
+    if isinstance(budget, (list, tuple)):
+        fixed, per_unit = budget
+        return fixed + per_unit * invocation.units
+    return budget
+
+
+def check_budget(invocation):
+    budget = get_budget(invocation)
+    if budget is None or invocation.values['queries'] <= budget:
+        return
+
+    message = '{} ran {} queries, over its budget of {}.'.format(invocation.name, invocation.values['queries'],
+                                                                 budget)
+    if getattr(settings, 'TASK_QUERY_BUDGETS_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def get_team_id(function, args, kwargs):
+    """
+    Returns the `team_id` argument of a call of `function`, or None.
+    """
+    try:
+        return inspect.signature(function).bind(*args, **kwargs).arguments.get('team_id')
+    except TypeError:
+        return None
+
+
+class InstrumentedTask(Task):
+    abstract = True
+
+    def __call__(self, *args, **kwargs):
+        eta = self.request.eta
+        if eta:
+            # Serialized as an ISO 8601 string by Celery 3.1, e.g. '2016-05-09T09:00:00+00:00'
+            eta = parse_datetime(eta) if isinstance(eta, str) else eta
+            metrics.QUEUE_LAG_SECONDS.labels(self.name).observe(
+                max((timezone.now() - eta).total_seconds(), 0)
+            )
+
+        invocation = start(self.name)
+        profile = profiling.start('task', self.name, get_team_id(self.run, args, kwargs))
+        try:
+            result = super().__call__(*args, **kwargs)
+        finally:
+            finish(invocation)
+            profiling.stop(profile)
+            logger.info('Task %s: %s', self.name,
+                        ', '.join('{}={:.0f}'.format(metric, invocation.values[metric]) for metric in METRICS))
+            record(invocation)
+        # Failed invocations keep their own exception
+        check_budget(invocation)
+        return result
+
+
+def get_percentile(histogram, fraction):
+    """
+    Returns the upper bound of the bucket of `histogram` holding the
+    `fraction` percentile, or None when it is empty.
+    """
+    total = sum(count for _, count in histogram)
+    if not total:
+        return None
+
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen >= total * fraction:
+            return bucket
@@ -0,0 +1,237 @@
+"""
+Live feed of new and changed updates per team.
+
+A trigger on `updates_update` (migration 0016) issues a `NOTIFY` on the
+`updates_update` channel for every inserted or changed row. Each process runs
+a single listener thread with its own connection that `LISTEN`s on that
+channel, loads each changed update once and hands it to every subscriber of
+the team. Watchers therefore cost a queue each instead of a polling loop of
+queries each.
+
+Each process serves at most `LIVE_FEED_MAX_STREAMS` streams at a time, so
+that open feeds cannot take every request thread; `open_team_stream` returns
+None beyond that.
+
+Bulk writes like imports call `skip_update_notifications()` in their
+transaction, so that they do not send a notification per row (migration 0022).
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+import psycopg2
+import psycopg2.extensions
+
+from .api import UPDATE_FIELDS, serialize
+from .models import Update
+
+logger = logging.getLogger('put')
+
+CHANNEL = 'updates_update'
+
+# Seconds between checks of the listener connection
+POLL_TIMEOUT = 5
+RECONNECT_DELAY = 5
+
+# Events kept for a subscriber that does not read fast enough; newer events are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Comment lines keep proxies from closing idle streams
+KEEPALIVE_SECONDS = 15
+
+# Streams are closed after this long so that worker connections get recycled;
+# browsers reconnect on their own
+STREAM_SECONDS = 60 * 5
+
+# Seconds clients are told to wait when every stream of the process is taken
+STREAM_RETRY_AFTER = 30
+
+
+class TeamFeedListener(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        # team ID -> set of subscriber queues
+        self.subscribers = defaultdict(set)
+        self.thread = None
+        self.open_streams = 0
+
+    def start(self):
+        """
+        Starts the listener thread unless it is already running.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='team-feed-listener')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def acquire_stream(self):
+        """
+        Takes one of the process's `LIVE_FEED_MAX_STREAMS` streams; returns False when all are taken.
+        """
+        with self.lock:
+            if self.open_streams >= settings.LIVE_FEED_MAX_STREAMS:
+                return False
+            self.open_streams += 1
+            return True
+
+    def release_stream(self):
+        with self.lock:
+            self.open_streams -= 1
+
+    def subscribe(self, team_id):
+        """
+        Returns a queue that receives the events of the team.
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[team_id].add(subscriber)
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, team_id, subscriber):
+        with self.lock:
+            self.subscribers[team_id].discard(subscriber)
+            if not self.subscribers[team_id]:
+                del self.subscribers[team_id]
+
+    def connect(self):
+        """
+        Opens a dedicated autocommit connection listening on `CHANNEL`.
+
+        Django connections are per thread and are closed at the end of each
+        request, so the listener does not share them.
+        """
+        connection = psycopg2.connect(**connections['default'].get_connection_params())
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.cursor().execute('LISTEN {}'.format(CHANNEL))
+        return connection
+
+    def run(self):
+        while True:
+            try:
+                connection = self.connect()
+            except psycopg2.Error:
+                logger.exception('Team feed listener failed to connect. Retrying in %s seconds.', RECONNECT_DELAY)
+                time.sleep(RECONNECT_DELAY)
+                continue
+
+            try:
+                self.listen(connection)
+            except psycopg2.Error:
+                logger.exception('Team feed listener lost its connection. Reconnecting in %s seconds.',
+                                 RECONNECT_DELAY)
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                connection.close()
+
+    def listen(self, connection):
+        while True:
+            if select.select([connection], [], [], POLL_TIMEOUT) == ([], [], []):
+                continue
+
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                try:
+                    self.dispatch(json.loads(notify.payload))
+                except Exception:
+                    logger.exception('Team feed listener failed to dispatch %s.', notify.payload)
+
+    def dispatch(self, event):
+        """
+        Loads the update of `event` once and puts it in the queue of every
+        subscriber of its team.
+        """
+        with self.lock:
+            subscribers = list(self.subscribers.get(event['team_id'], ()))
+        if not subscribers:
+            return
+
+        # The thread's own Django connection is reused between events
+        close_old_connections()
+        rows = serialize(Update.objects.filter(pk=event['id']), list(UPDATE_FIELDS), UPDATE_FIELDS)
+        if not rows:
+            return
+        event['update'] = rows[0]
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                logger.warning('Dropped live feed event of update %s for a slow subscriber.', event['id'])
+
+
+listener = TeamFeedListener()
+
+
+def skip_update_notifications(cursor):
+    """
+    Turns off the notifications of the rest of the current transaction.
+    """
+    cursor.execute("SELECT set_config('digestus.skip_update_notify', 'on', true)")
+
+
+def format_event(event):
+    data = json.dumps(event['update'], default=str)
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(event['id'], event['op'], data)
+
+
+def stream_team_events(team_id, seconds=STREAM_SECONDS):
+    """
+    Yields the server-sent events of the team for `seconds` seconds.
+    """
+    # Nothing below needs the database; do not keep the request's connection open while streaming
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+    subscriber = listener.subscribe(team_id)
+    try:
+        yield 'retry: 5000\n\n'
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            try:
+                event = subscriber.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        listener.unsubscribe(team_id, subscriber)
+
+
+class TeamEventStream(object):
+    """
+    The events of `stream_team_events`, holding a stream of the process until
+    closed. Responses close it even when the client left before the first event.
+    """
+    def __init__(self, team_id):
+        self.events = stream_team_events(team_id)
+        self.closed = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            listener.release_stream()
+
+
+def open_team_stream(team_id):
+    """
+    Returns a `TeamEventStream` of the team, or None when the process already
+    serves `LIVE_FEED_MAX_STREAMS` streams.
+    """
+    if not listener.acquire_stream():
+        return None
+    return TeamEventStream(team_id)
@@ -0,0 +1,73 @@
+import importlib
+import json
+import os
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.six.moves import input
+
+from updates.benchmarks import BENCHMARKS, data
+
+
+class Command(BaseCommand):
+    help = 'Runs a benchmark against synthetic data generated in the configured database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument('--teams', type=int, default=100)
+        parser.add_argument('--members', type=int, default=10, help='Active members per team')
+        parser.add_argument('--days', type=int, default=90, help='Days of updates per member')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs of each measurement')
+        parser.add_argument('--output', help='JSON file the results are appended to')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data afterwards')
+        parser.add_argument('--noinput', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            confirm = input('This writes and deletes benchmark data in the configured database. '
+                            'Never run it against production. Continue? [y/N] ')
+            if confirm.lower() != 'y':
+                raise CommandError('Benchmark cancelled.')
+
+        benchmark = importlib.import_module(BENCHMARKS[options['name']])
+
+        # Leftovers of a previous run kept with --keep
+        data.delete_organisation()
+        try:
+            results = benchmark.run(options, self.stdout)
+        finally:
+            if not options['keep']:
+                data.delete_organisation()
+
+        if options['output']:
+            self.write_results(options, results)
+
+    def write_results(self, options, results):
+        runs = []
+        if os.path.exists(options['output']):
+            with open(options['output']) as results_file:
+                runs = json.load(results_file)
+
+        runs.append({
+            'benchmark': options['name'],
+            'commit': self.get_commit(),
+            'ran_at': timezone.now().isoformat(),
+            'options': {name: options[name] for name in ('teams', 'members', 'days', 'repeat')},
+            'results': results,
+        })
+        with open(options['output'], 'w') as results_file:
+            json.dump(runs, results_file, indent=2)
+
+        self.stdout.write('Results written to {}'.format(options['output']))
+
+    def get_commit(self):
+        """
+        Returns the checked out commit, so runs can be compared between commits.
+        """
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                           stderr=subprocess.DEVNULL).decode('ascii').strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from digestus.users.models import User
+from updates.models import APIToken
+
+
+class Command(BaseCommand):
+    help = 'Creates a token for the JSON API of a user and prints its key, which is not stored.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='', help='What the token is for, e.g. the integration using it')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('User {} does not exist.'.format(options['username']))
+
+        self.stdout.write(APIToken.objects.create_token(user, options['name']))
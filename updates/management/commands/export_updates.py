@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from updates.exports import EXPORT_FORMATS, get_export_queryset
+from updates.helpers import date_argument
+from updates.models import Team
+
+
+class Command(BaseCommand):
+    help = 'Streams the updates of a team as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_id', type=int)
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', dest='export_format')
+        parser.add_argument('--output', help='File to write to; defaults to standard output')
+        parser.add_argument('--since', type=date_argument, help='First date to export, YYYY-MM-DD')
+        parser.add_argument('--until', type=date_argument, help='Last date to export, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            team = Team.objects.get(pk=options['team_id'])
+        except Team.DoesNotExist:
+            raise CommandError('Team with {} ID does not exist.'.format(options['team_id']))
+
+        stream, _ = EXPORT_FORMATS[options['export_format']]
+        chunks = stream(get_export_queryset(team, options['since'], options['until']))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
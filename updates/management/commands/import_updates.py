@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from updates.imports import READERS, import_updates
+from updates.models import Team
+
+
+class Command(BaseCommand):
+    help = ('Imports historical updates of a team from CSV or JSON Lines. '
+            'Existing updates of a member for the same date are replaced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), dest='import_format',
+                            help='Defaults to the file extension')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help='Import the valid lines even if some lines are invalid')
+
+    def handle(self, *args, **options):
+        try:
+            team = Team.objects.get(pk=options['team_id'])
+        except Team.DoesNotExist:
+            raise CommandError('Team with {} ID does not exist.'.format(options['team_id']))
+
+        import_format = options['import_format'] or os.path.splitext(options['path'])[1].lstrip('.')
+        if import_format not in READERS:
+            raise CommandError('Unknown format {}, use --format.'.format(import_format))
+
+        dry_run = options['dry_run']
+        with open(options['path'], newline='') as import_file:
+            records = READERS[import_format](import_file)
+            # Validate everything first, so that nothing is written if the file has errors
+            if not options['skip_invalid'] and not dry_run:
+                result = import_updates(team, records, dry_run=True)
+                if result.errors:
+                    self.write_errors(result)
+                    raise CommandError('{} invalid lines, nothing imported. '
+                                       'Use --skip-invalid to import the valid lines.'.format(len(result.errors)))
+                import_file.seek(0)
+                records = READERS[import_format](import_file)
+
+            started = time.perf_counter()
+            result = import_updates(team, records, dry_run=dry_run)
+            elapsed = time.perf_counter() - started
+
+        self.write_errors(result)
+        rows = len(result.rows)
+        self.stdout.write(
+            '{} valid rows, {} invalid lines, {} memberships created.'.format(
+                rows, len(result.errors), result.created_memberships)
+        )
+        if not dry_run:
+            self.stdout.write('{} updates inserted, {} replaced in {:.2f}s ({:.0f} rows/s).'.format(
+                result.inserted, result.updated, elapsed, rows / elapsed if elapsed else rows))
+
+    def write_errors(self, result):
+        for line_number, message in result.warnings:
+            self.stderr.write('line {} (warning): {}'.format(line_number, message))
+        for line_number, message in result.errors:
+            self.stderr.write('line {}: {}'.format(line_number, message))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from updates.blockers import index_blockers
+from updates.helpers import date_argument
+
+
+class Command(BaseCommand):
+    help = ('Indexes the blockers of existing updates for recurring blocker detection, '
+            'e.g. after an import or for history recorded before they were indexed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_ids', nargs='*', type=int, help='Defaults to every team')
+        parser.add_argument('--since', type=date_argument, help='First date to index, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        count = index_blockers(options['team_ids'], options['since'])
+        self.stdout.write('{} updates indexed.'.format(count))
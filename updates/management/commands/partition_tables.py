@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from updates.partitions import MONTHS_AHEAD, PARTITIONED_MODELS, PartitioningError, convert_table, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = ('Converts the updates and inbound webhook requests tables into tables partitioned by month, '
+            'copying the rows in batches while the site keeps running, and creates the coming months\' '
+            'partitions. Needs PostgreSQL 13 or later.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows copied per transaction')
+        parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                            help='Months of partitions created ahead of the current one')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Keep the old tables, renamed to <table>_unpartitioned')
+
+    def handle(self, *args, **options):
+        try:
+            for model, field_name in PARTITIONED_MODELS:
+                convert_table(model, field_name, options['batch_size'], options['keep_old'], self.stdout.write)
+            for name in ensure_partitions(options['months_ahead']):
+                self.stdout.write('Created {}.'.format(name))
+        except PartitioningError as e:
+            raise CommandError(str(e))
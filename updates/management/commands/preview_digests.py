@@ -0,0 +1,61 @@
+import collections
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from updates.digests import DIGEST_TIMEZONE
+from updates.helpers import date_argument
+from updates.models import Team
+from updates.previews import preview
+from updates.replay import map_in_processes
+
+
+class Command(BaseCommand):
+    help = ("Renders the digest of every active team into a directory without sending them, and reports "
+            "each team's render time and sizes and the slowest and largest digests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='digest-previews',
+                            help='Directory of the digests and summary.json; defaults to digest-previews')
+        parser.add_argument('--date', type=date_argument, help='Day of the digests, YYYY-MM-DD; defaults to today')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Defaults to the number of CPUs')
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest and largest digests listed')
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.now().astimezone(DIGEST_TIMEZONE).date()
+        os.makedirs(options['output'], exist_ok=True)
+
+        team_ids = list(Team.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        jobs = [(team_id, day, options['output']) for team_id in team_ids]
+        self.stdout.write('Rendering {} digests for {} in {} processes.'.format(len(jobs), day, options['processes']))
+
+        previews = []
+        for done, result in enumerate(map_in_processes(preview, jobs, options['processes']), 1):
+            previews.append(result)
+            self.stdout.write(
+                '[{}/{}] Team {}: {} context {:.2f} ms render {:.2f} ms html {} B text {} B {}'.format(
+                    done, len(jobs), result.team_id, result.status, result.context_ms, result.render_ms,
+                    result.html_bytes, result.text_bytes, result.detail,
+                ).rstrip()
+            )
+
+        previews.sort(key=lambda result: result.team_id)
+        with open(os.path.join(options['output'], 'summary.json'), 'w') as output:
+            json.dump({'date': day.isoformat(), 'teams': [result._asdict() for result in previews]}, output, indent=2)
+
+        rendered = [result for result in previews if result.status == 'rendered']
+        for title, key, unit in (
+            ('Slowest', lambda result: result.context_ms + result.render_ms, 'ms'),
+            ('Largest', lambda result: result.html_bytes + result.text_bytes, 'B'),
+        ):
+            self.stdout.write('{} digests:'.format(title))
+            for result in sorted(rendered, key=key, reverse=True)[:options['top']]:
+                self.stdout.write('  Team {} {}: {:.2f} {}'.format(result.team_id, result.team_name, key(result), unit))
+
+        statuses = collections.Counter(result.status for result in previews)
+        self.stdout.write(', '.join('{} {}'.format(count, status) for status, count in sorted(statuses.items())))
+        if statuses['failed']:
+            raise CommandError('{} digests failed to render.'.format(statuses['failed']))
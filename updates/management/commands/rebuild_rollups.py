@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from updates.helpers import date_argument
+from updates.models import Team, Update
+from updates.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the daily participation rollups, e.g. to backfill them for history '
+            'recorded before they were maintained.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_ids', nargs='*', type=int, help='Defaults to every team')
+        parser.add_argument('--since', type=date_argument,
+                            help="First date, YYYY-MM-DD; defaults to the team's first update")
+        parser.add_argument('--until', type=date_argument, help='Last date, YYYY-MM-DD; defaults to today')
+
+    def handle(self, *args, **options):
+        teams = Team.objects.order_by('id')
+        if options['team_ids']:
+            teams = teams.filter(pk__in=options['team_ids'])
+
+        until = options['until'] or datetime.date.today()
+        for team_id in teams.values_list('id', flat=True):
+            since = options['since'] or (
+                Update.objects.filter(membership__team_id=team_id).aggregate(since=Min('for_date'))['since']
+            )
+            if since is None:
+                continue
+
+            # One team per transaction
+            refresh_rollups([team_id], since, until)
+            self.stdout.write('Team {}: {} to {}'.format(team_id, since, until))
@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from updates.helpers import date_argument
+from updates.models import Team
+from updates.reconciliation import reconcile_team_range
+
+
+class Command(BaseCommand):
+    help = ('Reconciles planned items with the items reported done, day by day, '
+            'e.g. after editing or importing past updates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_ids', nargs='*', type=int, help='Defaults to every active team')
+        parser.add_argument('--since', type=date_argument, required=True, help='First date, YYYY-MM-DD')
+        parser.add_argument('--until', type=date_argument, help='Last date, YYYY-MM-DD; defaults to today')
+
+    def handle(self, *args, **options):
+        if options['since'] is None:
+            raise CommandError('Invalid --since, expected YYYY-MM-DD.')
+
+        teams = Team.objects.order_by('id')
+        if options['team_ids']:
+            teams = teams.filter(pk__in=options['team_ids'])
+        else:
+            teams = teams.filter(is_active=True)
+
+        until = options['until'] or datetime.date.today()
+        for team in teams:
+            reconcile_team_range(team, options['since'], until)
+            self.stdout.write('{}: {} to {}'.format(team, options['since'], until))
@@ -0,0 +1,55 @@
+import collections
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from updates.helpers import date_argument
+from updates.models import Team
+from updates.replay import get_jobs, replay_all
+
+
+class Command(BaseCommand):
+    help = ('Sends the digests of teams again for a range of days, in a pool of processes; '
+            'with --dry-run, writes them to files instead.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_ids', nargs='*', type=int, help='Defaults to every active team')
+        parser.add_argument('--since', type=date_argument, required=True, help='First date, YYYY-MM-DD')
+        parser.add_argument('--until', type=date_argument, help='Last date, YYYY-MM-DD; defaults to --since')
+        parser.add_argument('--project-managers', action='store_true',
+                            help="Replay the project managers' digests instead")
+        parser.add_argument('--all-days', action='store_true',
+                            help="Include the days the teams do not get digests")
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Defaults to the number of CPUs')
+        parser.add_argument('--dry-run', action='store_true', help='Write the emails instead of sending them')
+        parser.add_argument('--output', default='digest-replay',
+                            help='Directory of the emails of a dry run; defaults to digest-replay')
+
+    def handle(self, *args, **options):
+        until = options['until'] or options['since']
+        if until < options['since']:
+            raise CommandError('--until is before --since.')
+
+        teams = Team.objects.filter(is_active=True).exclude(digest_days_sent__len=0).order_by('id')
+        if options['team_ids']:
+            teams = teams.filter(pk__in=options['team_ids'])
+
+        jobs = get_jobs(
+            list(teams), options['since'], until,
+            for_project_managers=options['project_managers'],
+            output_dir=options['output'] if options['dry_run'] else None,
+            all_days=options['all_days'],
+        )
+        self.stdout.write('Replaying {} digests in {} processes.'.format(len(jobs), options['processes']))
+
+        statuses = collections.Counter()
+        for done, result in enumerate(replay_all(jobs, options['processes']), 1):
+            statuses[result.status] += 1
+            self.stdout.write('[{}/{}] Team {} for {}: {} in {:.2f} s {}'.format(
+                done, len(jobs), result.job.team_id, result.job.day, result.status, result.seconds, result.detail,
+            ).rstrip())
+
+        self.stdout.write(', '.join('{} {}'.format(count, status) for status, count in sorted(statuses.items())))
+        if statuses['failed']:
+            raise CommandError('{} digests failed.'.format(statuses['failed']))
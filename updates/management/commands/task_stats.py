@@ -0,0 +1,42 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from updates.instrumentation import METRICS, get_histograms, get_percentile
+
+
+class Command(BaseCommand):
+    help = 'Prints the histograms of the wall time, queries and other measurements of the tasks run recently.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1, help='Number of days up to today; defaults to 1')
+        parser.add_argument('--task', help='Only the task with this name, e.g. updates.tasks.send_digest')
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        totals = {}
+        for days_ago in range(options['days']):
+            for name, histograms in get_histograms(today - datetime.timedelta(days=days_ago)).items():
+                task_totals = totals.setdefault(name, {})
+                for metric, histogram in histograms.items():
+                    merged = task_totals.setdefault(metric, [[bucket, 0] for bucket, _ in histogram])
+                    for row, (_, count) in zip(merged, histogram):
+                        row[1] += count
+
+        for name in sorted(totals):
+            if options['task'] and name != options['task']:
+                continue
+
+            calls = sum(count for _, count in totals[name]['wall_ms'])
+            self.stdout.write('{}: {} calls'.format(name, calls))
+            for metric in METRICS:
+                histogram = totals[name][metric]
+                self.stdout.write('  {}: p50 <= {}, p95 <= {}, max <= {}'.format(
+                    metric,
+                    get_percentile(histogram, 0.5),
+                    get_percentile(histogram, 0.95),
+                    get_percentile(histogram, 1),
+                ))
+                self.stdout.write('    ' + ' '.join(
+                    '<={}:{}'.format(bucket, count) for bucket, count in histogram if count
+                ))
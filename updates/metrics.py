@@ -0,0 +1,96 @@
+"""
+Prometheus metrics of the web and worker processes.
+
+With the `prometheus_multiproc_dir` environment variable set, every process
+writes its samples to that directory and `render_metrics` sums them, so a
+scrape of any web worker reports the totals of all processes of its container.
+The file names only hold PIDs, so each container has a directory of its own,
+named after its `METRICS_GROUP` in a volume shared by all containers (see
+compose/django/entrypoint.sh); `render_metrics(group)` reports the totals of
+another container, e.g. `digest-worker`. Without the variable, e.g. in
+development, only the samples of the current process are reported.
+"""
+import os
+import re
+
+from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+
+DIGESTS_SENT = Counter('digestus_digests_sent_total', 'Digest emails sent.', ['kind'])
+REMINDERS_SENT = Counter('digestus_reminders_sent_total', 'Reminder emails sent.')
+INBOUND_EVENTS = Counter('digestus_inbound_events_total', 'Inbound email webhook events processed.', ['result'])
+
+# Connection handling of the Celery workers, see worker_db.py
+DB_CONNECTIONS_OPENED = Counter('digestus_db_connections_opened_total', 'Database connections opened.', ['alias'])
+DB_CONNECTIONS_REUSED = Counter(
+    'digestus_db_connections_reused_total', 'Worker tasks started on an open database connection.', ['alias'],
+)
+DB_CONNECTIONS_CLOSED = Counter(
+    'digestus_db_connections_closed_total', 'Database connections closed before or after worker tasks.',
+    ['alias', 'reason'],
+)
+DB_HEALTH_CHECKS = Counter('digestus_db_health_checks_total', 'Health checks of idle worker connections.',
+                           ['alias', 'result'])
+
+EMAIL_SEND_SECONDS = Histogram(
+    'digestus_email_send_seconds', 'Time spent handing an email to the email backend.', ['kind'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RENDER_SECONDS = Histogram(
+    'digestus_render_seconds', 'Time spent rendering an email template.', ['template'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+QUEUE_LAG_SECONDS = Histogram(
+    'digestus_task_queue_lag_seconds', 'Time from the ETA of a scheduled task until it started.', ['task'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600),
+)
+
+
+GROUP_RE = re.compile(r'^[\w-]+$')
+
+
+class UnknownGroup(LookupError):
+    pass
+
+
+def get_group_dir(group=None):
+    """
+    Returns the directory of the samples of `group`, or of this container.
+    """
+    path = os.environ.get('prometheus_multiproc_dir')
+    if group is None:
+        return path
+
+    if not path or not GROUP_RE.match(group):
+        raise UnknownGroup(group)
+    path = os.path.join(os.path.dirname(path.rstrip('/')), group)
+    if not os.path.isdir(path):
+        raise UnknownGroup(group)
+    return path
+
+
+def render_metrics(group=None):
+    """
+    Returns the metrics of the processes of `group`, or of this container, in
+    the Prometheus text format and its content type.
+
+    Raises `UnknownGroup` when there are no samples of `group`.
+    """
+    path = get_group_dir(group)
+    if path:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=path)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """
+    Drops the gauge samples of the exited process `pid` of this container.
+    """
+    if os.environ.get('prometheus_multiproc_dir'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid, os.environ['prometheus_multiproc_dir'])
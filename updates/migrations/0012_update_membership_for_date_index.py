@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0011_membership_role'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='update',
+            index_together=set([('membership', 'for_date')]),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}.done, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}.will_do, '')), 'B') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}.blocker, '')), 'C')
+"""
+
+# Statements are listed one by one so that Django does not have to split the
+# function body itself.
+FORWARD_SQL = [
+    "ALTER TABLE updates_update ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION updates_update_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {vector};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(vector=SEARCH_VECTOR_SQL.format(row='NEW')),
+    """
+    CREATE TRIGGER updates_update_search_vector
+        BEFORE INSERT OR UPDATE OF done, will_do, blocker ON updates_update
+        FOR EACH ROW EXECUTE PROCEDURE updates_update_search_vector()
+    """,
+    "UPDATE updates_update SET search_vector = {vector}".format(
+        vector=SEARCH_VECTOR_SQL.format(row='updates_update')),
+    "CREATE INDEX updates_update_search_vector_gin ON updates_update USING gin (search_vector)",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER updates_update_search_vector ON updates_update",
+    "DROP FUNCTION updates_update_search_vector()",
+    "ALTER TABLE updates_update DROP COLUMN search_vector",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0014_timestamps'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Notifications are delivered when the transaction commits; see updates.live
+FORWARD_SQL = [
+    """
+    CREATE FUNCTION updates_update_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('updates_update', json_build_object(
+            'id', NEW.id,
+            'membership_id', NEW.membership_id,
+            'team_id', (SELECT team_id FROM updates_membership WHERE id = NEW.membership_id),
+            'for_date', NEW.for_date,
+            'op', lower(TG_OP)
+        )::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER updates_update_notify
+        AFTER INSERT OR UPDATE ON updates_update
+        FOR EACH ROW EXECUTE PROCEDURE updates_update_notify()
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER updates_update_notify ON updates_update",
+    "DROP FUNCTION updates_update_notify()",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0015_update_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
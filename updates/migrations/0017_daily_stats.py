@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0016_update_notify'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('expected', models.BooleanField(default=False)),
+                ('answered', models.BooleanField(default=False)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('will_do_count', models.PositiveIntegerField(default=0)),
+                ('blocker_count', models.PositiveIntegerField(default=0)),
+                ('membership', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='updates.Membership')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='membership_daily_stats', to='updates.Team')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TeamDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('expected_count', models.PositiveIntegerField(default=0)),
+                ('responded_count', models.PositiveIntegerField(default=0)),
+                ('answered_count', models.PositiveIntegerField(default=0)),
+                ('blocked_count', models.PositiveIntegerField(default=0)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('will_do_count', models.PositiveIntegerField(default=0)),
+                ('blocker_count', models.PositiveIntegerField(default=0)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='updates.Team')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='membershipdailystats',
+            unique_together=set([('membership', 'date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='membershipdailystats',
+            index_together=set([('team', 'date')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='teamdailystats',
+            unique_together=set([('team', 'date')]),
+        ),
+    ]
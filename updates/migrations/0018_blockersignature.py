@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0017_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockerSignature',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('for_date', models.DateField()),
+                ('position', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('minhash', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('bands', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('first_reported_on', models.DateField()),
+                ('previous', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='updates.BlockerSignature')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocker_signatures', to='updates.Team')),
+                ('update', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocker_signatures', to='updates.Update')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='blockersignature',
+            unique_together=set([('update', 'position')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='blockersignature',
+            index_together=set([('team', 'for_date')]),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX updates_blockersignature_bands_gin ON updates_blockersignature USING gin (bands)',
+            'DROP INDEX updates_blockersignature_bands_gin',
+        ),
+    ]
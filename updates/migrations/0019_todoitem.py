@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0018_blockersignature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('for_date', models.DateField()),
+                ('position', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('streak', models.PositiveSmallIntegerField(default=1)),
+                ('first_planned_on', models.DateField()),
+                ('done_on', models.DateField(null=True)),
+                ('done_text', models.TextField(blank=True)),
+                ('match_score', models.FloatField(null=True)),
+                ('carried_from', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='updates.TodoItem')),
+                ('membership', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_items', to='updates.Membership')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_items', to='updates.Team')),
+                ('update', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_items', to='updates.Update')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='todoitem',
+            unique_together=set([('update', 'position')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='todoitem',
+            index_together=set([('team', 'for_date')]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0019_todoitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='rollup_digest_period',
+            field=models.CharField(blank=True, choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], help_text='Also send a summary of the past week or month to the project managers, at `send_digest_at`.', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='rollup_digest_weekday',
+            field=models.IntegerField(default=0, help_text='Day weekly summaries are sent on, 0 being Monday. Monthly summaries are sent on the 1st.', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(6)]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# A partitioned `updates_update` cannot be referenced by foreign keys on `id`
+# alone; see updates.partitions
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0020_team_rollup_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blockersignature',
+            name='update',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='blocker_signatures', to='updates.Update'),
+        ),
+        migrations.AlterField(
+            model_name='todoitem',
+            name='update',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='todo_items', to='updates.Update'),
+        ),
+        migrations.AlterField(
+            model_name='inboundwebhookrequest',
+            name='daily_update',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_requests', to='updates.Update'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Bulk writes set `digestus.skip_update_notify` for their transaction, see
+# updates.live.skip_update_notifications. Before PostgreSQL 13 every NOTIFY
+# compares its payload with all the pending ones, so a notification per row
+# makes a bulk transaction quadratic. The setting is unknown to sessions that
+# never set it, which `current_setting` reports as an error before 9.6.
+FORWARD_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION updates_update_notify() RETURNS trigger AS $$
+    BEGIN
+        BEGIN
+            IF current_setting('digestus.skip_update_notify') = 'on' THEN
+                RETURN NULL;
+            END IF;
+        EXCEPTION WHEN undefined_object THEN
+            NULL;
+        END;
+
+        PERFORM pg_notify('updates_update', json_build_object(
+            'id', NEW.id,
+            'membership_id', NEW.membership_id,
+            'team_id', (SELECT team_id FROM updates_membership WHERE id = NEW.membership_id),
+            'for_date', NEW.for_date,
+            'op', lower(TG_OP)
+        )::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+REVERSE_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION updates_update_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('updates_update', json_build_object(
+            'id', NEW.id,
+            'membership_id', NEW.membership_id,
+            'team_id', (SELECT team_id FROM updates_membership WHERE id = NEW.membership_id),
+            'for_date', NEW.for_date,
+            'op', lower(TG_OP)
+        )::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0021_update_references_without_constraints'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import copy
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Model, field of the foreign keys to `Update`
+REFERENCES = (
+    ('blockersignature', 'update'),
+    ('todoitem', 'update'),
+    ('inboundwebhookrequest', 'daily_update'),
+)
+
+
+def is_update_partitioned(schema_editor):
+    # pg_partitioned_table is new in PostgreSQL 10
+    if schema_editor.connection.pg_version < 100000:
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+                           WHERE c.relname = 'updates_update' AND pg_table_is_visible(c.oid))
+        """)
+        return cursor.fetchone()[0]
+
+
+def set_constraints(apps, schema_editor, db_constraint):
+    for model_name, field_name in REFERENCES:
+        model = apps.get_model('updates', model_name)
+        field = model._meta.get_field(field_name)
+        new_field = copy.copy(field)
+        new_field.db_constraint = db_constraint
+        schema_editor.alter_field(model, field, new_field)
+
+
+def add_constraints(apps, schema_editor):
+    # A partitioned `Update` cannot be referenced; `updates.partitions.convert_table` dropped them
+    if not is_update_partitioned(schema_editor):
+        set_constraints(apps, schema_editor, True)
+
+
+def drop_constraints(apps, schema_editor):
+    set_constraints(apps, schema_editor, False)
+
+
+# Migration 0021 stopped enforcing the foreign keys to `Update` everywhere, for
+# the sake of partitioning that most servers cannot run. They are enforced
+# again until `manage.py partition_tables` converts the table.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('updates', '0022_update_notify_skip'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_constraints, drop_constraints),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='blockersignature',
+                    name='update',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocker_signatures', to='updates.Update'),
+                ),
+                migrations.AlterField(
+                    model_name='todoitem',
+                    name='update',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_items', to='updates.Update'),
+                ),
+                migrations.AlterField(
+                    model_name='inboundwebhookrequest',
+                    name='daily_update',
+                    field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_requests', to='updates.Update'),
+                ),
+            ],
+        ),
+    ]
@@ -1,15 +1,97 @@
+import hashlib
+import json
+import re
+
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django.utils.translation import ugettext_lazy as _
 
 from timezone_field import TimeZoneField
 from model_utils.models import TimeStampedModel
+import pytz
 
 from digestus.users.models import User
 
+from .helpers import gather_on_commit, to_date
+from .reference import get_role_name
+
+
+class TeamQuerySet(models.QuerySet):
+    def touch(self):
+        """
+        Bumps `modified` of the teams without sending signals.
+
+        `Team.modified` doubles as the version stamp of everything shown for a
+        team, so it is touched whenever its memberships or updates change.
+        """
+        return self.update(modified=timezone.now())
+
+    def for_member(self, user):
+        """
+        Returns the teams `user` is an active member of, the teams whose pages,
+        exports and API a user may use.
+        """
+        return self.filter(memberships__user=user, memberships__is_active=True)
 
-class Team(models.Model):
+    def with_summary(self, user, for_date):
+        """
+        Annotates each team with:
+            `member_count`: number of active members
+            `answered_count`: number of active members with an update for `for_date`
+            `viewer_role`: role name of `user` in the team
+            `last_update_on`: date of the latest update of the team
+
+        Each value is a correlated subquery, so the annotations do not multiply
+        rows and the whole list is fetched in a single query.
+        """
+        context = {
+            'team': self.model._meta.db_table,
+            'membership': Membership._meta.db_table,
+            'role': Role._meta.db_table,
+            'update': Update._meta.db_table,
+        }
+        member_count = """
+            SELECT COUNT(*) FROM {membership} m
+            WHERE m.team_id = {team}.id AND m.is_active
+        """
+        answered_count = """
+            SELECT COUNT(DISTINCT u.membership_id) FROM {update} u
+            INNER JOIN {membership} m ON m.id = u.membership_id
+            WHERE m.team_id = {team}.id AND m.is_active AND u.for_date = %s
+        """
+        viewer_role = """
+            SELECT r.name FROM {membership} m
+            INNER JOIN {role} r ON r.id = m.role_id
+            WHERE m.team_id = {team}.id AND m.user_id = %s
+        """
+        last_update_on = """
+            SELECT MAX(u.for_date) FROM {update} u
+            INNER JOIN {membership} m ON m.id = u.membership_id
+            WHERE m.team_id = {team}.id
+        """
+        return self.annotate(
+            member_count=RawSQL(member_count.format(**context), (),
+                                output_field=models.IntegerField()),
+            answered_count=RawSQL(answered_count.format(**context), (to_date(for_date),),
+                                  output_field=models.IntegerField()),
+            viewer_role=RawSQL(viewer_role.format(**context), (user.pk,),
+                               output_field=models.CharField()),
+            last_update_on=RawSQL(last_update_on.format(**context), (),
+                                  output_field=models.DateField()),
+        )
+
+
+ROLLUP_DIGEST_PERIODS = (
+    ('weekly', 'Weekly'),
+    ('monthly', 'Monthly'),
+)
+
+
+class Team(TimeStampedModel):
     name = models.CharField(max_length=25, unique=True)
     description = models.TextField(blank=True)
     email = models.EmailField(unique=True)
@@ -21,6 +103,17 @@ class Team(models.Model):
                                   default=[])
     send_digest_at = models.TimeField()
     send_reminders_at = models.TimeField()
+    rollup_digest_period = models.CharField(
+        max_length=10,
+        choices=ROLLUP_DIGEST_PERIODS,
+        blank=True,
+        help_text='Also send a summary of the past week or month to the project managers, at `send_digest_at`.'
+    )
+    rollup_digest_weekday = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(6)],
+        help_text='Day weekly summaries are sent on, 0 being Monday. Monthly summaries are sent on the 1st.'
+    )
     is_active = models.BooleanField(default=True, verbose_name="Active")
     subaccount_id = models.SlugField(max_length=255, unique=True, null=True)
     silent_recipients = models.ManyToManyField(
@@ -30,6 +123,8 @@ class Team(models.Model):
                   They can access the platform using their email and password.'
     )
 
+    objects = TeamQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -60,41 +155,76 @@ class Team(models.Model):
                 },
             ]
         """
-        members_and_updates = []
+        memberships = list(
+            self.memberships.filter(is_active=True)
+                            .select_related('user')
+                            .order_by('id')
+        )
+        updates = (
+            Update.objects.filter(membership__in=[membership.id for membership in memberships])
+                          .for_day(for_date)
+                          .order_by('-id')
+        )
+        # Newest first, so that each member's first update of the day is the one kept
+        first_updates = {update.membership_id: update for update in updates}
 
-        for membership in self.memberships.filter(is_active=True):
-            # NOTE: Needs improvement?
-            update = (
-                membership.updates.filter(for_date__year=for_date.year,
-                                          for_date__month=for_date.month,
-                                          for_date__day=for_date.day)
-                                  .first()
-            )
+        members_and_updates = []
+        for membership in memberships:
             members_and_updates.append({
                 'member': membership.user.get_full_name() or membership.user.email,
-                'update': update,
-                'role': membership.role.name,
+                'update': first_updates.get(membership.id),
+                'role': get_role_name(membership.role_id),
             })
 
         return members_and_updates
 
-    def get_recipients(self, for_project_managers=False):
+    def get_recipients(self, for_project_managers=False, exclude_combined=False):
         """
         If `for_project_managers` is True, only return emails of members who are Project Managers
+
+        If `exclude_combined` is True, leave out users who receive the combined
+        digest of all their teams instead.
         """
         if for_project_managers:
             return [self.created_by.email]
         else:
-            team_members = self.memberships.filter(is_active=True).values_list(
-                'user__email', flat=True
-            )
-            silent_recipients = self.silent_recipients.values_list('user__email', flat=True)
+            team_members = self.memberships.filter(is_active=True)
+            silent_recipients = self.silent_recipients.all()
+            if exclude_combined:
+                team_members = team_members.filter(user__combined_digest=False)
+                silent_recipients = silent_recipients.filter(user__combined_digest=False)
+            creator = [] if exclude_combined and self.created_by.combined_digest else [self.created_by.email]
 
             return list(
-                set(list(team_members) + list(silent_recipients) + [self.created_by.email, ])
+                set(list(team_members.values_list('user__email', flat=True)) +
+                    list(silent_recipients.values_list('user__email', flat=True)) +
+                    creator)
             )
 
 
+class TeamTouch(object):
+    """
+    The teams touched by a transaction, see `touch_on_commit`.
+    """
+    def __init__(self):
+        self.team_ids = set()
+
+    def add(self, team_ids):
+        self.team_ids.update(team_ids)
+
+    def __call__(self):
+        Team.objects.filter(pk__in=sorted(self.team_ids)).touch()
+
+
+def touch_on_commit(team_ids):
+    """
+    Touches the teams once the current transaction commits, a single time
+    however many changes of the transaction touch them, so that a transaction
+    does not rewrite the team rows and wait on their locks for every change.
+    """
+    gather_on_commit(TeamTouch, team_ids)
+
+
 class Role(models.Model):
     """
     User's role in a team.
@@ -107,7 +237,7 @@ class Role(models.Model):
         return self.name
 
 
-class Membership(models.Model):
+class Membership(TimeStampedModel):
     team = models.ForeignKey(Team, related_name='memberships')
     user = models.ForeignKey(User, related_name='memberships')
     role = models.ForeignKey(Role, on_delete=models.CASCADE, null=True)
@@ -121,7 +251,66 @@ class Membership(models.Model):
                                 self.user.name)
 
 
-class Update(models.Model):
+class UpdateQuerySet(models.QuerySet):
+    """
+    Date lookups on `Update.for_date`.
+
+    These compile to plain equality/range conditions on the column so that the
+    (membership, for_date) index can be used. Avoid `for_date__year`,
+    `for_date__month` and `for_date__day`; they become `EXTRACT()` calls that
+    force a sequential scan.
+    """
+
+    def for_day(self, for_date):
+        """
+        Updates for a single day.
+
+        Arguments:
+            `for_date`: `datetime.date` or `datetime.datetime` object
+        """
+        return self.filter(for_date=to_date(for_date))
+
+    def between(self, start_date, end_date):
+        """
+        Updates from `start_date` up to and including `end_date`.
+        """
+        return self.filter(for_date__gte=to_date(start_date),
+                           for_date__lte=to_date(end_date))
+
+    def search(self, text, sections=None):
+        """
+        Full-text search over `done`, `will_do` and `blocker`, best match first.
+
+        Updates are matched when they contain every word of `text`. Each
+        update is annotated with its `rank`.
+
+        The `search_vector` column, its trigger and its GIN index are created
+        by migration 0015; the sections are stored with the weights in
+        `SEARCH_WEIGHTS`, so `sections` limits matches to some of them.
+
+        Arguments:
+            `text`: search terms
+            `sections`: optional list of field names, e.g. ['blocker']
+        """
+        words = re.findall(r'[^\W_]+', text)
+        if not words:
+            return self.none()
+
+        weights = ''.join(Update.SEARCH_WEIGHTS[section] for section in sections or ())
+        query = ' & '.join('{}:{}'.format(word, weights) if weights else word for word in words)
+        table = self.model._meta.db_table
+
+        return (
+            self.extra(where=['{}.search_vector @@ to_tsquery(%s, %s)'.format(table)],
+                       params=[Update.SEARCH_CONFIG, query])
+                .annotate(rank=RawSQL('ts_rank({}.search_vector, to_tsquery(%s, %s))'.format(table),
+                                      (Update.SEARCH_CONFIG, query),
+                                      output_field=models.FloatField()))
+                .order_by('-rank', '-for_date', '-id')
+        )
+
+
+class Update(TimeStampedModel):
     membership = models.ForeignKey(Membership, related_name='updates')
     for_date = models.DateField()
     done = models.TextField(
@@ -134,10 +323,34 @@ class Update(models.Model):
         blank=True
     )
 
+    # Text search configuration and section weights of `search_vector`
+    SEARCH_CONFIG = 'english'
+    SEARCH_WEIGHTS = {
+        'done': 'A',
+        'will_do': 'B',
+        'blocker': 'C',
+    }
+
+    objects = UpdateQuerySet.as_manager()
+
+    class Meta:
+        index_together = (
+            ('membership', 'for_date'),
+            # Keyset pagination of the updates API
+            ('for_date', 'id'),
+        )
+
     def __str__(self):
         return '{} - {}'.format(self.membership.user.get_full_name(),
                                 self.for_date)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so that cached digests of the previous day can be invalidated when `for_date` changes
+        instance._loaded_for_date = instance.__dict__.get('for_date')
+        return instance
+
     # TODO: improve; use lambda + filter?
     def done_as_list(self):
         return [
@@ -169,6 +382,123 @@ class Update(models.Model):
 
 
 
+class MembershipDailyStats(models.Model):
+    """
+    Participation of a member on one day, maintained by `updates.rollups`.
+
+    A row exists for every day the member was expected to send an update and
+    for every day they sent one. Counts are of the first update of the day,
+    the one shown in the digest.
+    """
+    membership = models.ForeignKey(Membership, related_name='daily_stats')
+    # Denormalized so team reports do not join memberships
+    team = models.ForeignKey(Team, related_name='membership_daily_stats')
+    date = models.DateField()
+    expected = models.BooleanField(default=False)
+    answered = models.BooleanField(default=False)
+    done_count = models.PositiveIntegerField(default=0)
+    will_do_count = models.PositiveIntegerField(default=0)
+    blocker_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('membership', 'date'),)
+        index_together = (('team', 'date'),)
+
+    def __str__(self):
+        return '{} - {}'.format(self.membership_id, self.date)
+
+
+class TeamDailyStats(models.Model):
+    """
+    Participation of a team on one day, aggregated from its `MembershipDailyStats`.
+    """
+    team = models.ForeignKey(Team, related_name='daily_stats')
+    date = models.DateField()
+    expected_count = models.PositiveIntegerField(default=0)
+    # Expected members that sent an update
+    responded_count = models.PositiveIntegerField(default=0)
+    # All members that sent an update, expected or not
+    answered_count = models.PositiveIntegerField(default=0)
+    # Members that reported at least one blocker
+    blocked_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+    will_do_count = models.PositiveIntegerField(default=0)
+    blocker_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('team', 'date'),)
+
+    def __str__(self):
+        return '{} - {}'.format(self.team_id, self.date)
+
+
+class BlockerSignature(models.Model):
+    """
+    MinHash signature of one blocker item of an update, maintained by
+    `updates.blockers`.
+
+    `bands` holds the locality-sensitive hashes used to look up similar
+    blockers through a GIN index (migration 0018). `previous` is the most
+    similar blocker of the team on an earlier day, if any, and
+    `first_reported_on` the day the chain of similar blockers started.
+    """
+    # No longer enforced by the database once `Update` is partitioned, see `updates.partitions`
+    update = models.ForeignKey(Update, related_name='blocker_signatures')
+    team = models.ForeignKey(Team, related_name='blocker_signatures')
+    for_date = models.DateField()
+    # Index in `Update.blocker_as_list()`
+    position = models.PositiveSmallIntegerField()
+    text = models.TextField()
+    minhash = ArrayField(models.IntegerField())
+    bands = ArrayField(models.BigIntegerField())
+    previous = models.ForeignKey('self', null=True, on_delete=models.SET_NULL, related_name='+')
+    first_reported_on = models.DateField()
+
+    class Meta:
+        unique_together = (('update', 'position'),)
+        index_together = (('team', 'for_date'),)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def days_reported(self):
+        return (self.for_date - self.first_reported_on).days + 1
+
+
+class TodoItem(models.Model):
+    """
+    One `will_do` item of an update, reconciled against the later `done`
+    items of the member by `updates.reconciliation`.
+
+    An item planned again on a later day is stored again with `carried_from`
+    pointing at the earlier one; `streak` counts the days it has been planned
+    in a row and `first_planned_on` is the day of the first of them.
+    """
+    # No longer enforced by the database once `Update` is partitioned, see `updates.partitions`
+    update = models.ForeignKey(Update, related_name='todo_items')
+    membership = models.ForeignKey(Membership, related_name='todo_items')
+    team = models.ForeignKey(Team, related_name='todo_items')
+    for_date = models.DateField()
+    # Index in `Update.will_do_as_list()`
+    position = models.PositiveSmallIntegerField()
+    text = models.TextField()
+    carried_from = models.ForeignKey('self', null=True, on_delete=models.SET_NULL, related_name='+')
+    streak = models.PositiveSmallIntegerField(default=1)
+    first_planned_on = models.DateField()
+    done_on = models.DateField(null=True)
+    done_text = models.TextField(blank=True)
+    # 1.0 for matching words, lower for fuzzy matches
+    match_score = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = (('update', 'position'),)
+        index_together = (('team', 'for_date'),)
+
+    def __str__(self):
+        return self.text
+
+
 class SilentRecipient(models.Model):
     user = models.OneToOneField(User)
 
@@ -188,6 +518,7 @@ class InboundWebhookRequest(TimeStampedModel):
         'Update',
         blank=True,
         null=True,
+        # No longer enforced by the database once `Update` is partitioned, see `updates.partitions`
         related_name='webhook_requests',
     )
 
@@ -198,3 +529,44 @@ class InboundWebhookRequest(TimeStampedModel):
             sender,
             self.timestamp.strftime('%c'),
         )
+
+
+class APITokenQuerySet(models.QuerySet):
+    def create_token(self, user, name=''):
+        """
+        Creates a token of `user` and returns its key.
+        """
+        key = get_random_string(40)
+        self.create(user=user, name=name, key_digest=APIToken.get_digest(key))
+        return key
+
+    def get_user(self, key):
+        """
+        Returns the active user of the token with `key`, or None.
+        """
+        token = self.select_related('user').filter(key_digest=APIToken.get_digest(key)).first()
+        if token is None or not token.user.is_active:
+            return None
+        return token.user
+
+
+class APIToken(TimeStampedModel):
+    """
+    Bearer token of a user for the JSON API, for clients that cannot log in
+    with a session, see `updates.api`.
+
+    Only the SHA-256 digest of the key is stored; the key itself is shown once,
+    by `APIToken.objects.create_token`.
+    """
+    user = models.ForeignKey(User, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    key_digest = models.CharField(max_length=64, unique=True)
+
+    objects = APITokenQuerySet.as_manager()
+
+    def __str__(self):
+        return '{} - {}'.format(self.user, self.name)
+
+    @staticmethod
+    def get_digest(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
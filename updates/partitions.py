@@ -0,0 +1,333 @@
+"""
+Monthly range partitioning of `Update` by `for_date` and of
+`InboundWebhookRequest` by `timestamp`.
+
+Each month is its own partition, named like `updates_update_y2016m05`, so
+queries for a day, like today's digest, only touch that month's partition.
+Rows outside of every month's range go to the `_default` partition.
+`ensure_partitions()` creates the partitions of the coming months; the
+`create_partitions` task runs it daily.
+
+The tables are converted by `manage.py partition_tables`, see
+`convert_table()`. Native partitioning of these tables needs PostgreSQL 13
+or later (row triggers on partitioned tables, primary keys including the
+partition key). A partitioned table can only enforce primary keys that
+include the partition key, so the primary keys become (id, <partition
+column>) and `convert_table()` drops the foreign keys referencing the table;
+the ORM still cascades deletes. Servers that never convert keep them.
+"""
+import datetime
+import logging
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import InboundWebhookRequest, Update
+
+logger = logging.getLogger('put')
+
+MIN_SERVER_VERSION = 130000
+# Older servers have no partitioned tables at all
+MIN_PARTITIONING_VERSION = 100000
+
+# Model -> name of the field partitioned on
+PARTITIONED_MODELS = (
+    (Update, 'for_date'),
+    (InboundWebhookRequest, 'timestamp'),
+)
+
+# Months of partitions kept ahead of the current one
+MONTHS_AHEAD = 3
+
+# Suffix of the partitioned table, its indexes and constraints while the table is converted
+CONVERTING_SUFFIX = '_p'
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def check_server_version():
+    if connection.pg_version < MIN_SERVER_VERSION:
+        raise PartitioningError(
+            'Partitioning needs PostgreSQL 13 or later, the server is {}.'.format(connection.pg_version)
+        )
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+                           WHERE c.relname = %s AND pg_table_is_visible(c.oid))
+        """, [table])
+        return cursor.fetchone()[0]
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return datetime.date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(table, month):
+    return '{}_y{:04d}m{:02d}'.format(table, month.year, month.month)
+
+
+def create_partitions(table, first_month, last_month, parent=None):
+    """
+    Creates the partitions of `table` for `first_month` through `last_month`
+    that do not exist yet, and the default partition. `parent` is the
+    partitioned table, `table` unless it is being converted.
+
+    Returns the names of the partitions created.
+    """
+    parent = parent or table
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relname FROM pg_class WHERE relname LIKE %s', [table + r'\_%'])
+        existing = {row[0] for row in cursor.fetchall()}
+
+        month = first_month
+        while month <= last_month:
+            name = partition_name(table, month)
+            if name not in existing:
+                # Fails when the default partition already holds rows of the month
+                cursor.execute(
+                    'CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'.format(name, parent),
+                    [month.isoformat(), add_months(month, 1).isoformat()],
+                )
+                created.append(name)
+            month = add_months(month, 1)
+
+        default = table + '_default'
+        if default not in existing:
+            cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(default, parent))
+            created.append(default)
+
+    for name in created:
+        logger.info('Created partition %s.', name)
+    return created
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, today=None):
+    """
+    Creates the missing partitions of the partitioned tables up to
+    `months_ahead` months from the month of `today`. Does nothing until the
+    tables are converted.
+    """
+    if connection.pg_version < MIN_PARTITIONING_VERSION:
+        return []
+
+    today = today or timezone.now().date()
+    created = []
+    for model, _ in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        if is_partitioned(table):
+            month = month_start(today)
+            with transaction.atomic():
+                created += create_partitions(table, month, add_months(month, months_ahead))
+    return created
+
+
+def rename_in_definition(definition, table, new_table):
+    """
+    Replaces the table in the definition of an index as returned by
+    `pg_get_indexdef()`.
+    """
+    return re.sub(r' ON (ONLY )?(\w+\.)?{} '.format(re.escape(table)), r' ON \g<1>{} '.format(new_table), definition)
+
+
+def get_indexes(cursor, table):
+    """
+    Returns (name, definition) of the indexes of `table` apart from unique ones.
+    """
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass AND NOT i.indisunique
+        ORDER BY c.relname
+    """, [table])
+    return cursor.fetchall()
+
+
+def get_foreign_keys(cursor, table):
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+        ORDER BY conname
+    """, [table])
+    return cursor.fetchall()
+
+
+def get_references(cursor, table):
+    """
+    Returns (table, name) of the foreign keys of other tables referencing `table`.
+    """
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE confrelid = %s::regclass AND contype = 'f' AND conrelid <> confrelid
+            -- Keys of partitions go with the key of their partitioned table
+            AND conparentid = 0
+        ORDER BY conrelid::regclass::text, conname
+    """, [table])
+    return cursor.fetchall()
+
+
+def get_triggers(cursor, table):
+    cursor.execute("""
+        SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal
+        ORDER BY tgname
+    """, [table])
+    return cursor.fetchall()
+
+
+def check_copied(cursor, table, new_table, after_id, until_id=None):
+    """
+    Raises `PartitioningError` unless `new_table` has as many rows with IDs
+    in the range as `table`. Both are counted with the same snapshot, in
+    which the mirror trigger has kept them equal.
+    """
+    condition = 'id > %s' if until_id is None else 'id > %s AND id <= %s'
+    params = [after_id] if until_id is None else [after_id, until_id]
+    cursor.execute(
+        'SELECT (SELECT count(*) FROM {table} WHERE {condition}), (SELECT count(*) FROM {new} WHERE {condition})'
+        .format(table=table, new=new_table, condition=condition),
+        params * 2,
+    )
+    count, copied = cursor.fetchone()
+    if count != copied:
+        # The mirror trigger keeps running, so the conversion can be retried
+        raise PartitioningError('{} has {} rows with IDs after {} but {} were copied.'.format(
+            table, count, after_id, copied))
+
+
+def convert_table(model, field_name, batch_size=10000, keep_old=False, log=logger.info):
+    """
+    Converts the table of `model` into one partitioned by month on
+    `field_name`, while it is in use:
+
+        the foreign keys of other tables referencing the table are dropped
+        the partitioned table is created next to it, with the indexes and
+        foreign keys of the table
+        a trigger on the table mirrors every change to the partitioned table
+        the rows are copied in batches of `batch_size`, each in its own
+        transaction
+        the row counts of each batch, and of the rows inserted meanwhile,
+        are compared
+        in a short final transaction that locks the table, the partitioned
+        table takes the place of the table, with its triggers
+
+    The old table is dropped, or kept as `<table>_unpartitioned` with
+    `keep_old`. Must not be run inside a transaction.
+    """
+    check_server_version()
+    table = model._meta.db_table
+    if is_partitioned(table):
+        log('{} is already partitioned.'.format(table))
+        return
+
+    column = model._meta.get_field(field_name).column
+    new_table = table + CONVERTING_SUFFIX
+    mirror = table + '_mirror'
+    today = timezone.now().date()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # A partitioned table can only be referenced by keys including the partition column
+        for referencing_table, name in get_references(cursor, table):
+            cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(referencing_table, name))
+            log('Dropped foreign key {} of {}.'.format(name, referencing_table))
+
+        cursor.execute('SELECT min({}) FROM {}'.format(column, table))
+        first = cursor.fetchone()[0]
+        if isinstance(first, datetime.datetime):
+            first = timezone.localtime(first, timezone.utc).date()
+        first_month = month_start(first or today)
+
+        cursor.execute(
+            'CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE) '
+            'PARTITION BY RANGE ({column})'.format(new=new_table, table=table, column=column)
+        )
+        cursor.execute('ALTER TABLE {} ADD PRIMARY KEY (id, {})'.format(new_table, column))
+        for name, definition in get_indexes(cursor, table):
+            definition = definition.replace(
+                'INDEX {} '.format(name), 'INDEX {} '.format(name + CONVERTING_SUFFIX), 1,
+            )
+            cursor.execute(rename_in_definition(definition, table, new_table))
+        for name, definition in get_foreign_keys(cursor, table):
+            cursor.execute(
+                'ALTER TABLE {} ADD CONSTRAINT {} {}'.format(new_table, name + CONVERTING_SUFFIX, definition)
+            )
+        create_partitions(table, first_month, add_months(month_start(today), MONTHS_AHEAD), parent=new_table)
+
+        # Rows written from now on reach the partitioned table through the trigger
+        cursor.execute("""
+            CREATE FUNCTION {mirror}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {new} WHERE id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {new} SELECT (NEW).* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """.format(mirror=mirror, new=new_table))
+        cursor.execute(
+            'CREATE TRIGGER {mirror} AFTER INSERT OR UPDATE OR DELETE ON {table} '
+            'FOR EACH ROW EXECUTE PROCEDURE {mirror}()'.format(mirror=mirror, table=table)
+        )
+    log('Created {}.'.format(new_table))
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT max(id) FROM {}'.format(table))
+        last_id = cursor.fetchone()[0] or 0
+        copied_id = 0
+        while copied_id < last_id:
+            with transaction.atomic():
+                cursor.execute(
+                    # Rows updated meanwhile wait for the batch, so the trigger replaces them afterwards
+                    'INSERT INTO {new} SELECT * FROM {table} WHERE id > %s AND id <= %s FOR SHARE '
+                    'ON CONFLICT DO NOTHING'.format(new=new_table, table=table),
+                    [copied_id, copied_id + batch_size],
+                )
+                check_copied(cursor, table, new_table, copied_id, copied_id + batch_size)
+            copied_id += batch_size
+            log('Copied {} up to id {} of {}.'.format(table, min(copied_id, last_id), last_id))
+
+        # Rows inserted since the copy started, through the trigger
+        check_copied(cursor, table, new_table, last_id)
+
+    # Only the renames hold the lock; the trigger keeps the tables equal until then
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE'.format(table))
+
+        triggers = [(name, definition) for name, definition in get_triggers(cursor, table) if name != mirror]
+        indexes = [name for name, _ in get_indexes(cursor, table)]
+        foreign_keys = [name for name, _ in get_foreign_keys(cursor, table)]
+        cursor.execute('DROP TRIGGER {mirror} ON {table}'.format(mirror=mirror, table=table))
+        cursor.execute('DROP FUNCTION {}()'.format(mirror))
+
+        old_table = table + '_unpartitioned'
+        cursor.execute('ALTER TABLE {} RENAME TO {}'.format(table, old_table))
+        cursor.execute('ALTER TABLE {} RENAME TO {}'.format(new_table, table))
+        cursor.execute('ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id'.format(table=table))
+        for name in indexes:
+            cursor.execute('ALTER INDEX {} RENAME TO {}'.format(name, name + '_old'))
+            cursor.execute('ALTER INDEX {} RENAME TO {}'.format(name + CONVERTING_SUFFIX, name))
+        for name in foreign_keys:
+            cursor.execute('ALTER TABLE {} RENAME CONSTRAINT {} TO {}'.format(old_table, name, name + '_old'))
+            cursor.execute('ALTER TABLE {} RENAME CONSTRAINT {} TO {}'.format(table, name + CONVERTING_SUFFIX, name))
+        for name, definition in triggers:
+            cursor.execute('DROP TRIGGER {} ON {}'.format(name, old_table))
+            # Read before the renames, so `definition` names `table`
+            cursor.execute(definition)
+
+        if not keep_old:
+            cursor.execute('DROP TABLE {}'.format(old_table))
+    log('Partitioned {} by {}.'.format(table, column))
@@ -0,0 +1,148 @@
+"""
+Weekly and monthly summaries of a team, for managers who do not read the
+daily digests.
+
+The period's updates are streamed in date order through a server-side cursor
+and folded into a summary per member that keeps counts and at most
+`MAX_ITEMS_PER_MEMBER` recent items, so memory use depends on the number of
+members, not on the number of updates. Participation comes from the daily
+rollups of the period, when there are any.
+"""
+import calendar
+import datetime
+from collections import deque
+
+from django.db.models import Sum
+
+from .digests import to_digest_date
+from .exports import iter_server_side
+from .models import Membership, TeamDailyStats, Update
+from .reference import get_role_name
+from .rollups import get_member_participation
+
+# Done items listed per member; older ones are only counted
+MAX_ITEMS_PER_MEMBER = 20
+
+
+def get_period(period, for_date):
+    """
+    Returns the (start, end) dates summarized by a `period` digest sent on
+    `for_date`: the 7 days before it for 'weekly', the previous calendar month
+    for 'monthly'.
+    """
+    for_date = to_digest_date(for_date)
+    if period == 'weekly':
+        return for_date - datetime.timedelta(days=7), for_date - datetime.timedelta(days=1)
+    if period == 'monthly':
+        end = for_date.replace(day=1) - datetime.timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError('Unknown digest period {}.'.format(period))
+
+
+def is_period_digest_day(team, for_date):
+    """
+    Whether the rollup digest of `team` is due on `for_date`.
+    """
+    for_date = to_digest_date(for_date)
+    if team.rollup_digest_period == 'weekly':
+        return for_date.weekday() == team.rollup_digest_weekday
+    if team.rollup_digest_period == 'monthly':
+        return for_date.day == 1
+    return False
+
+
+class MemberSummary(object):
+    def __init__(self):
+        self.days_answered = 0
+        self.done_count = 0
+        self.will_do_count = 0
+        self.blocker_count = 0
+        self.done = deque(maxlen=MAX_ITEMS_PER_MEMBER)
+        # Blockers of the latest update; earlier ones were either resolved or reported again
+        self.open_blockers = []
+        self.last_update_on = None
+
+    def add(self, update):
+        self.days_answered += 1
+        done, will_do, blockers = update.done_as_list(), update.will_do_as_list(), update.blocker_as_list()
+        self.done_count += len(done)
+        self.will_do_count += len(will_do)
+        self.blocker_count += len(blockers)
+        self.done.extend(item.strip() for item in done)
+        self.open_blockers = [item.strip() for item in blockers]
+        self.last_update_on = update.for_date
+
+
+def summarize_updates(team, start, end):
+    """
+    Returns a dictionary of membership ID -> `MemberSummary` of the updates of
+    `team` from `start` up to and including `end`.
+
+    Like the daily digest, only the first update of a member per day counts.
+    """
+    rows = iter_server_side(
+        Update.objects.filter(membership__team=team)
+                      .between(start, end)
+                      .order_by('for_date', 'id')
+                      .values_list('membership_id', 'for_date', 'done', 'will_do', 'blocker')
+    )
+
+    summaries = {}
+    seen_day, seen = None, set()
+    for membership_id, for_date, done, will_do, blocker in rows:
+        if for_date != seen_day:
+            seen_day, seen = for_date, set()
+        if membership_id in seen:
+            continue
+        seen.add(membership_id)
+
+        update = Update(membership_id=membership_id, for_date=for_date, done=done, will_do=will_do, blocker=blocker)
+        summaries.setdefault(membership_id, MemberSummary()).add(update)
+    return summaries
+
+
+def get_period_digest_context(team, period, for_date):
+    """
+    Returns the template context of the `period` digest of `team` sent on
+    `for_date`.
+    """
+    start, end = get_period(period, for_date)
+    summaries = summarize_updates(team, start, end)
+
+    totals = TeamDailyStats.objects.filter(team=team, date__gte=start, date__lte=end).aggregate(
+        expected=Sum('expected_count'),
+        responded=Sum('responded_count'),
+    )
+    # Days before the rollups were maintained have no rows; their updates are still summarized
+    if totals['expected'] is None:
+        totals, participation = None, {}
+    else:
+        totals['response_rate'] = totals['responded'] / totals['expected'] if totals['expected'] else None
+        participation = {row['membership']: row for row in get_member_participation(team, start, end)}
+
+    memberships = (
+        Membership.objects.filter(team=team)
+                          .select_related('user')
+                          .order_by('id')
+    )
+    members = []
+    for membership in memberships:
+        summary = summaries.get(membership.pk)
+        if summary is None and not membership.is_active:
+            continue
+        members.append({
+            'member': membership.user.get_full_name() or membership.user.email,
+            'role': get_role_name(membership.role_id),
+            'summary': summary or MemberSummary(),
+            'participation': participation.get(membership.pk),
+        })
+
+    return {
+        'team': team,
+        'period': period,
+        'start': start,
+        'end': end,
+        'month': calendar.month_name[start.month],
+        'members': members,
+        'totals': totals,
+    }
@@ -0,0 +1,69 @@
+"""
+Rendering the digests of every active team without sending them, to compare
+the rendering cost and size of the digest templates before and after a
+change at the scale of the real data.
+
+Each team's digest is rendered from the same context as `send_digest`, with
+the reads going to a replica when there is one, in a pool of processes (see
+`replay.map_in_processes`). The HTML and text bodies are written to
+`<output_dir>/<team id>.html` and `.txt`.
+"""
+import collections
+import logging
+import os
+import time
+
+from .digests import get_digest_context
+from .instrumentation import render_template
+from .models import Team
+from .replay import get_digest_datetime
+from .replicas import use_replica
+
+logger = logging.getLogger('put')
+
+Preview = collections.namedtuple('Preview', [
+    'team_id', 'team_name', 'status', 'context_ms', 'render_ms', 'html_bytes', 'text_bytes', 'detail',
+])
+
+# Extension of the written file, template
+TEMPLATES = (
+    ('html', 'updates/emails/digest.html'),
+    ('txt', 'updates/emails/digest.txt'),
+)
+
+
+def preview(job):
+    """
+    Renders the digest of the team and day of `job`, a (team ID, day, output
+    directory) tuple, and returns its `Preview`.
+    """
+    team_id, day, output_dir = job
+    team_name, context_ms, render_ms, sizes = '', 0, 0, {'html': 0, 'txt': 0}
+    try:
+        with use_replica():
+            team = Team.objects.get(pk=team_id)
+            team_name = team.name
+            started = time.perf_counter()
+            context = get_digest_context(team, get_digest_datetime(team, day))
+            context_ms = (time.perf_counter() - started) * 1000
+
+            if context['members_and_updates']:
+                started = time.perf_counter()
+                bodies = {extension: render_template(name, context) for extension, name in TEMPLATES}
+                render_ms = (time.perf_counter() - started) * 1000
+
+        if not context['members_and_updates']:
+            status, detail = 'skipped', 'no active members'
+        else:
+            for extension, body in bodies.items():
+                encoded = body.encode('utf-8')
+                sizes[extension] = len(encoded)
+                with open(os.path.join(output_dir, '{}.{}'.format(team_id, extension)), 'wb') as output:
+                    output.write(encoded)
+            status, detail = 'rendered', ''
+    except Exception as e:
+        logger.exception('Rendering the digest of team %s failed.', team_id)
+        status, detail = 'failed', repr(e)
+
+    return Preview(team_id, team_name, status, round(context_ms, 2), round(render_ms, 2),
+                   sizes['html'], sizes['txt'], detail)
@@ -0,0 +1,205 @@
+"""
+Opt-in profiling of a sample of task executions and HTTP requests.
+
+A `PROFILING_SAMPLE_RATE` fraction of the instrumented tasks and of the
+requests are profiled, as are requests with the `X-Digestus-Profile` header
+set to `PROFILING_TOKEN`. In the default 'sample' mode a background thread
+records the stack of the profiled thread every `PROFILING_INTERVAL` seconds
+and writes the counts as folded stacks, the input of flamegraph.pl and
+speedscope; in 'cprofile' mode the profile is written as marshalled pstats.
+Files are gzipped into `PROFILING_DIR`, named after the task or URL and the
+team, e.g. `20160509T090000-task-updates.tasks.send_digest-team12-345.folded.gz`.
+
+Overhead is bounded: a process profiles one execution at a time, sampling
+stops after `PROFILING_MAX_SECONDS`, and the oldest files are deleted to keep
+the directory under `PROFILING_MAX_BYTES`.
+"""
+import cProfile
+import datetime
+import gzip
+import logging
+import marshal
+import os
+import random
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('put')
+
+HEADER = 'HTTP_X_DIGESTUS_PROFILE'
+
+# Sampling more often costs more than it tells
+MIN_INTERVAL = 0.001
+
+# Only one execution per process is profiled at a time
+_lock = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """
+    Counts the stacks of the thread `thread_id` until stopped.
+    """
+
+    def __init__(self, thread_id, interval, max_seconds):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = max(interval, MIN_INTERVAL)
+        self.max_samples = int(max_seconds / self.interval)
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        for _ in range(self.max_samples):
+            if self.stopped.wait(self.interval):
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append('{}:{}'.format(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def dumps(self):
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in sorted(self.stacks.items())).encode('utf-8')
+
+
+class CProfiler(object):
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dumps(self):
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+class Profile(object):
+    def __init__(self, kind, name, team_id=None):
+        self.kind = kind
+        self.name = name
+        self.team_id = team_id
+        self.started_at = datetime.datetime.utcnow()
+        if settings.PROFILING_MODE == 'cprofile':
+            self.profiler, self.extension = CProfiler(), 'pstats'
+        else:
+            self.profiler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL,
+                                         settings.PROFILING_MAX_SECONDS)
+            self.extension = 'folded'
+
+    def get_filename(self):
+        parts = [self.started_at.strftime('%Y%m%dT%H%M%S'), self.kind, self.name]
+        if self.team_id is not None:
+            parts.append('team{}'.format(self.team_id))
+        parts.append(str(os.getpid()))
+        return '{}.{}.gz'.format('-'.join(re.sub(r'[^\w.]+', '_', part) for part in parts), self.extension)
+
+    def save(self):
+        data = gzip.compress(self.profiler.dumps())
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        if not make_room(directory, len(data)):
+            logger.warning('Profile of %s %s is larger than PROFILING_MAX_BYTES; discarded.', self.kind, self.name)
+            return None
+
+        path = os.path.join(directory, self.get_filename())
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+def make_room(directory, size):
+    """
+    Deletes the oldest files of `directory` until `size` more bytes fit in
+    `PROFILING_MAX_BYTES`. Returns False when they cannot fit.
+    """
+    if size > settings.PROFILING_MAX_BYTES:
+        return False
+
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+    used = sum(file_size for _, _, file_size in files)
+
+    for _, path, file_size in sorted(files):
+        if used + size <= settings.PROFILING_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by another process
+            pass
+        used -= file_size
+    return True
+
+
+def start(kind, name, team_id=None, force=False):
+    """
+    Starts profiling the current thread when it is sampled, or `force` is set,
+    and no other execution of this process is being profiled.
+
+    Returns the `Profile` to pass to `stop`, or None.
+    """
+    if not force and random.random() >= settings.PROFILING_SAMPLE_RATE:
+        return None
+    if not _lock.acquire(blocking=False):
+        return None
+
+    try:
+        profile = Profile(kind, name, team_id)
+        profile.profiler.start()
+    except Exception:
+        _lock.release()
+        raise
+    return profile
+
+
+def stop(profile):
+    """
+    Stops and saves `profile`. Failures are logged; profiling never fails the
+    profiled execution.
+    """
+    if profile is None:
+        return None
+
+    try:
+        profile.profiler.stop()
+        return profile.save()
+    except Exception:
+        logger.exception('Saving the profile of %s %s failed.', profile.kind, profile.name)
+    finally:
+        _lock.release()
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles a sample of the requests, and the requests with the
+    `X-Digestus-Profile` header set to `PROFILING_TOKEN`.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        token = request.META.get(HEADER, '')
+        forced = bool(settings.PROFILING_TOKEN) and constant_time_compare(token, settings.PROFILING_TOKEN)
+        name = request.resolver_match.url_name or request.path
+        request._profile = start('request', name, view_kwargs.get('team_id'), force=forced)
+
+    def process_response(self, request, response):
+        stop(getattr(request, '_profile', None))
+        request._profile = None
+        return response
@@ -0,0 +1,257 @@
+"""
+Reconciliation of planned items (`will_do`) with the items members later
+report as done.
+
+A team is reconciled one day at a time, with all of its members in the same
+pass: the open items of the previous days are matched against the day's
+`done` items, and the day's `will_do` items either continue an open item,
+extending its streak, or start a new one. Items are first matched on their
+normalized words, then with a fuzzy score.
+
+Reconciling a day again updates the items an earlier run stored for it in
+place, keyed on their update and position, so the items of later days that
+continue them keep their chains, and changed streaks are carried over to
+them. A range of days can also be replayed in order after edits or imports.
+"""
+import datetime
+import re
+from difflib import SequenceMatcher
+
+from django.db import connection, transaction
+
+from .helpers import to_date
+from .models import TodoItem, Update, touch_on_commit
+
+# Open items are carried over for at most this many days without being planned again
+LOOKBACK_DAYS = 7
+
+FUZZY_THRESHOLD = 0.6
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'for', 'from', 'i', 'in', 'into', 'is', 'it', 'of', 'on',
+    'or', 'our', 'some', 'the', 'to', 'up', 'we', 'will', 'with',
+}
+
+SUFFIXES = ('ing', 'ed', 'es', 's')
+
+MARK_DONE_SQL = """
+    UPDATE {todo} SET done_on = %s, done_text = v.done_text, match_score = v.match_score
+    FROM (VALUES {values}) AS v(id, done_text, match_score)
+    WHERE {todo}.id = v.id
+"""
+
+UPDATE_ITEMS_SQL = """
+    UPDATE {todo} SET text = v.text, carried_from_id = v.carried_from_id, streak = v.streak,
+                      first_planned_on = v.first_planned_on
+    FROM (VALUES {values}) AS v(id, text, carried_from_id, streak, first_planned_on)
+    WHERE {todo}.id = v.id
+"""
+
+
+def stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def get_tokens(text):
+    """
+    Returns the set of stemmed, lower-cased words of `text` without stopwords.
+    """
+    return frozenset(stem(word) for word in re.findall(r'[^\W_]+', text.lower()) if word not in STOPWORDS)
+
+
+def get_match_score(text, tokens, other_text, other_tokens):
+    """
+    1.0 when both items have the same words, otherwise the better of the
+    words' Dice coefficient and the similarity of the texts.
+    """
+    if tokens and tokens == other_tokens:
+        return 1.0
+
+    dice = 2 * len(tokens & other_tokens) / (len(tokens) + len(other_tokens)) if tokens or other_tokens else 0
+    ratio = SequenceMatcher(None, text.lower(), other_text.lower()).ratio()
+    return max(dice, ratio)
+
+
+def match_items(open_items, texts):
+    """
+    Pairs `open_items` with the `texts` they match, best scores first, each
+    item and text used at most once.
+
+    Returns a list of (item, text index, score).
+    """
+    tokens = [get_tokens(text) for text in texts]
+    candidates = []
+    for item in open_items:
+        item_tokens = get_tokens(item.text)
+        for index, text in enumerate(texts):
+            score = get_match_score(item.text, item_tokens, text, tokens[index])
+            if score >= FUZZY_THRESHOLD:
+                candidates.append((score, item.pk, index, item))
+
+    matches, used_items, used_texts = [], set(), set()
+    for score, pk, index, item in sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1], candidate[2])):
+        if pk not in used_items and index not in used_texts:
+            matches.append((item, index, score))
+            used_items.add(pk)
+            used_texts.add(index)
+    return matches
+
+
+def get_open_items(team, for_date):
+    """
+    Returns a dictionary of membership ID -> items planned in the
+    `LOOKBACK_DAYS` days before `for_date` that were neither done before
+    `for_date` nor planned again.
+    """
+    items = list(TodoItem.objects.filter(
+        team=team,
+        for_date__gte=for_date - datetime.timedelta(days=LOOKBACK_DAYS),
+        for_date__lt=for_date,
+    ).order_by('for_date', 'id'))
+    carried = {item.carried_from_id for item in items}
+
+    open_items = {}
+    for item in items:
+        if item.pk not in carried and (item.done_on is None or item.done_on >= for_date):
+            open_items.setdefault(item.membership_id, []).append(item)
+    return open_items
+
+
+def reconcile_team(team, for_date):
+    """
+    Reconciles the updates of all members of `team` for `for_date`.
+
+    Returns a tuple of the number of items marked done and the number of items
+    planned on that day.
+    """
+    for_date = to_date(for_date)
+    # The first update of each member, the one shown in the digest
+    updates = {}
+    for update in (Update.objects.filter(membership__team=team)
+                                 .for_day(for_date)
+                                 .order_by('-id')):
+        updates[update.membership_id] = update
+
+    with transaction.atomic():
+        existing = {
+            (item.update_id, item.position): item
+            for item in TodoItem.objects.filter(team=team, for_date=for_date)
+        }
+        TodoItem.objects.filter(
+            team=team,
+            for_date__gte=for_date - datetime.timedelta(days=LOOKBACK_DAYS),
+            for_date__lt=for_date,
+            done_on=for_date,
+        ).update(done_on=None, done_text='', match_score=None)
+
+        open_items = get_open_items(team, for_date)
+        done, planned = [], []
+
+        for membership_id, update in sorted(updates.items()):
+            remaining = list(open_items.get(membership_id, []))
+
+            done_texts = update.done_as_list()
+            for item, index, score in match_items(remaining, done_texts):
+                done.append((item.pk, done_texts[index].strip(), score))
+                remaining.remove(item)
+
+            will_do_texts = update.will_do_as_list()
+            carried = {index: item for item, index, _ in match_items(remaining, will_do_texts)}
+            for position, text in enumerate(will_do_texts):
+                previous = carried.get(position)
+                planned.append(TodoItem(
+                    update=update,
+                    membership_id=membership_id,
+                    team=team,
+                    for_date=for_date,
+                    position=position,
+                    text=text.strip(),
+                    carried_from=previous,
+                    streak=previous.streak + 1 if previous else 1,
+                    first_planned_on=previous.first_planned_on if previous else for_date,
+                ))
+
+        created, changed, restreaked = [], [], []
+        for item in planned:
+            current = existing.pop((item.update_id, item.position), None)
+            if current is None:
+                created.append(item)
+                continue
+
+            item.pk = current.pk
+            if (current.streak, current.first_planned_on) != (item.streak, item.first_planned_on):
+                changed.append(item)
+                restreaked.append(item)
+            elif (current.text, current.carried_from_id) != (item.text, item.carried_from_id):
+                changed.append(item)
+
+        # Items no longer planned; the later items continuing them start new chains
+        if existing:
+            TodoItem.objects.filter(pk__in=[item.pk for item in existing.values()]).delete()
+        with connection.cursor() as cursor:
+            if changed:
+                cursor.execute(
+                    UPDATE_ITEMS_SQL.format(todo=TodoItem._meta.db_table,
+                                            values=', '.join(['(%s, %s, %s::integer, %s, %s::date)'] * len(changed))),
+                    [value for item in changed
+                     for value in (item.pk, item.text, item.carried_from_id, item.streak, item.first_planned_on)],
+                )
+            if done:
+                cursor.execute(
+                    MARK_DONE_SQL.format(todo=TodoItem._meta.db_table,
+                                         values=', '.join(['(%s, %s, %s)'] * len(done))),
+                    [for_date] + [value for row in done for value in row],
+                )
+        TodoItem.objects.bulk_create(created)
+        carry_streaks(restreaked)
+
+        touch_on_commit([team.pk])
+
+    return len(done), len(planned)
+
+
+def carry_streaks(items):
+    """
+    Updates the streaks of the later items that continue `items`, and of the
+    items continuing those, after the streaks of `items` changed.
+    """
+    while items:
+        changed = []
+        for item in TodoItem.objects.filter(carried_from__in=items).select_related('carried_from'):
+            streak = item.carried_from.streak + 1
+            first_planned_on = item.carried_from.first_planned_on
+            if (item.streak, item.first_planned_on) != (streak, first_planned_on):
+                item.streak, item.first_planned_on = streak, first_planned_on
+                item.save(update_fields=['streak', 'first_planned_on'])
+                changed.append(item)
+        items = changed
+
+
+def reconcile_team_range(team, since, until):
+    """
+    Reconciles the days from `since` up to and including `until` in order.
+    """
+    day = to_date(since)
+    while day <= to_date(until):
+        reconcile_team(team, day)
+        day += datetime.timedelta(days=1)
+
+
+def get_todo_history(updates):
+    """
+    Returns a dictionary of update ID -> list of the update's `will_do` items,
+    each a dictionary with the item `text`, its `streak` and the day it was
+    `first_planned_on`. Updates that were not reconciled have no entry.
+    """
+    updates = [update for update in updates if update and update.will_do.strip()]
+    history = {}
+    for item in TodoItem.objects.filter(update__in=[update.pk for update in updates]).order_by('position'):
+        history.setdefault(item.update_id, []).append({
+            'text': item.text,
+            'streak': item.streak,
+            'first_planned_on': item.first_planned_on,
+        })
+    return history
@@ -0,0 +1,145 @@
+"""
+Process-local cache of reference data: the Site domain, role names and team
+settings.
+
+Every reminder and digest needs these, and they rarely change, so each
+process keeps them in memory. Saving or deleting a `Site`, `Role` or `Team`
+clears the entry in the process that saved it and, once the transaction
+commits, bumps a version in the shared cache; other processes clear their
+entries when they notice the new version, which they check at most every
+`REFERENCE_DATA_CHECK_INTERVAL` seconds. Changes made with `QuerySet.update()` send no signals; call
+`invalidate()` after them.
+"""
+import collections
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('put')
+
+VERSION_KEY = 'updates:reference-version'
+
+TeamSettings = collections.namedtuple('TeamSettings', [
+    'id', 'name', 'email', 'subaccount_id', 'is_active', 'digest_days_sent', 'send_digest_at', 'send_reminders_at',
+])
+
+_entries = {}
+_version = {'value': None, 'checked_at': None}
+
+
+def check_version():
+    """
+    Clears the entries of this process when another process invalidated them.
+    """
+    now = time.monotonic()
+    checked_at = _version['checked_at']
+    if checked_at is not None and now - checked_at < settings.REFERENCE_DATA_CHECK_INTERVAL:
+        return
+
+    version = cache.get(VERSION_KEY)
+    if version != _version['value']:
+        _entries.clear()
+        _version['value'] = version
+    _version['checked_at'] = now
+
+
+def get(key, load):
+    check_version()
+    try:
+        return _entries[key]
+    except KeyError:
+        value = _entries[key] = load()
+        return value
+
+
+def clear(key=None):
+    if key is None:
+        _entries.clear()
+    else:
+        _entries.pop(key, None)
+
+
+def bump_version():
+    """
+    Makes every process clear its entries.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def invalidate(key=None):
+    """
+    Clears the entry `key`, or all entries, in this process, and in every
+    process once the current transaction commits. Bumped earlier, other
+    processes could reload the rows as they were before the change and keep
+    them.
+    """
+    clear(key)
+
+    def commit():
+        # This process may have reloaded the entry before the commit too
+        clear(key)
+        bump_version()
+
+    transaction.on_commit(commit)
+
+
+def load_domain_name():
+    Site = apps.get_model('sites', 'Site')
+    try:
+        return Site.objects.get(pk=1).domain
+    except Site.DoesNotExist:
+        logger.error('Site is not configured.')
+        return None
+
+
+def get_domain_name():
+    """
+    Gets the domain name of the Site
+    """
+    return get('site', load_domain_name)
+
+
+def load_role_names():
+    return dict(apps.get_model('updates', 'Role').objects.values_list('id', 'name'))
+
+
+def get_role_name(role_id):
+    """
+    Returns the name of the `Role` with `role_id`, or '' for None.
+    """
+    if role_id is None:
+        return ''
+
+    names = get('roles', load_role_names)
+    if role_id not in names:
+        # Created since the names were loaded; other processes load it the same way
+        _entries.pop('roles', None)
+        names = get('roles', load_role_names)
+    return names.get(role_id, '')
+
+
+def team_key(team_id):
+    return 'team:{}'.format(team_id)
+
+
+def get_team_settings(team_id):
+    """
+    Returns the `TeamSettings` of the team with `team_id`.
+
+    Raises `Team.DoesNotExist` when there is no such team.
+    """
+    def load():
+        values = (
+            apps.get_model('updates', 'Team').objects.values_list(*TeamSettings._fields)
+                                                      .get(pk=team_id)
+        )
+        return TeamSettings(*values)
+
+    return get(team_key(team_id), load)
@@ -0,0 +1,118 @@
+"""
+Replaying digests of past days, e.g. after an outage of the email provider
+or for a team onboarded mid-week.
+
+The jobs, one per team and day, are sharded across a pool of processes. The
+database connections of the parent are closed before the pool starts, so
+each process opens its own and keeps it for all of its jobs. A replay sends
+the digest like `send_digest` does at the team's `send_digest_at` on that
+day; a dry run writes the rendered email to a file instead, without saving
+anything.
+"""
+import collections
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+
+from django.db import connections
+
+import pytz
+
+from .digests import DIGEST_TIMEZONE
+from .models import Team
+from .tasks import build_digest_message, send_digest
+
+logger = logging.getLogger('put')
+
+Job = collections.namedtuple('Job', ['team_id', 'day', 'for_project_managers', 'output_dir'])
+Result = collections.namedtuple('Result', ['job', 'status', 'seconds', 'detail'])
+
+
+def get_digest_datetime(team, day):
+    """
+    Returns the UTC datetime `send_digest` is called with for the digest of `team` on `day`.
+    """
+    send_at = DIGEST_TIMEZONE.localize(datetime.datetime.combine(day, team.send_digest_at))
+    return send_at.astimezone(pytz.UTC)
+
+
+def get_jobs(teams, since, until, for_project_managers=False, output_dir=None, all_days=False):
+    """
+    Returns the jobs of `teams` from `since` through `until`, on the days
+    each team gets digests unless `all_days`.
+    """
+    jobs = []
+    day = since
+    while day <= until:
+        for team in teams:
+            if all_days or day.weekday() in team.digest_days_sent:
+                jobs.append(Job(team.pk, day, for_project_managers, output_dir))
+        day += datetime.timedelta(days=1)
+    return jobs
+
+
+def get_output_path(job):
+    return os.path.join(job.output_dir, str(job.team_id), '{}{}.eml'.format(
+        job.day.isoformat(), '-pm' if job.for_project_managers else ''
+    ))
+
+
+def write_digest(job, team, for_date):
+    msg = build_digest_message(team, for_date, job.for_project_managers)
+    if msg is None:
+        return 'skipped', 'no active members'
+
+    path = get_output_path(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as output:
+        output.write(msg.message().as_bytes())
+    return 'written', path
+
+
+def replay(job):
+    """
+    Sends, or with an `output_dir` writes, the digest of `job`. Returns its `Result`.
+    """
+    started = time.perf_counter()
+    try:
+        team = Team.objects.get(pk=job.team_id, is_active=True)
+        for_date = get_digest_datetime(team, job.day)
+        if job.output_dir:
+            status, detail = write_digest(job, team, for_date)
+        else:
+            # Run in this process; failures raise instead of being retried
+            send_digest(team.pk, for_date, job.for_project_managers)
+            status, detail = 'sent', ''
+    except Team.DoesNotExist:
+        status, detail = 'skipped', 'no active team'
+    except Exception as e:
+        logger.exception('Replaying the digest of team %s for %s failed.', job.team_id, job.day)
+        status, detail = 'failed', repr(e)
+    return Result(job, status, time.perf_counter() - started, detail)
+
+
+def map_in_processes(function, items, processes):
+    """
+    Calls `function` with each of `items` in `processes` processes, yielding
+    the results in the order they finish.
+    """
+    if processes <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    # Forked processes must not share the parent's connections
+    for connection in connections.all():
+        connection.close()
+
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(function, items)
+
+
+def replay_all(jobs, processes):
+    """
+    Replays `jobs` in `processes` processes, yielding their `Result` as they finish.
+    """
+    return map_in_processes(replay, jobs, processes)
@@ -0,0 +1,153 @@
+"""
+Routing of read-heavy workloads to read replicas.
+
+Replicas are the databases listed in `DATABASE_REPLICAS`, configured from
+`DATABASE_REPLICA_URLS`. Only reads inside a `use_replica()` block go to a
+replica; everything else, and every write, uses the primary ('default').
+
+Replicas lag behind the primary, so:
+    a replica is only used while its replay lag is under
+    `DATABASE_REPLICA_MAX_LAG` seconds, checked at most every
+    `DATABASE_REPLICA_LAG_CHECK_INTERVAL` seconds per process
+    after a write, the reads of the rest of the request or task go to the
+    primary, so they see what was just written
+    sessions and users are always read from the primary, so that a user who
+    just logged in or changed their password is not logged out
+
+Raw SQL through `django.db.connection` always uses the primary.
+"""
+import contextlib
+import functools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger('put')
+
+DEFAULT_DB = 'default'
+
+# Apps whose models are always read from the primary
+PRIMARY_APPS = ('auth', 'sessions', 'users')
+
+# Seconds the replica is behind; NULL while in recovery without anything replayed yet
+LAG_SQL = """
+    SELECT CASE WHEN pg_is_in_recovery()
+                THEN extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+                ELSE 0 END
+"""
+
+_state = threading.local()
+
+# Replica alias -> (time checked, whether its lag was acceptable)
+_lag_checks = {}
+
+
+def get_replica_lag(alias):
+    """
+    Returns the replay lag of the replica `alias` in seconds, or None when unknown.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return cursor.fetchone()[0]
+
+
+def is_replica_usable(alias):
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+
+    try:
+        lag = get_replica_lag(alias)
+    except DatabaseError:
+        logger.exception('Checking the lag of replica %s failed; reading from the primary.', alias)
+        lag = None
+    usable = lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG
+    if not usable:
+        logger.warning('Replica %s is %s seconds behind; reading from the primary.', alias, lag)
+
+    _lag_checks[alias] = (now, usable)
+    return usable
+
+
+def choose_replica():
+    """
+    Returns the alias of a random replica that is not lagging, or the primary's.
+    """
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if is_replica_usable(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB
+
+
+@contextlib.contextmanager
+def use_replica():
+    """
+    Sends the ORM reads of the block to a replica, unless a write happened
+    earlier in the same request or task. Nested blocks use the same replica.
+    """
+    previous = getattr(_state, 'replica', None)
+    _state.replica = previous or choose_replica()
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+def replica_reads(view):
+    """
+    Runs `view` in a `use_replica()` block. Decorate `dispatch`, so that
+    conditional GET versions are read from the same database as the body.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def get_read_db():
+    """
+    The alias reads go to at this point, e.g. to bind a queryset that is
+    evaluated after the `use_replica()` block, like a streamed response.
+    """
+    if is_pinned():
+        return DEFAULT_DB
+    return getattr(_state, 'replica', None) or DEFAULT_DB
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def reset():
+    """
+    Starts a new request or task: reads may go to replicas again.
+    """
+    _state.pinned = False
+    _state.replica = None
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB
+        return get_read_db()
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db == DEFAULT_DB
@@ -0,0 +1,183 @@
+"""
+Daily participation rollups of members and teams.
+
+`MembershipDailyStats` and `TeamDailyStats` are kept up to date as updates
+arrive and whenever a digest is sent, so reports over a date range read a row
+per day instead of every update of every member. Rows are recomputed from the
+updates of the affected days with set-based statements, so running a refresh
+twice, or concurrently with an import, gives the same result.
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Sum, When
+
+from .helpers import to_date
+from .models import Membership, MembershipDailyStats, Team, TeamDailyStats, Update, touch_on_commit
+
+# Number of non-blank lines of a section, the same items as `Update.done_as_list()` and friends
+ITEM_COUNT_SQL = "(SELECT count(*) FROM regexp_split_to_table(u.{field}, E'\\n') AS item WHERE item ~ '\\S')"
+
+DELETE_MEMBERSHIP_STATS_SQL = """
+    DELETE FROM {membership_stats}
+    WHERE team_id = ANY(%(team_ids)s) AND date BETWEEN %(since)s AND %(until)s {stats_membership_filter}
+"""
+
+# A row for every day a member was expected to answer and every day they did.
+# A member is expected on the team's digest days while both are active.
+INSERT_MEMBERSHIP_STATS_SQL = """
+    INSERT INTO {membership_stats}
+        (membership_id, team_id, date, expected, answered, done_count, will_do_count, blocker_count)
+    SELECT m.id, m.team_id, d.day::date,
+           m.is_active AND t.is_active AND extract(isodow FROM d.day)::integer - 1 = ANY(t.digest_days_sent),
+           first_update.id IS NOT NULL,
+           coalesce(first_update.done_count, 0),
+           coalesce(first_update.will_do_count, 0),
+           coalesce(first_update.blocker_count, 0)
+    FROM {membership} m
+    INNER JOIN {team} t ON t.id = m.team_id
+    CROSS JOIN generate_series(%(since)s::date, %(until)s::date, interval '1 day') AS d(day)
+    LEFT JOIN LATERAL (
+        SELECT u.id, {done_count} AS done_count, {will_do_count} AS will_do_count,
+               {blocker_count} AS blocker_count
+        FROM {update} u
+        WHERE u.membership_id = m.id AND u.for_date = d.day::date
+        ORDER BY u.id
+        LIMIT 1
+    ) first_update ON true
+    WHERE m.team_id = ANY(%(team_ids)s) {membership_filter}
+      AND (first_update.id IS NOT NULL OR (
+          m.is_active AND t.is_active AND extract(isodow FROM d.day)::integer - 1 = ANY(t.digest_days_sent)
+      ))
+"""
+
+DELETE_TEAM_STATS_SQL = """
+    DELETE FROM {team_stats}
+    WHERE team_id = ANY(%(team_ids)s) AND date BETWEEN %(since)s AND %(until)s
+"""
+
+INSERT_TEAM_STATS_SQL = """
+    INSERT INTO {team_stats}
+        (team_id, date, expected_count, responded_count, answered_count, blocked_count,
+         done_count, will_do_count, blocker_count)
+    SELECT team_id, date,
+           count(*) FILTER (WHERE expected),
+           count(*) FILTER (WHERE expected AND answered),
+           count(*) FILTER (WHERE answered),
+           count(*) FILTER (WHERE blocker_count > 0),
+           sum(done_count), sum(will_do_count), sum(blocker_count)
+    FROM {membership_stats}
+    WHERE team_id = ANY(%(team_ids)s) AND date BETWEEN %(since)s AND %(until)s
+    GROUP BY team_id, date
+"""
+
+
+def refresh_rollups(team_ids, since, until, membership_ids=None):
+    """
+    Recomputes the daily stats of the teams from `since` up to and including
+    `until`. Only the rows of `membership_ids` are recomputed when given; the
+    team rows are always recomputed from all members.
+
+    The team rows are locked, which serializes concurrent refreshes of a team,
+    and touched once the transaction commits.
+    """
+    team_ids = list(team_ids)
+    if not team_ids:
+        return
+
+    context = {
+        'membership_stats': MembershipDailyStats._meta.db_table,
+        'team_stats': TeamDailyStats._meta.db_table,
+        'membership': Membership._meta.db_table,
+        'team': Team._meta.db_table,
+        'update': Update._meta.db_table,
+        'done_count': ITEM_COUNT_SQL.format(field='done'),
+        'will_do_count': ITEM_COUNT_SQL.format(field='will_do'),
+        'blocker_count': ITEM_COUNT_SQL.format(field='blocker'),
+        'stats_membership_filter': '',
+        'membership_filter': '',
+    }
+    params = {
+        'team_ids': team_ids,
+        'since': to_date(since),
+        'until': to_date(until),
+    }
+    if membership_ids is not None:
+        params['membership_ids'] = list(membership_ids)
+        if not params['membership_ids']:
+            return
+        context['stats_membership_filter'] = 'AND membership_id = ANY(%(membership_ids)s)'
+        context['membership_filter'] = 'AND m.id = ANY(%(membership_ids)s)'
+
+    with transaction.atomic():
+        list(Team.objects.select_for_update().filter(pk__in=team_ids).order_by('pk').values_list('pk'))
+        touch_on_commit(team_ids)
+
+        with connection.cursor() as cursor:
+            cursor.execute(DELETE_MEMBERSHIP_STATS_SQL.format(**context), params)
+            cursor.execute(INSERT_MEMBERSHIP_STATS_SQL.format(**context), params)
+            cursor.execute(DELETE_TEAM_STATS_SQL.format(**context), params)
+            cursor.execute(INSERT_TEAM_STATS_SQL.format(**context), params)
+
+
+def refresh_update_rollups(team_id, membership_id, dates):
+    """
+    Recomputes the stats of a member on `dates` after one of their updates changed.
+    """
+    for for_date in sorted(set(dates)):
+        refresh_rollups([team_id], for_date, for_date, membership_ids=[membership_id])
+
+
+def get_default_range(days, until=None):
+    """
+    Returns the (since, until) dates of the `days` days up to and including
+    `until`, today by default.
+    """
+    until = to_date(until) if until else datetime.date.today()
+    return until - datetime.timedelta(days=days - 1), until
+
+
+def count_if(**conditions):
+    return Sum(Case(When(then=1, **conditions), default=0, output_field=IntegerField()))
+
+
+def get_member_participation(team, since, until):
+    """
+    Returns a dictionary per member of `team` with their totals from `since`
+    up to and including `until`, ordered by membership ID:
+        `membership`, `member`, `member_name`
+        `expected`: days the member was expected to answer
+        `responded`: expected days the member answered
+        `answered`: days the member answered, expected or not
+        `response_rate`: `responded` / `expected`, None without expected days
+        `done_count`, `will_do_count`, `blocker_count`: items per section
+        `blocked_days`: days with at least one blocker
+    """
+    rows = (
+        MembershipDailyStats.objects.filter(team=team, date__gte=to_date(since), date__lte=to_date(until))
+                                    .values('membership_id', 'membership__user__email', 'membership__user__name')
+                                    .annotate(expected_days=count_if(expected=True),
+                                              responded_days=count_if(expected=True, answered=True),
+                                              answered_days=count_if(answered=True),
+                                              blocked_days=count_if(blocker_count__gt=0),
+                                              done_total=Sum('done_count'),
+                                              will_do_total=Sum('will_do_count'),
+                                              blocker_total=Sum('blocker_count'))
+                                    .order_by('membership_id')
+    )
+    return [
+        {
+            'membership': row['membership_id'],
+            'member': row['membership__user__email'],
+            'member_name': row['membership__user__name'],
+            'expected': row['expected_days'],
+            'responded': row['responded_days'],
+            'answered': row['answered_days'],
+            'response_rate': row['responded_days'] / row['expected_days'] if row['expected_days'] else None,
+            'done_count': row['done_total'],
+            'will_do_count': row['will_do_total'],
+            'blocker_count': row['blocker_total'],
+            'blocked_days': row['blocked_days'],
+        }
+        for row in rows
+    ]
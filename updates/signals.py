@@ -0,0 +1,159 @@
+import collections
+
+from django.contrib.sites.models import Site
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from celery.signals import task_failure, task_prerun, worker_process_shutdown
+
+from . import replicas, worker_db
+from .blockers import index_update_blockers
+from .digests import invalidate_digest_fragment, invalidate_team_digest_fragments
+from .metrics import DB_CONNECTIONS_OPENED, INBOUND_EVENTS, mark_process_dead
+from .helpers import gather_on_commit
+from .models import InboundWebhookRequest, Membership, Role, Team, Update, touch_on_commit
+from .reference import invalidate, team_key
+from .rollups import refresh_update_rollups
+from .summaries import invalidate_team_summaries
+
+
+class UpdateChanges(object):
+    """
+    The updates saved or deleted in a transaction, followed up together once
+    it commits: the stats of their members are refreshed, the blockers of the
+    saved ones indexed, and each team touched a single time.
+
+    After commit, so that deleting a membership does not recreate the stats
+    rows of its updates.
+    """
+    def __init__(self):
+        # (team ID, membership ID) -> dates
+        self.dates = collections.defaultdict(set)
+        self.saved_ids = set()
+
+    def add(self, update, saved):
+        key = (update.membership.team_id, update.membership_id)
+        self.dates[key].add(update.for_date)
+        # An edit can move the update to another day
+        loaded_for_date = getattr(update, '_loaded_for_date', None)
+        if loaded_for_date:
+            self.dates[key].add(loaded_for_date)
+        if saved:
+            self.saved_ids.add(update.pk)
+
+    def __call__(self):
+        with transaction.atomic():
+            for (team_id, membership_id), dates in sorted(self.dates.items()):
+                refresh_update_rollups(team_id, membership_id, dates)
+
+            # Updates deleted later in the same transaction are left out
+            updates = Update.objects.select_related('membership').filter(pk__in=self.saved_ids).order_by('pk')
+            for update in updates:
+                index_update_blockers(update)
+                # The digest of the day shows how long each blocker has been reported
+                invalidate_digest_fragment(update.membership.team_id, update.for_date)
+
+            touch_on_commit({team_id for team_id, membership_id in self.dates})
+
+
+@receiver(post_save, sender=Update)
+@receiver(post_delete, sender=Update)
+def invalidate_update_digest(sender, instance, **kwargs):
+    team_id = instance.membership.team_id
+
+    invalidate_digest_fragment(team_id, instance.for_date)
+    # An edit can move the update to another day
+    loaded_for_date = getattr(instance, '_loaded_for_date', None)
+    if loaded_for_date and loaded_for_date != instance.for_date:
+        invalidate_digest_fragment(team_id, loaded_for_date)
+
+
+@receiver(post_save, sender=Update)
+def invalidate_update_team_summaries(sender, instance, created, **kwargs):
+    # Only new updates change the response rate and latest update date
+    if created:
+        invalidate_team_summaries(instance.membership.team_id)
+
+
+@receiver(post_save, sender=Update)
+def follow_up_saved_update(sender, instance, **kwargs):
+    gather_on_commit(UpdateChanges, instance, True)
+
+
+@receiver(post_delete, sender=Update)
+def follow_up_deleted_update(sender, instance, **kwargs):
+    gather_on_commit(UpdateChanges, instance, False)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_membership_digests(sender, instance, **kwargs):
+    touch_on_commit([instance.team_id])
+    invalidate_team_digest_fragments(instance.team_id)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_membership_team_summaries(sender, instance, **kwargs):
+    invalidate_team_summaries(instance.team_id, user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Team)
+def invalidate_team_team_summaries(sender, instance, **kwargs):
+    invalidate_team_summaries(instance.pk)
+
+
+@receiver(post_save, sender=InboundWebhookRequest)
+def count_inbound_event(sender, instance, created, **kwargs):
+    if created:
+        INBOUND_EVENTS.labels('update' if instance.daily_update_id else 'unmatched').inc()
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def invalidate_site_reference(sender, instance, **kwargs):
+    invalidate('site')
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_role_reference(sender, instance, **kwargs):
+    invalidate('roles')
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def invalidate_team_reference(sender, instance, **kwargs):
+    invalidate(team_key(instance.pk))
+
+
+@receiver(connection_created)
+def count_connection_created(sender, connection, **kwargs):
+    DB_CONNECTIONS_OPENED.labels(connection.alias).inc()
+
+
+@task_prerun.connect
+def prepare_worker_connections(sender=None, task=None, **kwargs):
+    # Eager tasks share the connections of their caller
+    if not task.request.is_eager:
+        worker_db.before_task()
+        replicas.reset()
+
+
+@task_failure.connect
+def close_failed_worker_connections(sender=None, **kwargs):
+    if not sender.request.is_eager:
+        worker_db.after_task_failure()
+
+
+@worker_process_shutdown.connect
+def drop_worker_process_metrics(sender=None, pid=None, **kwargs):
+    mark_process_dead(pid)
+
+
+@receiver(request_started)
+def reset_replica_routing(sender, **kwargs):
+    replicas.reset()
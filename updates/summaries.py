@@ -0,0 +1,43 @@
+"""
+Per-user cache of the annotated team list shown on "My Teams".
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from .digests import to_digest_date
+from .models import Membership
+
+# Today's response rate changes as updates arrive, so entries do not live long
+TEAM_SUMMARIES_TIMEOUT = 60 * 5
+
+
+def team_summaries_key(user_id, for_date):
+    return 'updates:team-summaries:{}:{}'.format(user_id, for_date.isoformat())
+
+
+def get_team_summaries(user):
+    """
+    Returns the teams of `user` annotated by `TeamQuerySet.with_summary` for
+    today, the day of the digests being answered.
+    """
+    today = to_digest_date(timezone.now())
+    key = team_summaries_key(user.pk, today)
+    teams = cache.get(key)
+
+    if teams is None:
+        teams = list(user.get_teams().with_summary(user, today).order_by('name'))
+        cache.set(key, teams, TEAM_SUMMARIES_TIMEOUT)
+
+    return teams
+
+
+def invalidate_team_summaries(team_id, user_ids=()):
+    """
+    Invalidates the cached team lists of every member of the team, and of
+    `user_ids`, e.g. members that were just removed.
+    """
+    today = to_digest_date(timezone.now())
+    user_ids = set(user_ids) | set(
+        Membership.objects.filter(team_id=team_id).values_list('user_id', flat=True)
+    )
+    cache.delete_many([team_summaries_key(user_id, today) for user_id in user_ids])
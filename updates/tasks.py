@@ -3,21 +3,38 @@ import logging
 
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
-from django.template.loader import render_to_string
 from django.utils import timezone
 
 from celery import shared_task
 import mandrill
 import pytz
 
-from .helpers import get_domain_name
+from digestus.users.models import User
+
+from .digests import (
+    format_digest_date,
+    get_combined_digest_context,
+    get_combined_digest_groups,
+    get_digest_context,
+    invalidate_digest_fragment,
+)
+from .helpers import to_date
+from .instrumentation import InstrumentedTask, count_units, render_template, sending
+from .metrics import DIGESTS_SENT, INBOUND_EVENTS, REMINDERS_SENT
 from .models import Team, Membership
+from .partitions import ensure_partitions
+from .period_digests import get_period_digest_context, is_period_digest_day
+from .reconciliation import reconcile_team
+from .reference import get_domain_name, get_team_settings
+from .replicas import use_replica
+from .rollups import refresh_rollups
 
 logger = logging.getLogger('put')
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def schedule_reminders():
     """
     Schedule sending of reminders to each member in an active `Team`.
@@ -48,7 +65,7 @@ def schedule_reminders():
             )
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def remind_team_member(membership_id, previous_todos=None, previous_blockers=None):
     """
     Sends an individual reminder to a user.
@@ -56,26 +73,27 @@ def remind_team_member(membership_id, previous_todos=None, previous_blockers=Non
     Includes TODOs and blockers if provided.
     """
     try:
-        membership = Membership.objects.get(id=membership_id, is_active=True)
+        membership = Membership.objects.select_related('user').get(id=membership_id, is_active=True)
     except Membership.DoesNotExist:
         logger.error(
             "Active Membership with %s ID does not exist." % membership_id)
         return
+    team = get_team_settings(membership.team_id)
 
     subject = 'What did you get done today?'
-    from_email = 'Digestus Reminder <{email}>'.format(email=membership.team.email)
+    from_email = 'Digestus Reminder <{email}>'.format(email=team.email)
     recipient = [
         '{name} <{email}>'.format(name=membership.user.get_full_name(),
                                   email=membership.user.email)
     ]
     context = {
-        'team_email': membership.team.email,
-        'team_name': membership.team.name,
+        'team_email': team.email,
+        'team_name': team.name,
         'previous_todos': previous_todos,
         'previous_blockers': previous_blockers,
         'domain': get_domain_name(),
     }
-    text_body = render_to_string('updates/emails/reminder.txt', context)
+    text_body = render_template('updates/emails/reminder.txt', context)
 
     email_msg = EmailMultiAlternatives(
         subject=subject,
@@ -83,10 +101,12 @@ def remind_team_member(membership_id, previous_todos=None, previous_blockers=Non
         from_email=from_email,
         to=recipient,
     )
-    email_msg.subaccount = membership.team.subaccount_id
+    email_msg.subaccount = team.subaccount_id
 
     try:
-        email_msg.send()
+        with sending('reminder'):
+            email_msg.send()
+        REMINDERS_SENT.inc()
     except Exception as e:
         logger.exception('Failed to send team member reminder. Retrying in 5 minutes.')
         remind_team_member.retry(
@@ -97,7 +117,7 @@ def remind_team_member(membership_id, previous_todos=None, previous_blockers=Non
         )
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def send_reminders(team_id):
     """
     Sends reminder emails to all members of the team if:
@@ -129,11 +149,8 @@ def send_reminders(team_id):
 
     today = timezone.now()
     for membership in team.memberships.filter(is_active=True):
-        update = membership.updates.filter(
-            for_date__year=today.year,
-            for_date__month=today.month,
-            for_date__day=today.day,
-        ).first()
+        count_units()
+        update = membership.updates.for_day(today).first()
 
         if update and (update.will_do or update.blocker):
             remind_team_member.delay(
@@ -145,7 +162,7 @@ def send_reminders(team_id):
             remind_team_member.delay(membership.id)
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def schedule_digest():
     """
     Schedule sending of digests to all active members and silent recipients in an active `Team`.
@@ -180,7 +197,7 @@ def schedule_digest():
             )
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def send_digest(team_id, for_date, for_project_managers=False):
     """
     Sends digest for the given date to all active members and silent
@@ -200,40 +217,20 @@ def send_digest(team_id, for_date, for_project_managers=False):
             "Active team with %s ID does not exist." % team_id)
         return
 
-    team_updates = team.get_updates(for_date)
-
-    if team_updates:
-        ph_tz = pytz.timezone('Asia/Manila')
-        update_for_date = for_date.astimezone(ph_tz).strftime('%a, %b %d %Y')
-        context = {
-            'members_and_updates': team.get_updates(for_date),
-            'team': team,
-            'date': update_for_date,
-            'domain': get_domain_name(),
-        }
-        text_body = render_to_string('updates/emails/digest.txt', context)
-        html_body = render_to_string('updates/emails/digest.html', context)
-
-        # Prepare email
-        from_email = 'Digestus Digest <{email}>'.format(email=team.email)
-        subject = 'Digest for {team} for {date}'.format(team=team.name,
-                                                        date=update_for_date)
-        msg = EmailMultiAlternatives(
-            subject=subject,
-            body=text_body,
-            from_email=from_email,
-            to=team.get_recipients(for_project_managers),
-        )
-        msg.auto_text = True
-        msg.preserve_recipients = True
-        msg.auto_text = False
-        msg.auto_html = False
-        msg.attach_alternative(html_body, 'text/html')
-        msg.content_subtype = 'html'
-        msg.subaccount = team.subaccount_id
+    # One transaction, so that the team is touched once
+    with transaction.atomic():
+        # Records who was expected to answer, including the members that did not
+        refresh_rollups([team.pk], to_date(for_date), to_date(for_date))
+        # Before the context, so that the digest shows how long each item has been planned
+        reconcile_team(team, for_date)
+    invalidate_digest_fragment(team.pk, for_date)
 
+    msg = build_digest_message(team, for_date, for_project_managers)
+    if msg is not None:
         try:
-            msg.send()
+            with sending('digest'):
+                msg.send()
+            DIGESTS_SENT.labels('project_managers' if for_project_managers else 'daily').inc()
         except Exception as e:
             logger.exception(
                 'Digest sending failed for team with ID: %s. Retrying in 5 minutes.' % team_id)
@@ -248,17 +245,223 @@ def send_digest(team_id, for_date, for_project_managers=False):
         logger.error(error_msg)
 
 
-@shared_task
+def build_digest_message(team, for_date, for_project_managers=False):
+    """
+    Renders the digest of `team` for `for_date` into an email, or returns
+    None when the team has no active members. See `send_digest`.
+    """
+    context = get_digest_context(team, for_date)
+    if not context['members_and_updates']:
+        return None
+
+    update_for_date = context['date']
+    text_body = render_template('updates/emails/digest.txt', context)
+    html_body = render_template('updates/emails/digest.html', context)
+
+    # Prepare email
+    from_email = 'Digestus Digest <{email}>'.format(email=team.email)
+    subject = 'Digest for {team} for {date}'.format(team=team.name,
+                                                    date=update_for_date)
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        from_email=from_email,
+        # Users with a combined digest get this team's digest there
+        to=team.get_recipients(for_project_managers, exclude_combined=True),
+    )
+    msg.auto_text = True
+    msg.preserve_recipients = True
+    msg.auto_text = False
+    msg.auto_html = False
+    msg.attach_alternative(html_body, 'text/html')
+    msg.content_subtype = 'html'
+    msg.subaccount = team.subaccount_id
+    return msg
+
+
+@shared_task(base=InstrumentedTask)
+def schedule_combined_digests():
+    """
+    Schedule sending of the combined digests of users who opted in, after the
+    latest digest of their teams that are due today.
+
+    Runs daily, like `schedule_digest`.
+    """
+    ph_tz = pytz.timezone('Asia/Manila')
+    today = timezone.now().astimezone(ph_tz)
+
+    for user_id, team_ids, send_digest_at in get_combined_digest_groups(today.weekday()):
+        digest_eta = today.replace(
+            hour=send_digest_at.hour,
+            minute=send_digest_at.minute,
+        )
+        send_combined_digest.apply_async(
+            (user_id, team_ids, digest_eta.astimezone(pytz.UTC)),
+            eta=digest_eta,
+        )
+
+
+@shared_task(base=InstrumentedTask)
+def send_combined_digest(user_id, team_ids, for_date):
+    """
+    Sends one email with the digests of several teams to a user.
+
+    Arguments:
+        `user_id`: ID of the `User`
+        `team_ids`: IDs of the teams to include
+        `for_date`: A `datetime.datetime` instance in UTC
+    """
+    try:
+        user = User.objects.get(pk=user_id)
+    except User.DoesNotExist:
+        logger.exception(
+            "User with %s ID does not exist." % user_id)
+        return
+
+    teams = list(Team.objects.filter(pk__in=team_ids, is_active=True).order_by('name'))
+    if not teams:
+        logger.error('No active teams for the combined digest of user with ID: %s.', user_id)
+        return
+
+    with use_replica():
+        context = get_combined_digest_context(user, teams, for_date)
+    text_body = render_template('updates/emails/combined_digest.txt', context)
+    html_body = render_template('updates/emails/combined_digest.html', context)
+
+    subject = 'Digest for {teams} for {date}'.format(teams=', '.join(team.name for team in teams),
+                                                     date=context['date'])
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        # Not sent from a team address, since it covers several teams
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    msg.auto_text = False
+    msg.auto_html = False
+    msg.attach_alternative(html_body, 'text/html')
+    msg.content_subtype = 'html'
+
+    try:
+        with sending('digest'):
+            msg.send()
+        DIGESTS_SENT.labels('combined').inc()
+    except Exception as e:
+        logger.exception(
+            'Combined digest sending failed for user with ID: %s. Retrying in 5 minutes.', user_id)
+        send_combined_digest.retry(
+            args=[user_id, team_ids, for_date],
+            exc=e,
+            countdown=300,
+            max_retries=5,
+        )
+
+
+@shared_task(base=InstrumentedTask)
+def schedule_period_digests():
+    """
+    Schedule sending of the weekly and monthly digests of active teams that are due today.
+
+    Runs daily, like `schedule_digest`.
+    """
+    active_teams = (
+        Team.objects.exclude(rollup_digest_period='')
+                    .filter(is_active=True,
+                            memberships__is_active__gt=0)
+                    .distinct()
+    )
+    for team in active_teams:
+        ph_tz = pytz.timezone('Asia/Manila')
+        today = timezone.now().astimezone(ph_tz)
+
+        if is_period_digest_day(team, today):
+            digest_eta = today.replace(
+                hour=team.send_digest_at.hour,
+                minute=team.send_digest_at.minute,
+            )
+            send_period_digest.apply_async(
+                (team.id, team.rollup_digest_period, digest_eta.astimezone(pytz.UTC)),
+                eta=digest_eta,
+            )
+
+
+@shared_task(base=InstrumentedTask)
+def send_period_digest(team_id, period, for_date):
+    """
+    Sends the weekly or monthly summary of the team to its project managers.
+
+    Arguments:
+        `team_id`: ID of the `Team`
+        `period`: 'weekly' or 'monthly'
+        `for_date`: A `datetime.datetime` instance in UTC; the summary covers the period before it
+    """
+    try:
+        team = Team.objects.get(id=team_id, is_active=True)
+    except Team.DoesNotExist:
+        logger.exception(
+            "Active team with %s ID does not exist." % team_id)
+        return
+
+    with use_replica():
+        context = get_period_digest_context(team, period, for_date)
+    text_body = render_template('updates/emails/period_digest.txt', context)
+    html_body = render_template('updates/emails/period_digest.html', context)
+
+    subject = '{period} digest for {team}, {start} to {end}'.format(
+        period=period.capitalize(),
+        team=team.name,
+        start=format_digest_date(context['start']),
+        end=format_digest_date(context['end']),
+    )
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        from_email='Digestus Digest <{email}>'.format(email=team.email),
+        to=team.get_recipients(for_project_managers=True),
+    )
+    msg.preserve_recipients = True
+    msg.auto_text = False
+    msg.auto_html = False
+    msg.attach_alternative(html_body, 'text/html')
+    msg.content_subtype = 'html'
+    msg.subaccount = team.subaccount_id
+
+    try:
+        with sending('digest'):
+            msg.send()
+        DIGESTS_SENT.labels(period).inc()
+    except Exception as e:
+        logger.exception(
+            '%s digest sending failed for team with ID: %s. Retrying in 5 minutes.', period, team_id)
+        send_period_digest.retry(
+            args=[team_id, period, for_date],
+            exc=e,
+            countdown=300,
+            max_retries=5,
+        )
+
+
+@shared_task(base=InstrumentedTask)
 def wrong_email_format_reply(inbound_email, from_email, email_text):
     subject = "FORMAT ERROR!!"
     context = {
         'email_text': email_text
     }
-    text_body = render_to_string('updates/emails/auto_reply.txt', context)
+    text_body = render_template('updates/emails/auto_reply.txt', context)
     auto_reply = EmailMultiAlternatives(
         subject=subject,
         body=text_body,
         from_email=inbound_email,
         to=[from_email, ]
     )
-    auto_reply.send()
+    with sending('auto_reply'):
+        auto_reply.send()
+    INBOUND_EVENTS.labels('format_error').inc()
+
+
+@shared_task(base=InstrumentedTask)
+def create_partitions():
+    """
+    Creates the partitions of the coming months, see `updates.partitions`.
+    """
+    ensure_partitions()
@@ -0,0 +1,230 @@
+import json
+from datetime import date, timedelta
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .factories import RoleFactory, TeamFactory, TeamMembershipFactory, UpdateFactory
+from .models import APIToken, Update
+from .rollups import refresh_rollups
+from digestus.users.tests.factories import UserFactory
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.team = TeamFactory(created_by=self.user)
+        self.membership = TeamMembershipFactory(team=self.team, user=self.user)
+        self.client.login(username=self.user.username, password='password')
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        return response, json.loads(response.content.decode('utf-8'))
+
+
+class UpdateListAPITest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_updates', kwargs={'team_id': self.team.pk})
+        start = date(2015, 1, 1)
+        self.updates = [
+            UpdateFactory(membership=self.membership, for_date=start + timedelta(days=day))
+            for day in range(5)
+        ]
+        # Two updates on the same day are ordered by id
+        self.updates.append(UpdateFactory(membership=self.membership, for_date=start + timedelta(days=4)))
+
+    def test_pages_through_all_updates(self):
+        """
+        Following `next` returns every update exactly once, newest first.
+        """
+        seen = []
+        url, params = self.url, {'limit': 2}
+
+        while url:
+            response = self.client.get(url, params)
+            data = json.loads(response.content.decode('utf-8'))
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], {}
+
+        expected = [update.pk for update in sorted(self.updates, key=lambda u: (u.for_date, u.pk), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_field_selection(self):
+        response, data = self.get_json(self.url, fields='done,member')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(data['results'][0].keys()), ['id', 'done', 'member'])
+
+    def test_unknown_field(self):
+        response, data = self.get_json(self.url, fields='password')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_fixed_query_count(self):
+        """
+        The number of queries does not depend on the page size.
+        """
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(self.url, {'limit': 1})
+        with CaptureQueriesContext(connection) as large_page:
+            self.client.get(self.url, {'limit': 50})
+
+        self.assertEqual(len(small_page), len(large_page))
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_non_member(self):
+        other_team = TeamFactory()
+
+        response, data = self.get_json(reverse('api_updates', kwargs={'team_id': other_team.pk}))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_inactive_member(self):
+        self.membership.is_active = False
+        self.membership.save()
+
+        response, data = self.get_json(self.url)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        self.client.logout()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_create_update(self):
+        payload = {'for_date': '2015-02-02', 'done': 'Shipped', 'will_do': 'Review', 'blocker': ''}
+
+        response = self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        update = Update.objects.get(pk=json.loads(response.content.decode('utf-8'))['id'])
+        self.assertEqual(update.membership, self.membership)
+        self.assertEqual(update.done, 'Shipped')
+
+
+class TokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_updates', kwargs={'team_id': self.team.pk})
+        self.payload = json.dumps({'for_date': '2015-02-02', 'done': 'Shipped', 'will_do': '', 'blocker': ''})
+        # Checks CSRF like browsers' requests are checked
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_token_writes_without_csrf_token(self):
+        key = APIToken.objects.create_token(self.user, 'CI')
+
+        response = self.client.post(self.url, self.payload, content_type='application/json',
+                                    HTTP_AUTHORIZATION='Bearer {}'.format(key))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Update.objects.get(done='Shipped').membership, self.membership)
+
+    def test_invalid_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_session_still_needs_csrf_token(self):
+        self.client.login(username=self.user.username, password='password')
+
+        response = self.client.post(self.url, self.payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class UpdateDetailAPITest(APITestCase):
+    def test_patch_own_update(self):
+        update = UpdateFactory(membership=self.membership, done='Draft')
+        url = reverse('api_update', kwargs={'update_id': update.pk})
+
+        response = self.client.patch(url, json.dumps({'done': 'Final'}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        update.refresh_from_db()
+        self.assertEqual(update.done, 'Final')
+        self.assertEqual(update.will_do, 'Task to do today')
+
+    def test_patch_update_of_teammate(self):
+        teammate = TeamMembershipFactory(team=self.team)
+        update = UpdateFactory(membership=teammate)
+        url = reverse('api_update', kwargs={'update_id': update.pk})
+
+        response = self.client.patch(url, json.dumps({'done': 'Final'}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class MembershipAPITest(APITestCase):
+    def test_creator_adds_member(self):
+        new_member = UserFactory()
+        role = RoleFactory()
+        url = reverse('api_memberships', kwargs={'team_id': self.team.pk})
+
+        response = self.client.post(url, json.dumps({'user': new_member.pk, 'role': role.pk, 'is_active': True}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.team.memberships.filter(user=new_member).exists())
+
+    def test_duplicate_member(self):
+        url = reverse('api_memberships', kwargs={'team_id': self.team.pk})
+
+        response = self.client.post(url, json.dumps({'user': self.user.pk, 'role': self.membership.role_id,
+                                                     'is_active': True}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class UpdateSearchAPITest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_update_search', kwargs={'team_id': self.team.pk})
+        self.blocked = UpdateFactory(membership=self.membership, blocker='Waiting for the VPN credentials')
+        UpdateFactory(membership=self.membership, done='Asked for VPN access', blocker='')
+
+    def test_search_section(self):
+        response, data = self.get_json(self.url, q='vpn', section='blocker', fields='id,rank')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in data['results']], [self.blocked.pk])
+        self.assertIn('rank', data['results'][0])
+
+    def test_unknown_section(self):
+        response, data = self.get_json(self.url, q='vpn', section='notes')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TeamParticipationAPITest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_team_participation', kwargs={'team_id': self.team.pk})
+        # Monday and Tuesday
+        UpdateFactory(membership=self.membership, for_date=date(2015, 1, 5))
+        refresh_rollups([self.team.pk], date(2015, 1, 5), date(2015, 1, 6))
+
+    def test_participation(self):
+        response, data = self.get_json(self.url, until='2015-01-06', days=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['expected'] for day in data['days']], [1, 1])
+        self.assertEqual([day['responded'] for day in data['days']], [1, 0])
+        self.assertEqual(data['members'][0]['response_rate'], 0.5)
+
+    def test_invalid_until(self):
+        response, _ = self.get_json(self.url, until='yesterday')
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,73 @@
+from datetime import date
+
+from django.test import TestCase
+
+from .blockers import get_bands, get_blocker_history, get_minhash, get_shingles, get_similarity, index_update_blockers
+from .digests import get_digest_context
+from .factories import TeamMembershipFactory, UpdateFactory
+
+
+def signature(text):
+    return get_minhash(get_shingles(text))
+
+
+class MinHashTest(TestCase):
+    def test_similar_blockers(self):
+        similarity = get_similarity(signature('Staging server is down'),
+                                    signature('The staging server is still down'))
+
+        self.assertGreaterEqual(similarity, 0.5)
+
+    def test_different_blockers(self):
+        similarity = get_similarity(signature('Staging server is down'),
+                                    signature('Waiting for client feedback on designs'))
+
+        self.assertLess(similarity, 0.2)
+
+    def test_identical_blockers_share_every_band(self):
+        bands = get_bands(signature('Blocked by code review'))
+
+        self.assertEqual(bands, get_bands(signature('blocked by code review.')))
+        self.assertEqual(len(set(bands)), len(bands))
+
+    def test_placeholders_are_ignored(self):
+        self.assertEqual(get_shingles('None.'), set())
+
+
+class RecurringBlockerTest(TestCase):
+    def setUp(self):
+        self.membership = TeamMembershipFactory()
+        self.updates = [
+            UpdateFactory(membership=self.membership, for_date=date(2015, 1, day), blocker=blocker)
+            for day, blocker in (
+                (5, 'Staging server is down'),
+                (6, 'The staging server is still down\nNeed API keys'),
+                (7, 'Staging server is still down'),
+            )
+        ]
+        for update in self.updates:
+            index_update_blockers(update)
+
+    def test_chain(self):
+        history = get_blocker_history(self.updates)
+
+        self.assertEqual(history[self.updates[0].pk][0]['since'], None)
+        self.assertEqual(history[self.updates[1].pk][1]['since'], None)
+        self.assertEqual(history[self.updates[2].pk][0]['since'], date(2015, 1, 5))
+        self.assertEqual(history[self.updates[2].pk][0]['days'], 3)
+
+    def test_reindex_replaces_signatures(self):
+        update = self.updates[2]
+        update.blocker = 'Waiting for design feedback'
+        update.save()
+
+        index_update_blockers(update)
+
+        self.assertEqual(update.blocker_signatures.get().first_reported_on, date(2015, 1, 7))
+
+    def test_digest_context(self):
+        context = get_digest_context(self.membership.team, date(2015, 1, 7))
+
+        blocker = context['members_and_updates'][0]['blockers'][0]
+        self.assertEqual(blocker['text'], 'Staging server is still down')
+        self.assertEqual(blocker['days'], 3)
@@ -0,0 +1,78 @@
+import io
+from datetime import date, datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .factories import TeamFactory, TeamMembershipFactory, UpdateFactory
+from .imports import import_updates, read_csv, read_jsonl
+from .models import Update
+from digestus.users.tests.factories import UserFactory
+
+
+CSV_FILE = """member_email,for_date,done,will_do,blocker,role
+dev@test.com,2015-01-05,Fixed bug #1,Fix bug #2,
+DEV@test.com,2015-01-06,Fixed bug #2,,Slow VPN
+new@test.com,2015-01-05,Joined,Onboarding,,Designer
+unknown@test.com,2015-01-05,Nothing,,
+dev@test.com,05/01/2015,Wrong date,,
+"""
+
+
+class ImportUpdatesTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.developer = UserFactory(email='dev@test.com')
+        self.new_member = UserFactory(email='new@test.com')
+        self.membership = TeamMembershipFactory(team=self.team, user=self.developer)
+        self.existing = UpdateFactory(membership=self.membership, done='Old', for_date=date(2015, 1, 5))
+
+    def test_import_csv(self):
+        result = import_updates(self.team, read_csv(io.StringIO(CSV_FILE)))
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(result.created_memberships, 1)
+        self.assertEqual(sorted(line for line, _ in result.errors), [5, 6])
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.done, 'Fixed bug #1')
+        self.assertEqual(self.existing.blocker, '')
+        jan_6 = self.membership.updates.get(for_date=date(2015, 1, 6))
+        self.assertEqual(jan_6.blocker, 'Slow VPN')
+        new_membership = self.team.memberships.get(user=self.new_member)
+        self.assertEqual(new_membership.role.name, 'Designer')
+
+    def test_member_without_role(self):
+        csv_file = io.StringIO('member_email,for_date,done\nnew@test.com,2015-01-05,Joined\n')
+
+        result = import_updates(self.team, read_csv(csv_file))
+
+        self.assertEqual(result.created_memberships, 1)
+        members = self.team.get_updates(datetime(2015, 1, 5, 12, tzinfo=timezone.utc))
+        new_member, = [member for member in members if member['update'] and member['update'].done == 'Joined']
+        self.assertEqual(new_member['role'], '')
+
+    def test_import_jsonl(self):
+        jsonl_file = io.StringIO(
+            '{"member_email": "dev@test.com", "for_date": "2015-02-02", "done": "Shipped"}\n'
+            'not json\n'
+        )
+
+        result = import_updates(self.team, read_jsonl(jsonl_file))
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.errors[0][0], 2)
+        self.assertTrue(self.membership.updates.filter(for_date=date(2015, 2, 2), done='Shipped').exists())
+
+    def test_imported_updates_are_searchable(self):
+        import_updates(self.team, read_csv(io.StringIO(CSV_FILE)))
+
+        self.assertTrue(Update.objects.search('vpn').exists())
+
+    def test_dry_run(self):
+        result = import_updates(self.team, read_csv(io.StringIO(CSV_FILE)), dry_run=True)
+
+        self.assertEqual(len(result.rows), 3)
+        self.assertEqual(Update.objects.count(), 1)
+        self.assertFalse(self.team.memberships.filter(user=self.new_member).exists())
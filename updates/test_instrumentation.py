@@ -0,0 +1,90 @@
+import datetime
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.six import StringIO
+
+from celery import shared_task
+
+from digestus.users.tests.factories import UserFactory
+from .instrumentation import (
+    InstrumentedTask,
+    QueryBudgetExceeded,
+    add_rendered,
+    count_units,
+    get_histograms,
+    get_percentile,
+)
+from .models import Team
+
+TASK_NAME = 'updates.test_instrumentation.count_teams'
+
+
+@shared_task(base=InstrumentedTask)
+def count_teams(times):
+    for _ in range(times):
+        Team.objects.count()
+    add_rendered('déjà vu')
+    return times
+
+
+@shared_task(base=InstrumentedTask)
+def count_teams_per_unit(units, queries_per_unit):
+    for _ in range(units):
+        count_units()
+        for _ in range(queries_per_unit):
+            Team.objects.count()
+
+
+class InstrumentedTaskTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        UserFactory()
+
+    def get_histogram(self, metric):
+        return get_histograms(datetime.date.today())[TASK_NAME][metric]
+
+    def test_records_queries_and_rendered_bytes(self):
+        self.assertEqual(count_teams(3), 3)
+
+        self.assertEqual(get_percentile(self.get_histogram('queries'), 1), '5')
+        self.assertEqual(get_percentile(self.get_histogram('rendered_bytes'), 1), '1024')
+        self.assertEqual(sum(count for _, count in self.get_histogram('wall_ms')), 1)
+
+    def test_records_eager_calls(self):
+        count_teams.delay(1)
+        count_teams.delay(1)
+
+        self.assertEqual(dict(self.get_histogram('queries'))['1'], 2)
+
+    @override_settings(TASK_QUERY_BUDGETS={TASK_NAME: 2}, TASK_QUERY_BUDGETS_STRICT=True)
+    def test_over_budget_fails_when_strict(self):
+        self.assertEqual(count_teams(2), 2)
+        with self.assertRaises(QueryBudgetExceeded):
+            count_teams(3)
+
+    @override_settings(TASK_QUERY_BUDGETS={TASK_NAME + '_per_unit': (1, 2)}, TASK_QUERY_BUDGETS_STRICT=True)
+    def test_budget_per_unit_of_work(self):
+        count_teams_per_unit(10, 2)
+        with self.assertRaises(QueryBudgetExceeded):
+            count_teams_per_unit(10, 3)
+
+    @override_settings(TASK_QUERY_BUDGETS={TASK_NAME: 2}, TASK_QUERY_BUDGETS_STRICT=False)
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('put', 'WARNING') as logs:
+            self.assertEqual(count_teams(3), 3)
+        self.assertIn('over its budget of 2', logs.output[0])
+
+    def test_does_not_hide_queries_from_assert_num_queries(self):
+        with self.assertNumQueries(2):
+            count_teams(2)
+
+    def test_task_stats_command(self):
+        count_teams(1)
+        out = StringIO()
+
+        call_command('task_stats', days=2, stdout=out)
+
+        self.assertIn('{}: 1 calls'.format(TASK_NAME), out.getvalue())
+        self.assertIn('queries: p50 <= 1', out.getvalue())
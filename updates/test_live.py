@@ -0,0 +1,60 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from .factories import TeamMembershipFactory, UpdateFactory
+from .live import TeamFeedListener, format_event
+
+
+@mock.patch.object(TeamFeedListener, 'start')
+class TeamFeedListenerTest(TestCase):
+    def setUp(self):
+        self.membership = TeamMembershipFactory()
+        self.update = UpdateFactory(membership=self.membership, done='Deployed the dashboard')
+        self.event = {
+            'id': self.update.pk,
+            'membership_id': self.membership.pk,
+            'team_id': self.membership.team_id,
+            'for_date': str(self.update.for_date),
+            'op': 'insert',
+        }
+
+    def test_dispatch_to_team_subscribers(self, start):
+        listener = TeamFeedListener()
+        first = listener.subscribe(self.membership.team_id)
+        second = listener.subscribe(self.membership.team_id)
+        other_team = listener.subscribe(self.membership.team_id + 1)
+
+        with self.assertNumQueries(1):
+            listener.dispatch(self.event)
+
+        self.assertEqual(first.get_nowait()['update']['done'], 'Deployed the dashboard')
+        self.assertEqual(second.get_nowait()['update']['id'], self.update.pk)
+        self.assertTrue(other_team.empty())
+
+    def test_dispatch_without_subscribers(self, start):
+        listener = TeamFeedListener()
+
+        with self.assertNumQueries(0):
+            listener.dispatch(self.event)
+
+    def test_unsubscribe(self, start):
+        listener = TeamFeedListener()
+        subscriber = listener.subscribe(self.membership.team_id)
+
+        listener.unsubscribe(self.membership.team_id, subscriber)
+        listener.dispatch(self.event)
+
+        self.assertTrue(subscriber.empty())
+        self.assertEqual(dict(listener.subscribers), {})
+
+    def test_format_event(self, start):
+        listener = TeamFeedListener()
+        subscriber = listener.subscribe(self.membership.team_id)
+        listener.dispatch(self.event)
+
+        lines = format_event(subscriber.get_nowait()).splitlines()
+
+        self.assertEqual(lines[:2], ['id: {}'.format(self.update.pk), 'event: insert'])
+        self.assertEqual(json.loads(lines[2][len('data: '):])['done'], 'Deployed the dashboard')
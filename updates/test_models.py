@@ -0,0 +1,106 @@
+from datetime import date, datetime
+
+from django.db import connection
+from django.test import TestCase
+
+import pytz
+
+from .factories import TeamFactory, TeamMembershipFactory, UpdateFactory
+from .models import Update
+
+
+def explain(queryset):
+    """
+    Returns the query plan of `queryset` as a single string.
+
+    Sequential scans are disabled so that the planner picks an index whenever
+    one can satisfy the query, even on the tiny tables used in tests.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('EXPLAIN ' + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        cursor.execute('SET LOCAL enable_seqscan = on')
+    return plan
+
+
+class UpdateQuerySetTest(TestCase):
+    def setUp(self):
+        self.membership = TeamMembershipFactory()
+        self.jan_5 = UpdateFactory(membership=self.membership, for_date=date(2015, 1, 5))
+        self.jan_6 = UpdateFactory(membership=self.membership, for_date=date(2015, 1, 6))
+
+    def test_for_day_with_datetime(self):
+        """
+        A UTC datetime matches the updates for its UTC date.
+        """
+        for_date = datetime(2015, 1, 5, 23, 30, tzinfo=pytz.UTC)
+
+        updates = self.membership.updates.for_day(for_date)
+
+        self.assertEqual(list(updates), [self.jan_5])
+
+    def test_between(self):
+        updates = Update.objects.between(date(2015, 1, 5), date(2015, 1, 6)).order_by('for_date')
+
+        self.assertEqual(list(updates), [self.jan_5, self.jan_6])
+
+    def test_for_day_uses_index(self):
+        """
+        Digest and reminder lookups must not fall back to a sequential scan.
+        """
+        plan = explain(self.membership.updates.for_day(date(2015, 1, 5)))
+
+        self.assertNotIn('Seq Scan on updates_update', plan)
+        self.assertNotIn('date_part', plan)
+
+    def test_team_updates_use_index(self):
+        team = TeamFactory()
+        memberships = team.memberships.filter(is_active=True)
+
+        plan = explain(Update.objects.filter(membership__in=memberships).for_day(date(2015, 1, 5)))
+
+        self.assertNotIn('Seq Scan on updates_update', plan)
+
+
+class UpdateSearchTest(TestCase):
+    def setUp(self):
+        self.membership = TeamMembershipFactory()
+        self.deploy_done = UpdateFactory(membership=self.membership,
+                                         done='Deployed the new dashboard',
+                                         will_do='Write tests',
+                                         blocker='')
+        self.deploy_blocked = UpdateFactory(membership=self.membership,
+                                            done='Reviewed pull requests',
+                                            will_do='Fix styles',
+                                            blocker='Cannot deploy, staging is down')
+
+    def test_search(self):
+        updates = Update.objects.search('deploy')
+
+        self.assertEqual(set(updates), {self.deploy_done, self.deploy_blocked})
+
+    def test_search_all_words(self):
+        updates = Update.objects.search('deploy staging')
+
+        self.assertEqual(list(updates), [self.deploy_blocked])
+
+    def test_search_section(self):
+        updates = Update.objects.search('deploy', sections=['blocker'])
+
+        self.assertEqual(list(updates), [self.deploy_blocked])
+
+    def test_search_vector_follows_edits(self):
+        self.deploy_done.done = 'Migrated the database'
+        self.deploy_done.save()
+
+        self.assertEqual(list(Update.objects.search('migrate')), [self.deploy_done])
+
+    def test_search_without_words(self):
+        self.assertEqual(list(Update.objects.search('  !? ')), [])
+
+    def test_search_uses_gin_index(self):
+        plan = explain(Update.objects.search('deploy'))
+
+        self.assertIn('updates_update_search_vector_gin', plan)
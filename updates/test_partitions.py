@@ -0,0 +1,39 @@
+import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import partitions
+
+
+class PartitionNamesTest(SimpleTestCase):
+    def test_add_months(self):
+        self.assertEqual(partitions.add_months(datetime.date(2016, 11, 1), 1), datetime.date(2016, 12, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2016, 11, 1), 3), datetime.date(2017, 2, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2016, 1, 1), -1), datetime.date(2015, 12, 1))
+
+    def test_partition_name(self):
+        month = partitions.month_start(datetime.date(2016, 5, 17))
+        self.assertEqual(partitions.partition_name('updates_update', month), 'updates_update_y2016m05')
+
+    def test_rename_in_definition(self):
+        definition = ('CREATE INDEX updates_update_search_vector_gin_p '
+                      'ON public.updates_update USING gin (search_vector)')
+        self.assertEqual(
+            partitions.rename_in_definition(definition, 'updates_update', 'updates_update_p'),
+            'CREATE INDEX updates_update_search_vector_gin_p ON updates_update_p USING gin (search_vector)',
+        )
+
+    def test_old_server_refused(self):
+        with mock.patch('updates.partitions.connection') as connection:
+            connection.pg_version = 90405
+            with self.assertRaises(partitions.PartitioningError):
+                partitions.check_server_version()
+
+    def test_no_partitions_on_old_server(self):
+        with mock.patch('updates.partitions.connection') as connection:
+            connection.pg_version = 90405
+
+            self.assertEqual(partitions.ensure_partitions(), [])
+
+        self.assertFalse(connection.cursor.called)
@@ -0,0 +1,84 @@
+from datetime import date, datetime, time
+from unittest import mock
+
+from django.test import TestCase
+
+import pytz
+
+from .factories import TeamFactory, TeamMembershipFactory, UpdateFactory
+from .period_digests import MAX_ITEMS_PER_MEMBER, get_period, get_period_digest_context, is_period_digest_day
+from .rollups import refresh_rollups
+from .tasks import schedule_period_digests
+
+
+class PeriodTest(TestCase):
+    def test_weekly(self):
+        self.assertEqual(get_period('weekly', date(2015, 1, 12)), (date(2015, 1, 5), date(2015, 1, 11)))
+
+    def test_monthly(self):
+        self.assertEqual(get_period('monthly', date(2015, 3, 1)), (date(2015, 2, 1), date(2015, 2, 28)))
+
+    def test_digest_day(self):
+        team = TeamFactory.build(rollup_digest_period='weekly', rollup_digest_weekday=0)
+
+        self.assertTrue(is_period_digest_day(team, date(2015, 1, 12)))
+        self.assertFalse(is_period_digest_day(team, date(2015, 1, 13)))
+
+    @mock.patch('updates.tasks.send_period_digest.apply_async')
+    @mock.patch('updates.tasks.timezone.now')
+    def test_early_monthly_digest(self, now, send_period_digest):
+        """
+        A digest sent at 07:00 in Manila on March 1st is sent on February 28th in UTC.
+        """
+        team = TeamFactory(rollup_digest_period='monthly', send_digest_at=time(7, 0))
+        TeamMembershipFactory(team=team)
+        now.return_value = datetime(2015, 2, 28, 17, 0, tzinfo=pytz.UTC)
+
+        schedule_period_digests()
+
+        (team_id, period, for_date), = [call[0][0] for call in send_period_digest.call_args_list]
+        self.assertEqual(for_date, datetime(2015, 2, 28, 23, 0, tzinfo=pytz.UTC))
+        self.assertEqual(get_period(period, for_date), (date(2015, 2, 1), date(2015, 2, 28)))
+        self.assertTrue(is_period_digest_day(team, for_date))
+
+
+class PeriodDigestContextTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.membership = TeamMembershipFactory(team=self.team)
+        self.idle = TeamMembershipFactory(team=self.team)
+        for day in range(5, 10):
+            UpdateFactory(membership=self.membership, for_date=date(2015, 1, day),
+                          done='Item {}'.format(day), blocker='Waiting for review' if day < 9 else '')
+        # Second update of a day is not counted, like in the daily digest
+        UpdateFactory(membership=self.membership, for_date=date(2015, 1, 9), done='Duplicate')
+        # Outside of the week
+        UpdateFactory(membership=self.membership, for_date=date(2015, 1, 12))
+
+    def test_member_summary(self):
+        context = get_period_digest_context(self.team, 'weekly', date(2015, 1, 12))
+
+        summary = context['members'][0]['summary']
+        self.assertEqual(summary.days_answered, 5)
+        self.assertEqual(list(summary.done), ['Item {}'.format(day) for day in range(5, 10)])
+        self.assertEqual(summary.open_blockers, [])
+        self.assertEqual(context['members'][1]['summary'].days_answered, 0)
+        self.assertIsNone(context['totals'])
+
+    def test_items_are_bounded(self):
+        UpdateFactory(membership=self.idle, for_date=date(2015, 1, 6),
+                      done='\n'.join('Task {}'.format(i) for i in range(MAX_ITEMS_PER_MEMBER + 5)))
+
+        summary = get_period_digest_context(self.team, 'weekly', date(2015, 1, 12))['members'][1]['summary']
+
+        self.assertEqual(summary.done_count, MAX_ITEMS_PER_MEMBER + 5)
+        self.assertEqual(len(summary.done), MAX_ITEMS_PER_MEMBER)
+
+    def test_participation_from_rollups(self):
+        refresh_rollups([self.team.pk], date(2015, 1, 5), date(2015, 1, 11))
+
+        context = get_period_digest_context(self.team, 'weekly', date(2015, 1, 12))
+
+        self.assertEqual(context['totals']['expected'], 10)
+        self.assertEqual(context['totals']['responded'], 5)
+        self.assertEqual(context['members'][0]['participation']['response_rate'], 1.0)
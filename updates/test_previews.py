@@ -0,0 +1,28 @@
+import datetime
+import os
+import shutil
+import tempfile
+
+from django.core import mail
+from django.test import TestCase
+
+from .factories import TeamFactory, TeamMembershipFactory
+from .previews import preview
+from digestus.users.tests.factories import UserFactory
+
+MONDAY = datetime.date(2015, 1, 5)
+
+
+class PreviewTest(TestCase):
+    def test_preview_writes_digest(self):
+        team = TeamFactory(digest_days_sent=[0, 1, 2, 3, 4], send_digest_at=datetime.time(9, 0))
+        TeamMembershipFactory(user=UserFactory(), team=team)
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        result = preview((team.pk, MONDAY, output_dir))
+
+        self.assertEqual(result.status, 'rendered')
+        self.assertEqual(os.path.getsize(os.path.join(output_dir, '{}.html'.format(team.pk))), result.html_bytes)
+        self.assertEqual(os.path.getsize(os.path.join(output_dir, '{}.txt'.format(team.pk))), result.text_bytes)
+        self.assertEqual(len(mail.outbox), 0)
@@ -0,0 +1,83 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from celery import shared_task
+
+from digestus.users.tests.factories import UserFactory
+from .factories import TeamFactory, TeamMembershipFactory
+from .instrumentation import InstrumentedTask
+from .profiling import make_room
+
+
+@shared_task(base=InstrumentedTask)
+def profiled_task(team_id):
+    return sum(range(100000))
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def get_files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_not_profiled_by_default(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0):
+            profiled_task(7)
+
+        self.assertEqual(self.get_files(), [])
+
+    def test_sampled_task_writes_folded_stacks(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1, PROFILING_MODE='sample'):
+            profiled_task(7)
+
+        filename, = self.get_files()
+        self.assertIn('-task-updates.test_profiling.profiled_task-team7-', filename)
+        self.assertTrue(filename.endswith('.folded.gz'))
+        with gzip.open(os.path.join(self.directory, filename), 'rt') as f:
+            for line in f:
+                stack, count = line.rsplit(' ', 1)
+                self.assertGreater(int(count), 0)
+
+    def test_cprofile_mode_writes_pstats(self):
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1, PROFILING_MODE='cprofile'):
+            profiled_task(7)
+
+        filename, = self.get_files()
+        self.assertTrue(filename.endswith('.pstats.gz'))
+
+    def test_request_profiled_with_token(self):
+        user = UserFactory()
+        team = TeamFactory()
+        TeamMembershipFactory(team=team, user=user)
+        self.client.login(username=user.username, password='password')
+        url = reverse('team_history', kwargs={'team_id': team.pk})
+
+        with self.settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0, PROFILING_TOKEN='secret'):
+            self.client.get(url, HTTP_X_DIGESTUS_PROFILE='wrong')
+            self.assertEqual(self.get_files(), [])
+
+            self.client.get(url, HTTP_X_DIGESTUS_PROFILE='secret')
+
+        filename, = self.get_files()
+        self.assertIn('-request-team_history-team{}-'.format(team.pk), filename)
+
+    @override_settings(PROFILING_MAX_BYTES=250)
+    def test_make_room_deletes_oldest_files(self):
+        for index, name in enumerate(['old', 'middle', 'new']):
+            path = os.path.join(self.directory, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (index, index))
+
+        self.assertTrue(make_room(self.directory, 100))
+        self.assertEqual(self.get_files(), ['middle', 'new'])
+
+        self.assertFalse(make_room(self.directory, 300))
+        self.assertEqual(self.get_files(), ['middle', 'new'])
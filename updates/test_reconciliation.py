@@ -0,0 +1,104 @@
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .digests import get_digest_context
+from .factories import TeamFactory, TeamMembershipFactory, UpdateFactory
+from .models import TodoItem
+from .reconciliation import get_tokens, match_items, reconcile_team, reconcile_team_range
+
+MONDAY = date(2015, 1, 5)
+TUESDAY = date(2015, 1, 6)
+WEDNESDAY = date(2015, 1, 7)
+
+
+class MatchItemsTest(TestCase):
+    def test_tokens(self):
+        self.assertEqual(get_tokens('Fixed the login tests'), get_tokens('fix login test'))
+
+    def test_best_match_first(self):
+        items = [TodoItem(pk=1, text='Write login tests'), TodoItem(pk=2, text='Deploy the dashboard')]
+
+        matches = match_items(items, ['Deployed dashboard to staging', 'Wrote tests for login', 'Lunch'])
+
+        self.assertEqual(sorted((item.pk, index) for item, index, _ in matches), [(1, 1), (2, 0)])
+
+
+class ReconcileTeamTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.alice = TeamMembershipFactory(team=self.team)
+        self.bob = TeamMembershipFactory(team=self.team)
+        UpdateFactory(membership=self.alice, for_date=MONDAY, done='Planning',
+                      will_do='Write login tests\nDeploy the dashboard', blocker='')
+        UpdateFactory(membership=self.alice, for_date=TUESDAY, done='Deployed the dashboard',
+                      will_do='Write the login tests', blocker='')
+        UpdateFactory(membership=self.alice, for_date=WEDNESDAY, done='Wrote login tests',
+                      will_do='Review pull requests', blocker='')
+        UpdateFactory(membership=self.bob, for_date=MONDAY, done='Meetings',
+                      will_do='Deploy the dashboard', blocker='')
+
+    def test_done_and_carried_items(self):
+        reconcile_team_range(self.team, MONDAY, WEDNESDAY)
+
+        deploy = TodoItem.objects.get(membership=self.alice, for_date=MONDAY, position=1)
+        self.assertEqual((deploy.done_on, deploy.match_score), (TUESDAY, 1.0))
+
+        tests = TodoItem.objects.get(membership=self.alice, for_date=TUESDAY)
+        self.assertEqual(tests.streak, 2)
+        self.assertEqual(tests.first_planned_on, MONDAY)
+        self.assertEqual(tests.carried_from.for_date, MONDAY)
+        self.assertEqual(tests.done_on, WEDNESDAY)
+
+        # Members are reconciled separately
+        self.assertIsNone(TodoItem.objects.get(membership=self.bob).done_on)
+
+    def test_reconcile_is_repeatable(self):
+        reconcile_team_range(self.team, MONDAY, WEDNESDAY)
+
+        self.assertEqual(reconcile_team(self.team, TUESDAY), (1, 1))
+        self.assertEqual(TodoItem.objects.filter(team=self.team).count(), 5)
+
+    def test_earlier_day_reconciled_again(self):
+        reconcile_team_range(self.team, MONDAY, WEDNESDAY)
+        tests = TodoItem.objects.get(membership=self.alice, for_date=TUESDAY)
+
+        reconcile_team(self.team, MONDAY)
+
+        tests.refresh_from_db()
+        self.assertEqual(tests.carried_from.for_date, MONDAY)
+        self.assertEqual(tests.streak, 2)
+
+    def test_changed_streak_carried_to_later_days(self):
+        reconcile_team_range(self.team, MONDAY, WEDNESDAY)
+        # Planned before Monday too
+        UpdateFactory(membership=self.alice, for_date=date(2015, 1, 2), done='Planning',
+                      will_do='Write login tests', blocker='')
+
+        reconcile_team_range(self.team, date(2015, 1, 2), MONDAY)
+
+        tests = TodoItem.objects.get(membership=self.alice, for_date=TUESDAY)
+        self.assertEqual(tests.streak, 3)
+        self.assertEqual(tests.first_planned_on, date(2015, 1, 2))
+
+    def test_queries_do_not_grow_with_members(self):
+        reconcile_team(self.team, MONDAY)
+        with CaptureQueriesContext(connection) as two_members:
+            reconcile_team(self.team, TUESDAY)
+
+        for membership in TeamMembershipFactory.create_batch(3, team=self.team):
+            UpdateFactory(membership=membership, for_date=TUESDAY, done='Deployed the dashboard')
+        with CaptureQueriesContext(connection) as five_members:
+            reconcile_team(self.team, TUESDAY)
+
+        self.assertEqual(len(five_members), len(two_members))
+
+    def test_digest_shows_streak(self):
+        reconcile_team_range(self.team, MONDAY, TUESDAY)
+
+        context = get_digest_context(self.team, TUESDAY)
+
+        todos = context['members_and_updates'][0]['todos']
+        self.assertEqual([(todo['text'], todo['streak']) for todo in todos], [('Write the login tests', 2)])
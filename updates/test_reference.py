@@ -0,0 +1,77 @@
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from . import reference
+from .factories import RoleFactory, TeamFactory, TeamMembershipFactory
+from .tasks import remind_team_member
+
+
+@override_settings(REFERENCE_DATA_CHECK_INTERVAL=0)
+class ReferenceDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference.invalidate()
+        self.team = TeamFactory()
+        self.membership = TeamMembershipFactory(team=self.team)
+
+    def test_domain_name_cached_until_site_saved(self):
+        site = Site.objects.get(pk=1)
+        self.assertEqual(reference.get_domain_name(), site.domain)
+        with self.assertNumQueries(0):
+            reference.get_domain_name()
+
+        site.domain = 'digest.example.com'
+        site.save()
+
+        self.assertEqual(reference.get_domain_name(), 'digest.example.com')
+
+    def test_role_names(self):
+        role = self.membership.role
+        self.assertEqual(reference.get_role_name(role.pk), role.name)
+        with self.assertNumQueries(0):
+            self.assertEqual(reference.get_role_name(role.pk), role.name)
+            self.assertEqual(reference.get_role_name(None), '')
+
+        role.name = 'Tester'
+        role.save()
+        self.assertEqual(reference.get_role_name(role.pk), 'Tester')
+
+        # Roles created since the names were loaded are found too
+        other = RoleFactory()
+        self.assertEqual(reference.get_role_name(other.pk), other.name)
+
+    def test_team_settings_cached_until_team_saved(self):
+        self.assertEqual(reference.get_team_settings(self.team.pk).email, self.team.email)
+        with self.assertNumQueries(0):
+            reference.get_team_settings(self.team.pk)
+
+        self.team.email = 'renamed@example.com'
+        self.team.save()
+
+        self.assertEqual(reference.get_team_settings(self.team.pk).email, 'renamed@example.com')
+
+    def test_version_bumped_on_commit(self):
+        version = cache.get(reference.VERSION_KEY)
+
+        # Test cases never commit
+        self.team.save()
+
+        self.assertEqual(cache.get(reference.VERSION_KEY), version)
+
+    def test_other_processes_invalidations(self):
+        reference.get_team_settings(self.team.pk)
+        # What another process saving the team does once it commits
+        reference.bump_version()
+
+        with self.assertNumQueries(1):
+            reference.get_team_settings(self.team.pk)
+
+    def test_reminder_has_no_reference_queries(self):
+        remind_team_member(self.membership.pk)
+
+        # Only the membership with its user
+        with self.assertNumQueries(1):
+            remind_team_member(self.membership.pk)
+        self.assertEqual(len(mail.outbox), 2)
@@ -0,0 +1,85 @@
+import datetime
+import os
+import shutil
+import tempfile
+
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+
+from .factories import TeamFactory, TeamMembershipFactory
+from .replay import Job, get_digest_datetime, get_jobs, replay_all
+from digestus.users.tests.factories import UserFactory
+
+MONDAY = datetime.date(2015, 1, 5)
+SUNDAY = datetime.date(2015, 1, 11)
+
+
+class ReplayTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory(digest_days_sent=[0, 1, 2, 3, 4],
+                                send_digest_at=datetime.time(9, 0),
+                                name='Replayed Team')
+        TeamMembershipFactory(user=UserFactory(email='dev@test.ph'), team=self.team)
+
+    def test_digest_datetime(self):
+        # 9:00 in Manila
+        self.assertEqual(get_digest_datetime(self.team, MONDAY).isoformat(), '2015-01-05T01:00:00+00:00')
+
+    def test_jobs_on_digest_days(self):
+        jobs = get_jobs([self.team], MONDAY, SUNDAY)
+        self.assertEqual([job.day.weekday() for job in jobs], [0, 1, 2, 3, 4])
+        self.assertEqual(len(get_jobs([self.team], MONDAY, SUNDAY, all_days=True)), 7)
+
+    def test_replay_sends_digests(self):
+        results = list(replay_all(get_jobs([self.team], MONDAY, MONDAY + datetime.timedelta(days=1)), 1))
+
+        self.assertEqual([result.status for result in results], ['sent', 'sent'])
+        self.assertEqual([msg.subject for msg in mail.outbox], [
+            'Digest for Replayed Team for Mon, Jan 05 2015',
+            'Digest for Replayed Team for Tue, Jan 06 2015',
+        ])
+
+    def test_dry_run_writes_digests(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        result, = replay_all([Job(self.team.pk, MONDAY, False, output_dir)], 1)
+
+        self.assertEqual(result.status, 'written')
+        self.assertEqual(result.detail, os.path.join(output_dir, str(self.team.pk), '2015-01-05.eml'))
+        with open(result.detail) as output:
+            self.assertIn('Subject: Digest for Replayed Team for Mon, Jan 05 2015', output.read())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_inactive_team_skipped(self):
+        self.team.is_active = False
+        self.team.save()
+
+        result, = replay_all([Job(self.team.pk, MONDAY, False, None)], 1)
+
+        self.assertEqual(result.status, 'skipped')
+
+    def test_invalid_date(self):
+        for value in ('yesterday', '2015-02-30'):
+            with self.assertRaises(CommandError):
+                call_command('replay_digests', '--since', value)
+
+
+class ReplayProcessesTest(TransactionTestCase):
+    """
+    The processes of the pool open their own connections, so they only see committed data.
+    """
+    def test_replay_in_processes(self):
+        team = TeamFactory(digest_days_sent=[0, 1, 2, 3, 4], send_digest_at=datetime.time(9, 0))
+        TeamMembershipFactory(user=UserFactory(), team=team)
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        results = list(replay_all(get_jobs([team], MONDAY, SUNDAY, output_dir=output_dir), 2))
+
+        self.assertEqual(sorted(result.job.day.weekday() for result in results), [0, 1, 2, 3, 4])
+        self.assertEqual({result.status for result in results}, {'written'})
+        self.assertEqual(len(os.listdir(os.path.join(output_dir, str(team.pk)))), 5)
+
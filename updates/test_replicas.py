@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.test import SimpleTestCase, override_settings
+
+from . import replicas
+from .models import Update
+from digestus.users.models import User
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_MAX_LAG=10,
+                   DATABASE_REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        replicas.reset()
+        replicas._lag_checks.clear()
+        self.addCleanup(replicas.reset)
+        self.addCleanup(replicas._lag_checks.clear)
+        self.router = replicas.ReplicaRouter()
+        patcher = mock.patch('updates.replicas.get_replica_lag', return_value=0.5)
+        self.get_replica_lag = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_outside_of_blocks_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Update), 'default')
+
+    def test_reads_in_blocks_use_a_replica(self):
+        with replicas.use_replica() as alias:
+            self.assertEqual(alias, 'replica1')
+            self.assertEqual(self.router.db_for_read(Update), 'replica1')
+        self.assertEqual(self.router.db_for_read(Update), 'default')
+
+    def test_sessions_and_users_use_the_primary(self):
+        with replicas.use_replica():
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_writes_pin_reads_to_the_primary_until_reset(self):
+        with replicas.use_replica():
+            self.assertEqual(self.router.db_for_write(Update), 'default')
+            self.assertEqual(self.router.db_for_read(Update), 'default')
+
+        replicas.reset()
+        with replicas.use_replica():
+            self.assertEqual(self.router.db_for_read(Update), 'replica1')
+
+    def test_lagging_replica_is_skipped(self):
+        self.get_replica_lag.return_value = 30
+        with replicas.use_replica() as alias:
+            self.assertEqual(alias, 'default')
+
+    def test_replica_with_unknown_lag_is_skipped(self):
+        self.get_replica_lag.return_value = None
+        with replicas.use_replica() as alias:
+            self.assertEqual(alias, 'default')
+
+    def test_lag_checked_once_per_interval(self):
+        for _ in range(3):
+            with replicas.use_replica():
+                pass
+        self.assertEqual(self.get_replica_lag.call_count, 1)
+
+    def test_migrations_only_on_the_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'updates'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'updates'))
@@ -0,0 +1,98 @@
+from datetime import date
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from .factories import TeamFactory, TeamMembershipFactory, UpdateFactory
+from .models import MembershipDailyStats, Team, TeamDailyStats
+from .rollups import get_member_participation, refresh_rollups
+
+# Monday to Sunday; the team factory sends digests on weekdays
+MONDAY = date(2015, 1, 5)
+TUESDAY = date(2015, 1, 6)
+SATURDAY = date(2015, 1, 10)
+
+
+class RefreshRollupsTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.alice = TeamMembershipFactory(team=self.team)
+        self.bob = TeamMembershipFactory(team=self.team)
+        UpdateFactory(membership=self.alice, for_date=MONDAY,
+                      done='Reviewed\n\n  \nDeployed', will_do='Write tests', blocker='')
+        UpdateFactory(membership=self.alice, for_date=SATURDAY, done='Fixed a bug', will_do='', blocker='')
+        UpdateFactory(membership=self.bob, for_date=TUESDAY, done='', will_do='', blocker='Staging is down')
+
+    def test_membership_stats(self):
+        refresh_rollups([self.team.pk], MONDAY, SATURDAY)
+
+        monday = MembershipDailyStats.objects.get(membership=self.alice, date=MONDAY)
+        self.assertEqual((monday.expected, monday.answered), (True, True))
+        self.assertEqual((monday.done_count, monday.will_do_count, monday.blocker_count), (2, 1, 0))
+
+        # Not a digest day, but answered
+        saturday = MembershipDailyStats.objects.get(membership=self.alice, date=SATURDAY)
+        self.assertEqual((saturday.expected, saturday.answered), (False, True))
+
+        # Expected on every weekday, answered or not
+        self.assertEqual(self.bob.daily_stats.filter(expected=True).count(), 5)
+        self.assertEqual(self.bob.daily_stats.filter(answered=True).count(), 1)
+
+    def test_team_stats(self):
+        refresh_rollups([self.team.pk], MONDAY, SATURDAY)
+
+        tuesday = TeamDailyStats.objects.get(team=self.team, date=TUESDAY)
+        self.assertEqual(tuesday.expected_count, 2)
+        self.assertEqual(tuesday.responded_count, 1)
+        self.assertEqual(tuesday.blocked_count, 1)
+        self.assertEqual(tuesday.blocker_count, 1)
+
+    def test_refresh_is_idempotent(self):
+        refresh_rollups([self.team.pk], MONDAY, SATURDAY)
+        refresh_rollups([self.team.pk], MONDAY, SATURDAY)
+
+        self.assertEqual(TeamDailyStats.objects.filter(team=self.team).count(), 6)
+
+    def test_member_participation(self):
+        refresh_rollups([self.team.pk], MONDAY, SATURDAY)
+
+        alice, bob = get_member_participation(self.team, MONDAY, SATURDAY)
+
+        self.assertEqual((alice['expected'], alice['responded'], alice['answered']), (5, 1, 2))
+        self.assertEqual(alice['response_rate'], 0.2)
+        self.assertEqual(alice['done_count'], 3)
+        self.assertEqual(bob['blocked_days'], 1)
+
+
+class UpdateRollupSignalTest(TransactionTestCase):
+    def test_stats_follow_updates(self):
+        membership = TeamMembershipFactory()
+        update = UpdateFactory(membership=membership, for_date=MONDAY, blocker='')
+
+        stats = MembershipDailyStats.objects.get(membership=membership, date=MONDAY)
+        self.assertTrue(stats.answered)
+        self.assertEqual(stats.blocker_count, 0)
+
+        update.blocker = 'Waiting for review'
+        update.save()
+        self.assertEqual(MembershipDailyStats.objects.get(membership=membership, date=MONDAY).blocker_count, 1)
+
+        update.delete()
+        stats = MembershipDailyStats.objects.get(membership=membership, date=MONDAY)
+        self.assertFalse(stats.answered)
+
+    def test_team_touched_once_per_transaction(self):
+        membership = TeamMembershipFactory()
+        modified = Team.objects.get(pk=membership.team_id).modified
+
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                for for_date in (MONDAY, TUESDAY):
+                    UpdateFactory(membership=membership, for_date=for_date, blocker='Waiting for review')
+
+        touches = [query for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "{}"'.format(Team._meta.db_table))]
+        self.assertEqual(len(touches), 1)
+        self.assertGreater(Team.objects.get(pk=membership.team_id).modified, modified)
+        self.assertEqual(MembershipDailyStats.objects.filter(membership=membership, answered=True).count(), 2)
@@ -15,8 +15,11 @@ from .tasks import (
     remind_team_member,
     send_digest,
     schedule_digest,
+    send_period_digest,
+    send_combined_digest,
     wrong_email_format_reply,
 )
+from .digests import get_combined_digest_groups
 from digestus.users.tests.factories import UserFactory
 
 
@@ -327,6 +330,64 @@ class ScheduleDigestTest(TestCase):
         self.assertFalse(send_digest_task.called)
 
 
+class CombinedDigestTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory(email='many_teams@test.ph', combined_digest=True)
+        self.developer = UserFactory(email='dev_2@test.ph')
+        self.first_team = TeamFactory(name='First Team', send_digest_at=time(9, 0))
+        self.second_team = TeamFactory(name='Second Team', send_digest_at=time(10, 30))
+        TeamMembershipFactory(team=self.first_team, user=self.user)
+        TeamMembershipFactory(team=self.first_team, user=self.developer)
+        TeamMembershipFactory(team=self.second_team, user=self.developer)
+        self.second_team.silent_recipients.add(SilentRecipientFactory(user=self.user))
+
+    def test_groups_in_one_query(self):
+        with self.assertNumQueries(1):
+            groups = get_combined_digest_groups(0)
+
+        self.assertEqual(groups, [(self.user.pk, [self.first_team.pk, self.second_team.pk], time(10, 30))])
+
+    def test_team_digest_skips_combined_recipients(self):
+        send_digest(self.first_team.pk, datetime(2015, 1, 5).replace(tzinfo=pytz.UTC))
+
+        self.assertNotIn('many_teams@test.ph', mail.outbox[0].recipients())
+        self.assertIn('dev_2@test.ph', mail.outbox[0].recipients())
+
+    def test_send_combined_digest(self):
+        send_combined_digest(self.user.pk, [self.first_team.pk, self.second_team.pk],
+                             datetime(2015, 1, 5).replace(tzinfo=pytz.UTC))
+
+        self.assertEqual(len(mail.outbox), 1)
+        msg = mail.outbox[0]
+        self.assertEqual(msg.subject, 'Digest for First Team, Second Team for Mon, Jan 05 2015')
+        self.assertEqual(msg.recipients(), ['many_teams@test.ph'])
+
+    @mock.patch('updates.tasks.logger.exception')
+    def test_combined_digest_for_deleted_user(self, exception_logger):
+        user_id = self.user.pk
+        self.user.delete()
+
+        send_combined_digest(user_id, [self.first_team.pk], datetime(2015, 1, 5).replace(tzinfo=pytz.UTC))
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(exception_logger.called)
+
+
+class SendPeriodDigestTest(TestCase):
+    def test_weekly_digest_sent_to_project_managers(self):
+        creator = UserFactory(email='manager@test.ph')
+        team = TeamFactory(name='Weekly Team', created_by=creator, rollup_digest_period='weekly')
+        UpdateFactory(membership=TeamMembershipFactory(team=team), for_date=datetime(2015, 1, 6).date(),
+                      done='Shipped the release')
+
+        send_period_digest(team.pk, 'weekly', datetime(2015, 1, 12, 1).replace(tzinfo=pytz.UTC))
+
+        msg = mail.outbox[0]
+        self.assertEqual(msg.subject, 'Weekly digest for Weekly Team, Mon, Jan 05 2015 to Sun, Jan 11 2015')
+        self.assertEqual(msg.recipients(), ['manager@test.ph'])
+        self.assertIn('Shipped the release', msg.body)
+
+
 class SendDigestTest(TestCase):
     def test_successful_digest_sending(self):
         """
@@ -0,0 +1,304 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .digests import get_digest_fragment, to_digest_date
+from .factories import RoleFactory, TeamFactory, TeamMembershipFactory, UpdateFactory
+from .live import listener
+from .metrics import DIGESTS_SENT
+from .summaries import get_team_summaries
+from digestus.users.tests.factories import UserFactory
+
+
+class TeamHistoryViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.team = TeamFactory()
+        self.membership = TeamMembershipFactory(team=self.team, user=self.user)
+        self.update = UpdateFactory(membership=self.membership,
+                                    done='Fixed the login page',
+                                    for_date=date(2015, 1, 5))
+        self.url = reverse('team_history', kwargs={'team_id': self.team.pk})
+        self.client.login(username=self.user.username, password='password')
+
+    def test_history_shows_past_digests(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Mon, Jan 05 2015')
+        self.assertContains(response, 'Fixed the login page')
+
+    def test_unchanged_history_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_non_member(self):
+        other_team = TeamFactory()
+
+        response = self.client.get(reverse('team_history', kwargs={'team_id': other_team.pk}))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_inactive_member(self):
+        self.membership.is_active = False
+        self.membership.save()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_fragment_is_cached(self):
+        get_digest_fragment(self.team, date(2015, 1, 5))
+
+        with self.assertNumQueries(0):
+            get_digest_fragment(self.team, date(2015, 1, 5))
+
+    def test_fragment_invalidated_on_update_change(self):
+        get_digest_fragment(self.team, date(2015, 1, 5))
+
+        self.update.done = 'Rewrote the login page'
+        self.update.save()
+
+        self.assertIn('Rewrote the login page', get_digest_fragment(self.team, date(2015, 1, 5)))
+
+    def test_fragment_invalidated_on_membership_change(self):
+        get_digest_fragment(self.team, date(2015, 1, 5))
+
+        TeamMembershipFactory(team=self.team, user=UserFactory(email='new@test.com'))
+
+        self.assertIn('new@test.com', get_digest_fragment(self.team, date(2015, 1, 5)))
+
+
+
+class TeamHistoryChangeTest(TransactionTestCase):
+    """
+    Teams are touched once the changes commit, which `TestCase` never does.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.membership = TeamMembershipFactory(user=self.user)
+        UpdateFactory(membership=self.membership, for_date=date(2015, 1, 5))
+        self.url = reverse('team_history', kwargs={'team_id': self.membership.team_id})
+        self.client.login(username=self.user.username, password='password')
+
+    def test_changed_history_is_sent_again(self):
+        etag = self.client.get(self.url)['ETag']
+        UpdateFactory(membership=self.membership, for_date=date(2015, 1, 6))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+
+
+class TeamListViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.team = TeamFactory(name='Alpha')
+        self.membership = TeamMembershipFactory(team=self.team, user=self.user,
+                                                role=RoleFactory(name='Developer'))
+        teammate = TeamMembershipFactory(team=self.team)
+        self.today = to_digest_date(timezone.now())
+        UpdateFactory(membership=teammate, for_date=self.today)
+        UpdateFactory(membership=teammate, for_date=date(2015, 1, 5))
+        self.client.login(username=self.user.username, password='password')
+
+    def test_team_summary(self):
+        with self.assertNumQueries(1):
+            teams = get_team_summaries(self.user)
+
+        self.assertEqual(len(teams), 1)
+        team = teams[0]
+        self.assertEqual(team.member_count, 2)
+        self.assertEqual(team.answered_count, 1)
+        self.assertEqual(team.viewer_role, 'Developer')
+        self.assertEqual(team.last_update_on, self.today)
+
+    def test_today_in_digest_timezone(self):
+        UpdateFactory(membership=self.membership, for_date=date(2016, 3, 2))
+
+        # Still March 1 in UTC, already March 2 in Manila
+        with mock.patch('updates.summaries.timezone.now', return_value=datetime(2016, 3, 1, 20, tzinfo=timezone.utc)):
+            team, = get_team_summaries(self.user)
+
+        self.assertEqual(team.answered_count, 1)
+
+    def test_team_list_page(self):
+        response = self.client.get(reverse('my_teams'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Alpha')
+        self.assertContains(response, '50%')
+
+    def test_summaries_cached(self):
+        get_team_summaries(self.user)
+
+        with self.assertNumQueries(0):
+            get_team_summaries(self.user)
+
+    def test_summaries_invalidated_on_membership_change(self):
+        get_team_summaries(self.user)
+
+        TeamMembershipFactory(team=self.team)
+
+        self.assertEqual(get_team_summaries(self.user)[0].member_count, 3)
+
+
+class TeamExportViewTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory(email='dev@test.com')
+        self.team = TeamFactory()
+        self.membership = TeamMembershipFactory(team=self.team, user=self.user)
+        UpdateFactory(membership=self.membership, done='Shipped v1', for_date=date(2015, 1, 5))
+        UpdateFactory(membership=self.membership, done='Shipped v2', for_date=date(2015, 1, 6))
+        self.client.login(username=self.user.username, password='password')
+
+    def get_export(self, export_format, **params):
+        url = reverse('team_export', kwargs={'team_id': self.team.pk, 'export_format': export_format})
+        response = self.client.get(url, params)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export(self):
+        response, content = self.get_export('csv')
+
+        lines = content.splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue(lines[0].startswith('id,for_date,member_email'))
+        self.assertEqual(len(lines), 3)
+        self.assertIn('dev@test.com', lines[1])
+        self.assertIn('Shipped v1', lines[1])
+
+    def test_jsonl_export_date_range(self):
+        response, content = self.get_export('jsonl', since='2015-01-06')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['done'], 'Shipped v2')
+        self.assertEqual(rows[0]['for_date'], '2015-01-06')
+
+    def test_invalid_date(self):
+        response = self.client.get(
+            reverse('team_export', kwargs={'team_id': self.team.pk, 'export_format': 'csv'}),
+            {'since': 'yesterday'},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_inactive_member(self):
+        self.membership.is_active = False
+        self.membership.save()
+
+        response = self.client.get(reverse('team_export', kwargs={'team_id': self.team.pk, 'export_format': 'csv'}))
+
+        self.assertEqual(response.status_code, 404)
+
+
+@mock.patch.object(listener, 'start')
+class TeamFeedViewTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.team = TeamFactory()
+        self.membership = TeamMembershipFactory(team=self.team, user=self.user)
+        self.client.login(username=self.user.username, password='password')
+
+    def test_streams_team_events(self, start):
+        response = self.client.get(reverse('team_feed', kwargs={'team_id': self.team.pk}))
+        content = iter(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(next(content), b'retry: 5000\n\n')
+
+        update = UpdateFactory(membership=self.membership, done='Deployed the dashboard')
+        listener.dispatch({'id': update.pk, 'membership_id': self.membership.pk, 'team_id': self.team.pk,
+                           'for_date': str(update.for_date), 'op': 'insert'})
+        event = next(content).decode('utf-8')
+
+        self.assertTrue(event.startswith('id: {}\nevent: insert\n'.format(update.pk)))
+        self.assertIn('Deployed the dashboard', event)
+
+        response.close()
+        self.assertNotIn(self.team.pk, listener.subscribers)
+
+    def test_non_member(self, start):
+        other_team = TeamFactory()
+
+        response = self.client.get(reverse('team_feed', kwargs={'team_id': other_team.pk}))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(other_team.pk, listener.subscribers)
+
+    def test_inactive_member(self, start):
+        self.membership.is_active = False
+        self.membership.save()
+
+        response = self.client.get(reverse('team_feed', kwargs={'team_id': self.team.pk}))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(self.team.pk, listener.subscribers)
+
+    @override_settings(LIVE_FEED_MAX_STREAMS=1)
+    def test_streams_limited_per_process(self, start):
+        url = reverse('team_feed', kwargs={'team_id': self.team.pk})
+        first = self.client.get(url)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+        first.close()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        self.url = reverse('metrics')
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_metrics_in_prometheus_format(self):
+        DIGESTS_SENT.labels('daily').inc()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'digestus_digests_sent_total{kind="daily"}', response.content)
+        self.assertIn(b'# TYPE digestus_email_send_seconds histogram', response.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_set(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_not_served_without_token_outside_debug(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_metrics_of_another_container(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        for group in ('web', 'digest-worker'):
+            os.mkdir(os.path.join(root, group))
+
+        with mock.patch.dict(os.environ, {'prometheus_multiproc_dir': os.path.join(root, 'web')}):
+            self.assertEqual(self.client.get(self.url, {'group': 'digest-worker'}).status_code, 200)
+            self.assertEqual(self.client.get(self.url, {'group': 'reminder-worker'}).status_code, 404)
+            self.assertEqual(self.client.get(self.url, {'group': '../web'}).status_code, 404)
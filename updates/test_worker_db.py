@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from prometheus_client import REGISTRY
+
+from . import worker_db
+
+
+def get_count(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# Outside of a test transaction, like a worker between tasks
+@override_settings(WORKER_CONN_MAX_AGE=600, WORKER_DB_HEALTH_CHECK_INTERVAL=30)
+class WorkerConnectionsTest(TransactionTestCase):
+    def setUp(self):
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        self.addCleanup(connection.settings_dict.__setitem__, 'CONN_MAX_AGE', max_age)
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = 600
+        connection.ensure_connection()
+
+    def test_healthy_connection_is_kept(self):
+        reused = get_count('digestus_db_connections_reused_total', alias='default')
+        raw_connection = connection.connection
+
+        worker_db.before_task()
+        worker_db.before_task()
+
+        self.assertIs(connection.connection, raw_connection)
+        self.assertEqual(get_count('digestus_db_connections_reused_total', alias='default'), reused + 2)
+
+    def test_health_checked_once_per_interval(self):
+        with mock.patch.object(connection, 'is_usable', return_value=True) as is_usable:
+            worker_db.before_task()
+            worker_db.before_task()
+
+        self.assertEqual(is_usable.call_count, 1)
+
+    def test_unhealthy_connection_is_closed(self):
+        closed = get_count('digestus_db_connections_closed_total', alias='default', reason='unhealthy')
+
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            worker_db.before_task()
+
+        self.assertIsNone(connection.connection)
+        self.assertEqual(get_count('digestus_db_connections_closed_total', alias='default', reason='unhealthy'),
+                         closed + 1)
+
+    def test_connection_closed_after_max_age(self):
+        connection.close_at = 0
+
+        worker_db.before_task()
+
+        self.assertIsNone(connection.connection)
+
+    def test_broken_connection_closed_after_failure(self):
+        connection.errors_occurred = True
+
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            worker_db.after_task_failure()
+
+        self.assertIsNone(connection.connection)
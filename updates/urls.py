@@ -1,10 +1,49 @@
 from django.conf.urls import url
 
-from .views import TeamListView
+from . import api
+from .views import MetricsView, TeamExportView, TeamFeedView, TeamHistoryView, TeamListView
 
 
 urlpatterns = [
     url(regex=r'^my_teams/$',
         view=TeamListView.as_view(),
         name='my_teams'),
+    url(regex=r'^teams/(?P<team_id>\d+)/history/$',
+        view=TeamHistoryView.as_view(),
+        name='team_history'),
+    url(regex=r'^teams/(?P<team_id>\d+)/export\.(?P<export_format>csv|jsonl)$',
+        view=TeamExportView.as_view(),
+        name='team_export'),
+    url(regex=r'^teams/(?P<team_id>\d+)/feed/$',
+        view=TeamFeedView.as_view(),
+        name='team_feed'),
+    url(regex=r'^metrics/$',
+        view=MetricsView.as_view(),
+        name='metrics'),
+
+    # JSON API
+    url(regex=r'^api/teams/$',
+        view=api.TeamListAPIView.as_view(),
+        name='api_teams'),
+    url(regex=r'^api/teams/(?P<team_id>\d+)/$',
+        view=api.TeamDetailAPIView.as_view(),
+        name='api_team'),
+    url(regex=r'^api/teams/(?P<team_id>\d+)/memberships/$',
+        view=api.MembershipListAPIView.as_view(),
+        name='api_memberships'),
+    url(regex=r'^api/teams/(?P<team_id>\d+)/updates/$',
+        view=api.UpdateListAPIView.as_view(),
+        name='api_updates'),
+    url(regex=r'^api/teams/(?P<team_id>\d+)/updates/search/$',
+        view=api.UpdateSearchAPIView.as_view(),
+        name='api_update_search'),
+    url(regex=r'^api/teams/(?P<team_id>\d+)/participation/$',
+        view=api.TeamParticipationAPIView.as_view(),
+        name='api_team_participation'),
+    url(regex=r'^api/memberships/(?P<membership_id>\d+)/$',
+        view=api.MembershipDetailAPIView.as_view(),
+        name='api_membership'),
+    url(regex=r'^api/updates/(?P<update_id>\d+)/$',
+        view=api.UpdateDetailAPIView.as_view(),
+        name='api_update'),
 ]
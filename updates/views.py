@@ -1,9 +1,21 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import ListView
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.generic import ListView, View
 
-from .models import Team
+from .conditional import team_condition
+from .digests import format_digest_date, get_digest_fragment
+from .exports import EXPORT_FORMATS, get_export_queryset
+from .live import STREAM_RETRY_AFTER, open_team_stream
+from .metrics import UnknownGroup, render_metrics
+from .models import Team, Update
+from .replicas import get_read_db, replica_reads
+from .summaries import get_team_summaries
 
 
 class TeamListView(LoginRequiredMixin, ListView):
@@ -13,4 +25,106 @@ class TeamListView(LoginRequiredMixin, ListView):
     model = Team
 
     def get_queryset(self):
-        return self.request.user.get_teams()
+        return get_team_summaries(self.request.user)
+
+
+@method_decorator(team_condition, name='get')
+@method_decorator(replica_reads, name='dispatch')
+class TeamHistoryView(LoginRequiredMixin, ListView):
+    """
+    Paginated timeline of the past digests of a `Team`, newest first.
+
+    Each day is rendered with the same assembly code as the digest emails and
+    cached until the updates of that day change.
+    """
+    template_name = 'updates/team_history.html'
+    paginate_by = 7
+
+    def get_queryset(self):
+        self.team = get_object_or_404(Team.objects.for_member(self.request.user), pk=self.kwargs['team_id'])
+        return Update.objects.filter(membership__team=self.team).dates('for_date', 'day', order='DESC')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['team'] = self.team
+        context['digests'] = [
+            {'date': format_digest_date(for_date), 'fragment': get_digest_fragment(self.team, for_date)}
+            for for_date in context['object_list']
+        ]
+        return context
+
+
+@method_decorator(replica_reads, name='dispatch')
+class TeamExportView(LoginRequiredMixin, View):
+    """
+    Streams all updates of a `Team` as CSV or JSON Lines.
+
+    `since` and `until` query parameters (YYYY-MM-DD) limit the date range.
+    """
+
+    def get(self, request, team_id, export_format):
+        team = get_object_or_404(Team.objects.for_member(request.user), pk=team_id)
+
+        dates = {}
+        for param in ('since', 'until'):
+            value = request.GET.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return HttpResponseBadRequest('Invalid {}.'.format(param))
+
+        stream, content_type = EXPORT_FORMATS[export_format]
+        # Bound now, since the rows are read after the view returns
+        queryset = get_export_queryset(team, **dates).using(get_read_db())
+        response = StreamingHttpResponse(stream(queryset),
+                                         content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="{}-updates.{}"'.format(team.name, export_format)
+        return response
+
+
+class TeamFeedView(LoginRequiredMixin, View):
+    """
+    Server-sent events with the new and changed updates of a `Team`.
+    """
+
+    def get(self, request, team_id):
+        team = get_object_or_404(Team.objects.for_member(request.user), pk=team_id)
+
+        stream = open_team_stream(team.pk)
+        if stream is None:
+            response = HttpResponse('Too many open live feeds, try again later.', status=503)
+            response['Retry-After'] = STREAM_RETRY_AFTER
+            return response
+
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class MetricsView(View):
+    """
+    Metrics of the web and worker processes in the Prometheus text format.
+
+    Scrapers have to send `METRICS_TOKEN` as a bearer token. Without a token
+    the metrics are only served with `DEBUG`, since they are public otherwise.
+    The `group` parameter selects the processes of another container, e.g.
+    `?group=digest-worker`, see `metrics.py`.
+    """
+
+    def get(self, request):
+        if not settings.METRICS_TOKEN:
+            if not settings.DEBUG:
+                return HttpResponseForbidden('METRICS_TOKEN is not set.')
+        elif not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                       'Bearer {}'.format(settings.METRICS_TOKEN)):
+            return HttpResponseForbidden()
+
+        try:
+            output, content_type = render_metrics(request.GET.get('group'))
+        except UnknownGroup:
+            raise Http404
+        return HttpResponse(output, content_type=content_type)
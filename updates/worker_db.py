@@ -0,0 +1,72 @@
+"""
+Persistent database connections for Celery workers.
+
+By default Celery's Django fixup closes every connection around each task,
+so every task pays for a new Postgres connection. With `CELERY_DB_REUSE_MAX`
+set, workers keep their connections instead and these hooks look after them:
+
+    before a task, connections get `WORKER_CONN_MAX_AGE` and are closed once
+    older than that; a connection idle for more than
+    `WORKER_DB_HEALTH_CHECK_INTERVAL` seconds is checked with a query and
+    closed when the check fails
+    after a failed task, connections that saw an error and no longer answer
+    are closed, so the next task reconnects instead of failing too
+
+Eager tasks run inside the caller's connection handling and are left alone.
+Opened, reused and closed connections and health checks are counted in the
+metrics, see `metrics.py`.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+def get_usable_connections():
+    """
+    The open connections of this thread outside of a transaction.
+    """
+    return [
+        connection for connection in connections.all()
+        if connection.connection is not None and not connection.in_atomic_block
+    ]
+
+
+def close(connection, reason):
+    connection.close()
+    connection._health_checked_at = None
+    metrics.DB_CONNECTIONS_CLOSED.labels(connection.alias, reason).inc()
+
+
+def before_task():
+    now = time.monotonic()
+    for connection in connections.all():
+        connection.settings_dict['CONN_MAX_AGE'] = settings.WORKER_CONN_MAX_AGE
+
+    for connection in get_usable_connections():
+        # Set from `time.time()` when connecting
+        if connection.close_at is not None and time.time() >= connection.close_at:
+            close(connection, 'max_age')
+            continue
+
+        checked_at = getattr(connection, '_health_checked_at', None)
+        if checked_at is None or now - checked_at >= settings.WORKER_DB_HEALTH_CHECK_INTERVAL:
+            healthy = connection.is_usable()
+            metrics.DB_HEALTH_CHECKS.labels(connection.alias, 'ok' if healthy else 'failed').inc()
+            if not healthy:
+                close(connection, 'unhealthy')
+                continue
+            connection._health_checked_at = now
+
+        metrics.DB_CONNECTIONS_REUSED.labels(connection.alias).inc()
+
+
+def after_task_failure():
+    for connection in get_usable_connections():
+        if connection.errors_occurred and not connection.is_usable():
+            close(connection, 'failure')
+        elif connection.get_autocommit() != connection.settings_dict['AUTOCOMMIT']:
+            # Left in a transaction by the failed task
+            close(connection, 'failure')